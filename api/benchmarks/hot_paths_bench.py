@@ -0,0 +1,294 @@
+"""
+Microbenchmarks of the pure-Python steps every chat request runs, with a
+baseline stored in the repo and a regression check.
+
+Each case times one pass over a fixed set of inputs (best of --rounds) and
+reports microseconds per call. The "_10x" cases run against a glossary or
+catalog grown tenfold with synthetic entries, so costs that scale with the
+knowledge base show up before the real one gets there.
+
+Cases are compared in units of a fixed pure-Python calibration loop timed
+right before each of them, which absorbs machine speed and load: a baseline
+recorded on one machine stays usable on another (same Python version).
+Flagged cases are measured again before they count as regressions.
+
+Usage:
+    python -m api.benchmarks.hot_paths_bench                    # compare with the baseline
+    python -m api.benchmarks.hot_paths_bench --check            # exit 1 on a regression
+    python -m api.benchmarks.hot_paths_bench --save-baseline    # record a new baseline
+    python -m api.benchmarks.hot_paths_bench -k suggestions --rounds 10
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+from api.benchmarks.keywords_normalizer_bench import MESSAGES
+
+BASELINE_FILE = Path(__file__).parent / "hot_paths_baseline.json"
+
+# a case regresses when its relative time exceeds the baseline by this factor
+DEFAULT_THRESHOLD = 1.5
+# cases shorter than this (us per call) are too noisy for the ratio alone
+NOISE_FLOOR_US = 0.5
+
+# what the LLM writes around the [LINK:id] markers
+LLM_ANSWERS = [
+    "Our wedding coverage starts at 35,000 and includes a same day edit. [LINK:{0}]",
+    "You can reserve your date online [LINK:{0}] or message us for the available slots. [LINK:{1}]",
+    "Sorry, I can only answer questions about our studio services.",
+    "Here are our packages [LINK:{0}] [LINK:{1}] [LINK:{0}] and payment terms [LINK:{2}].",
+]
+
+
+def calibrate(rounds: int = 7) -> float:
+    """Seconds of a fixed pure-Python loop, the unit the timings are compared in"""
+    def loop():
+        total = 0
+        for i in range(20000):
+            total += i % 7
+        return total
+
+    return min(timeit.repeat(loop, number=10, repeat=rounds)) / 10
+
+
+def grow_glossary(glossary: dict[str, str], factor: int) -> dict[str, str]:
+    """
+    The glossary with (factor - 1) synthetic copies of every phrase, each copy
+    sharing the phrase's first token so trie walks get longer as well as wider
+    """
+    grown = dict(glossary)
+    for copy in range(1, factor):
+        for phrase, replacement in glossary.items():
+            head, _, rest = phrase.partition(" ")
+            grown[f"{head} {rest or 'x'}{copy}"] = replacement
+    return grown
+
+
+def grow_catalog(knowledge, factor: int):
+    """The catalog with (factor - 1) copies of every follow-up group under new qa ids"""
+    from api.scripts.knowledge_catalog import FollowUpRecord, KnowledgeCatalog
+
+    follow_ups = list(knowledge.follow_ups.values())
+    for copy in range(1, factor):
+        follow_ups.extend(
+            FollowUpRecord(qa_id=f"{group.qa_id}-{copy}", tags=group.tags, suggestions=group.suggestions)
+            for group in knowledge.follow_ups.values()
+        )
+    return KnowledgeCatalog(
+        actions=knowledge.actions.values(),
+        qa_entries=knowledge.qa_entries.values(),
+        follow_ups=follow_ups
+    )
+
+
+def build_cases() -> dict[str, tuple[Callable[[], object], int]]:
+    """name: (one pass over the case inputs, calls per pass)"""
+    from langchain_core.documents import Document
+
+    from api.loadtest.run import configure_environment
+    configure_environment()
+
+    from api.schemas.chatbot_schemas import ActionLink, ChatRequest, ChatResponse, MessageSuggestion
+    from api.scripts.chatbot import extract_actions
+    from api.scripts.follow_up_message import FollowUpMessage
+    from api.scripts.knowledge_catalog import catalog
+    from api.utils.keywords_normalizer import KeywordsNormalizer
+
+    normalizer = KeywordsNormalizer()
+    grown_normalizer = KeywordsNormalizer()
+    grown_normalizer.set_glossary(grow_glossary(normalizer.keywords_glossary, 10))
+
+    follow_up = FollowUpMessage(catalog)
+    grown_follow_up = FollowUpMessage(grow_catalog(catalog, 10))
+    normalized = [normalizer.normalize_message(message) for message in MESSAGES]
+
+    actions = list(catalog.actions.values())
+    action_ids = [action.id for action in actions] or ["missing"]
+    answers = [
+        answer.format(*(action_ids[i % len(action_ids)] for i in range(position, position + 3)))
+        for position, answer in enumerate(LLM_ANSWERS)
+    ]
+    # what retrieval hands over: a few action pages and QA entries, some with an action
+    action_docs = [
+        Document(page_content=action.description, metadata={**action.to_link(), "action_id": action.id})
+        for action in actions[:3]
+    ]
+    qa_docs = [
+        Document(page_content=qa.answer, metadata={"qa_id": qa.id, "action_id": qa.action_id or ""})
+        for qa in list(catalog.qa_entries.values())[:5]
+    ]
+    # a wider retrieval: the linked pages come after nine unrelated ones each
+    wide_action_docs = [
+        Document(page_content=action.description, metadata={**action.to_link(), "action_id": f"{action.id}-{copy}"})
+        for copy in range(1, 10)
+        for action in actions
+    ] + action_docs
+
+    links = [action.to_link() for action in actions[:3]]
+    suggestions = [
+        suggestion.to_dict()
+        for group in list(catalog.follow_ups.values())[:3]
+        for suggestion in group.suggestions[:1]
+    ]
+    created_at = datetime.now(timezone.utc)
+
+    def respond():
+        return ChatResponse(
+            role="assistant",
+            message=answers[0],
+            created_at=created_at,
+            actions=[ActionLink(**action) for action in links],
+            message_suggestions=[MessageSuggestion(**suggestion) for suggestion in suggestions]
+        )
+
+    return {
+        "normalize_message": (lambda: [normalizer.normalize_message(m) for m in MESSAGES], len(MESSAGES)),
+        "normalize_message_10x": (lambda: [grown_normalizer.normalize_message(m) for m in MESSAGES], len(MESSAGES)),
+        "normalize_cache_key": (lambda: [normalizer.normalize_cache_key(m) for m in normalized], len(normalized)),
+        "chat_request_validation": (
+            lambda: [ChatRequest.model_validate({"message": m}) for m in MESSAGES], len(MESSAGES)
+        ),
+        "suggestions_by_keywords": (
+            lambda: [follow_up.get_suggestions_by_keywords(m) for m in normalized], len(normalized)
+        ),
+        "suggestions_by_keywords_10x": (
+            lambda: [grown_follow_up.get_suggestions_by_keywords(m) for m in normalized], len(normalized)
+        ),
+        "extract_actions": (lambda: [extract_actions(a, action_docs, qa_docs) for a in answers], len(answers)),
+        "extract_actions_10x": (
+            lambda: [extract_actions(a, wide_action_docs, qa_docs) for a in answers], len(answers)
+        ),
+        "response_models": (respond, 1),
+    }
+
+
+def measure(
+    cases: dict[str, tuple[Callable[[], object], int]],
+    rounds: int = 7,
+    min_time: float = 0.1
+) -> dict[str, dict[str, float]]:
+    """
+    Best-of-rounds microseconds per call of every case, and the same time in
+    calibration loops ("relative") measured next to it
+    """
+    results = {}
+    for name, (run_pass, calls) in cases.items():
+        timer = timeit.Timer(run_pass)
+        number, _ = timer.autorange()
+        # autorange stops at 0.2s, scale down to min_time per round
+        number = max(1, int(number * min_time / 0.2))
+        calibration = calibrate(rounds)
+        seconds = min(timer.repeat(repeat=rounds, number=number)) / number / calls
+        results[name] = {"us": seconds * 1e6, "relative": seconds / calibration}
+    return results
+
+
+def best_of(*runs: dict[str, dict[str, float]]) -> dict[str, dict[str, float]]:
+    """Per case, the run with the lowest relative time"""
+    return {name: min((run[name] for run in runs), key=lambda result: result["relative"]) for name in runs[0]}
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: Optional[dict],
+    threshold: float = DEFAULT_THRESHOLD
+) -> list[dict]:
+    """
+    One row per case: current and baseline us, the ratio of the relative
+    times and whether it regressed. Cases missing from the baseline have no ratio.
+    """
+    recorded_cases = baseline.get("cases", {}) if baseline else {}
+    rows = []
+    for name, result in results.items():
+        recorded = recorded_cases.get(name)
+        if recorded is None:
+            rows.append({"case": name, "us": result["us"], "baseline_us": None, "ratio": None, "regressed": False})
+            continue
+        ratio = result["relative"] / recorded["relative"]
+        rows.append({
+            "case": name,
+            "us": result["us"],
+            "baseline_us": recorded["us"],
+            "ratio": ratio,
+            "regressed": ratio > threshold and result["us"] - recorded["us"] > NOISE_FLOOR_US
+        })
+    return rows
+
+
+def load_baseline(path: Path = BASELINE_FILE) -> Optional[dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results: dict[str, dict[str, float]], path: Path = BASELINE_FILE) -> None:
+    baseline = {
+        "python": platform.python_version(),
+        "cases": {
+            name: {"us": round(result["us"], 3), "relative": round(result["relative"], 6)}
+            for name, result in results.items()
+        }
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m api.benchmarks.hot_paths_bench")
+    parser.add_argument("-k", dest="pattern", help="only the cases whose name contains this")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per round and case")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--check", action="store_true", help="exit 1 when a case regressed")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    cases = build_cases()
+    if args.pattern:
+        cases = {name: case for name, case in cases.items() if args.pattern in name}
+
+    results = measure(cases, args.rounds, args.min_time)
+
+    if args.save_baseline:
+        # best of two runs, a slow round must not become the reference
+        results = best_of(results, measure(cases, args.rounds, args.min_time))
+        save_baseline(results, args.baseline)
+        print(f"Baseline of {len(results)} cases written to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get("python", "").rsplit(".", 1)[0] != platform.python_version().rsplit(".", 1)[0]:
+        print(f"Baseline recorded on Python {baseline['python']}, ratios are indicative only\n")
+
+    rows = compare(results, baseline, args.threshold)
+    flagged = {row["case"]: cases[row["case"]] for row in rows if row["regressed"]}
+    if flagged:
+        # one slow round of a noisy machine is not a regression
+        again = measure(flagged, args.rounds, args.min_time)
+        results.update(best_of({name: results[name] for name in flagged}, again))
+        rows = compare(results, baseline, args.threshold)
+
+    print(f"{'case':<30} {'us/call':>10} {'baseline':>10} {'ratio':>7}")
+    for row in rows:
+        recorded = f"{row['baseline_us']:>10.2f}" if row["baseline_us"] is not None else f"{'-':>10}"
+        ratio = f"{row['ratio']:>7.2f}" if row["ratio"] is not None else f"{'-':>7}"
+        flag = "  REGRESSED" if row["regressed"] else ""
+        print(f"{row['case']:<30} {row['us']:>10.2f} {recorded} {ratio}{flag}")
+
+    regressed = [row["case"] for row in rows if row["regressed"]]
+    if regressed:
+        print(f"\n{len(regressed)} case(s) slower than {args.threshold}x the baseline: {', '.join(regressed)}")
+    return 1 if args.check and regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
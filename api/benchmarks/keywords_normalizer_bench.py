@@ -0,0 +1,58 @@
+"""
+Benchmark of KeywordsNormalizer.normalize_message against the previous
+word-by-word implementation.
+
+Usage:
+    python -m api.benchmarks.keywords_normalizer_bench [--repeat 20000]
+"""
+import argparse
+import timeit
+
+from api.utils.keywords_normalizer import KeywordsNormalizer
+
+MESSAGES = [
+    "Magkano po ang wedding coverage?",
+    "hm",
+    "how to book po sa inyo",
+    "pa reserve po ng date sa dec 12",
+    "may slot pa ba kayo for prenup next month po?",
+    "tga caloocan po kayo? asan po studio nyo",
+    "Hi po! Ask ko lang po kung magkano yung debut package with same day edit and photo booth, "
+    "tapos ano kasama sa package and pwede po ba installment ang downpayment?",
+]
+
+
+def legacy_normalize_message(normalizer: KeywordsNormalizer, message: str) -> str:
+    """The previous implementation: single-word lookups joined with string +="""
+    clean_str = normalizer.remove_special_chars(message)
+    normalized_mssg = ""
+    for word in clean_str.split():
+        normalized_mssg += normalizer.keywords_glossary.get(word, word) + " "
+
+    return normalized_mssg.strip()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m api.benchmarks.keywords_normalizer_bench")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    normalizer = KeywordsNormalizer()
+
+    print(f"{'message':<48} {'legacy us':>10} {'trie us':>10}")
+    for message in MESSAGES:
+        legacy = timeit.timeit(lambda: legacy_normalize_message(normalizer, message), number=args.repeat)
+        trie = timeit.timeit(lambda: normalizer.normalize_message(message), number=args.repeat)
+        label = message if len(message) <= 45 else message[:42] + "..."
+        print(f"{label:<48} {legacy / args.repeat * 1e6:>10.2f} {trie / args.repeat * 1e6:>10.2f}")
+
+    print("\nOutput differences (legacy -> trie):")
+    for message in MESSAGES:
+        before = legacy_normalize_message(normalizer, message)
+        after = normalizer.normalize_message(message)
+        if before != after:
+            print(f"  {before!r}\n  -> {after!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings
 
@@ -14,10 +15,99 @@ class Settings(BaseSettings):
     
     REQUEST_SECRET_KEY: str | None = None
     
+    # refuse to start when the persisted index is missing or stale
+    VERIFY_INDEX_ON_STARTUP: bool = True
+    
+    # retrieval backend: "chroma" or "numpy" (memory-mapped in-process index)
+    VECTOR_BACKEND: Literal["chroma", "numpy"] = "chroma"
+    
+    # hybrid retrieval, BM25 over QA variants/tags and action intents fused with vector scores
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_FUSION: Literal["weighted", "rrf"] = "weighted"
+    HYBRID_LEXICAL_WEIGHT: float = 0.3
+    HYBRID_RRF_K: int = 60
+    
+    # retrieval quality gate (squared L2 distances, lower is closer). Weak retrievals
+    # are rephrased and retrieved again before the answer is generated, once
+    RETRIEVAL_RELEVANCE_THRESHOLD: float = 0.7 # max distance of a doc used as context
+    RETRIEVAL_QUALITY_THRESHOLD: float = 0.7 # max mean distance of the top k to answer
+    QUALITY_GATE_REPHRASE: bool = True
+    QUALITY_GATE_REPHRASE_MIN_WORDS: int = 3 # shorter messages (greetings, thanks) are not rephrased
+    
+    # prompt assembly, estimated tokens for system prompt + context + question
+    PROMPT_TOKEN_BUDGET: int = 3000
+    PROMPT_DEDUPE_THRESHOLD: float = 0.85 # word-set similarity above which a chunk is a near-duplicate
+    
+    # per-stage retries (exponential backoff with jitter) within an overall latency budget
+    RETRY_MAX_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY: float = 0.25 # seconds
+    RETRY_MAX_DELAY: float = 2.0
+    CHAT_LATENCY_BUDGET: float = 20.0 # seconds for retrieval, rephrase and generation together
+    
+    # LLM circuit breaker, opens on error/slow-call rate over the last calls
+    LLM_BREAKER_FAILURE_RATE: float = 0.5
+    LLM_BREAKER_SLOW_CALL_SECONDS: float = 10.0
+    LLM_BREAKER_WINDOW: int = 20
+    LLM_BREAKER_MIN_CALLS: int = 5
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0
+    
+    # query embedding cache (L1 in-process LRU, L2 on-disk SQLite)
+    EMBEDDING_CACHE_L1_SIZE: int = 1024
+    EMBEDDING_CACHE_L2_SIZE: int = 50000
+    EMBEDDING_CACHE_DISK_ENABLED: bool = True
+    
+    # deterministic answers for typed messages matching a known QA question
+    QA_FAST_PATH_ENABLED: bool = True
+    QA_FAST_PATH_MAX_EDITS: int = 2
+    QA_FAST_PATH_MIN_FUZZY_LENGTH: int = 8
+    
+    # semantic response cache, cosine similarity needed to reuse a cached answer
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.93
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+    
+    # in-process L1 response cache in front of redis, kept coherent through pub/sub
+    RESPONSE_CACHE_L1_ENABLED: bool = True
+    RESPONSE_CACHE_L1_SIZE: int = 512
+    RESPONSE_CACHE_L1_TTL: float = 300.0 # seconds, bounds staleness if an invalidation is missed
+    
+    # coalesce concurrent cache misses of the same question into one generation
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_REDIS_LOCK: bool = True # also coalesce across workers with a short redis lock
+    SINGLE_FLIGHT_LOCK_TTL_MS: int = 20000
+    SINGLE_FLIGHT_WAIT_TIMEOUT: float = 15.0 # seconds a follower waits for another worker's answer
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.2
+    
+    # response cache warm-up over the QA questions (python -m api.warmup)
+    WARMUP_ON_STARTUP: bool = False
+    WARMUP_CONCURRENCY: int = 2
+    
+    # knowledge base hot reload: admin endpoint (disabled without a key) and
+    # an optional watcher polling api/documents every KNOWLEDGE_WATCH_INTERVAL seconds
+    ADMIN_SECRET_KEY: str | None = None
+    KNOWLEDGE_WATCH_ENABLED: bool = False
+    KNOWLEDGE_WATCH_INTERVAL: float = 5.0
+    
+    # Prometheus exposition of the per-stage latencies and counters on GET /metrics,
+    # which also needs ADMIN_SECRET_KEY (admin-secret-key header or bearer token)
+    METRICS_ENABLED: bool = False
+    
+    # per-request Server-Timing header (stage durations) and optional OpenTelemetry
+    # spans, exported by the SDK the app is run with (opentelemetry-instrument)
+    SERVER_TIMING_ENABLED: bool = True
+    OTEL_TRACING_ENABLED: bool = False
+    
     UPSTASH_REDIS_REST_URL: str | None = None
     UPSTASH_REDIS_REST_TOKEN: str | None = None
     UPSTASH_REDIS_PORT: int | None = 6379 # default redis port
     
+    # redis connection pool
+    REDIS_MAX_CONNECTIONS: int = 20
+    REDIS_POOL_TIMEOUT: float = 2.0 # seconds to wait for a free pooled connection
+    REDIS_CONNECT_TIMEOUT: float = 2.0
+    REDIS_READ_TIMEOUT: float = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30 # seconds idle before a pooled connection is pinged
+    
     # redis conf
     def get_redis_client_uri(self) -> str:
         return (
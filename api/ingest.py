@@ -0,0 +1,88 @@
+"""
+Offline ingestion entry point.
+
+Builds and checks the persisted vector index outside of the API server,
+so workers only open an index that is already up to date.
+
+Usage:
+    python -m api.ingest build    # embed new/changed chunks, drop removed ones
+    python -m api.ingest build --no-broadcast   # e.g. in an image build, no worker to notify
+    python -m api.ingest verify   # exit 1 if the index is missing or stale
+    python -m api.ingest stats    # print what is currently indexed
+"""
+import argparse
+import json
+import logging
+import sys
+
+from api.scripts.vector_store import (
+    rebuild_indexes,
+    vector_store_stats,
+    verify_vector_store
+)
+from api.services.cache_invalidation import broadcast_knowledge_change
+
+logger = logging.getLogger(__name__)
+
+
+def build(broadcast: bool = True) -> int:
+    """Incrementally sync the vector store with api/documents"""
+    summary = rebuild_indexes()
+    print(
+        f"Index built: {summary['added']} added, {summary['deleted']} deleted, "
+        f"{summary['unchanged']} unchanged ({summary['exported']} chunks exported to the NumPy index, "
+        f"{summary['lexical']} chunks in the lexical index)"
+    )
+    
+    # running workers reload the documents and drop answers built from removed chunks
+    if broadcast:
+        broadcast_knowledge_change()
+    return 0
+
+
+def verify() -> int:
+    """Report whether the persisted index matches api/documents"""
+    problems = verify_vector_store()
+    if problems:
+        for problem in problems:
+            print(f"STALE: {problem}")
+        return 1
+    
+    print("Index is up to date")
+    return 0
+
+
+def stats() -> int:
+    """Print index statistics as JSON"""
+    print(json.dumps(vector_store_stats(), indent=2))
+    return 0
+
+
+COMMANDS = {
+    "build": build,
+    "verify": verify,
+    "stats": stats
+}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.ingest",
+        description="Build and inspect the persisted CVMS knowledge index"
+    )
+    parser.add_argument("command", choices=COMMANDS.keys())
+    parser.add_argument(
+        "--no-broadcast",
+        action="store_true",
+        help="build: don't tell running workers to reload (the index is baked into an image)"
+    )
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if args.command == "build":
+        return build(broadcast=not args.no_broadcast)
+    return COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,590 @@
+"""
+Local stand-ins for the external services, so api.main:app can be load
+tested offline: Groq (streaming chat completions), the Google embedding
+model and Redis (Upstash).
+"""
+import asyncio
+import math
+import random
+import re
+import time
+import zlib
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+WORD_PATTERN = re.compile(r"\w+")
+REPHRASE_MARKER = "ORIGINAL MESSAGE:\n"
+CONTEXT_MARKER = "CONTEXT:\n"
+# InMemoryRedis.set shadows the builtin in its class body
+Members = set[bytes]
+
+
+class FakeAPIError(Exception):
+    """A Groq 5xx, retryable like the real one"""
+    def __init__(self, status_code: int = 503):
+        super().__init__(f"Fake Groq error {status_code}")
+        self.status_code = status_code
+
+
+class FakeStream:
+    """Async iterator of Groq-shaped chunks, the last one carries x_groq.usage"""
+    def __init__(self, tokens: list[str], ttft: float, token_interval: float):
+        self.tokens = tokens
+        self.ttft = ttft
+        self.token_interval = token_interval
+
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._chunks()
+
+
+    async def _chunks(self) -> AsyncIterator[Any]:
+        await asyncio.sleep(self.ttft)
+        for position, token in enumerate(self.tokens):
+            if position:
+                await asyncio.sleep(self.token_interval)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=None))],
+            x_groq=SimpleNamespace(usage=SimpleNamespace(completion_tokens=len(self.tokens)))
+        )
+
+
+class FakeGroq:
+    """
+    AsyncGroq stand-in with a configurable time to first token and token rate.
+    Rephrase requests echo the original message (so the retry retrieves the
+    same way), answers are the first answer_tokens words of the prompt context.
+    error_rate of the calls fail with a retryable FakeAPIError.
+    """
+    def __init__(
+        self,
+        ttft: float = 0.3,
+        tokens_per_second: float = 80.0,
+        answer_tokens: int = 60,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.ttft = ttft
+        self.token_interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=self)
+        self.counters = {
+            "calls": 0,
+            "rephrases": 0,
+            "errors": 0
+        }
+
+
+    async def create(self, messages: list[dict[str, str]], stream: bool = True, **kwargs) -> FakeStream:
+        self.counters["calls"] += 1
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            raise FakeAPIError()
+
+        user_content = messages[-1]["content"]
+        if user_content.startswith(REPHRASE_MARKER):
+            self.counters["rephrases"] += 1
+            words = user_content[len(REPHRASE_MARKER):].split()
+        else:
+            context = user_content.split(CONTEXT_MARKER, 1)[-1]
+            words = context.split()[:self.answer_tokens] or ["Okay."]
+
+        tokens = [word + " " for word in words[:-1]] + words[-1:]
+        return FakeStream(tokens, self.ttft, self.token_interval)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for the embedding model.
+    A text is embedded as the stored vector of the indexed document it
+    shares the most (IDF weighted) words with, plus noise seeded by the
+    text: on-topic questions retrieve relevant chunks, paraphrases of a
+    question land close to each other (semantic cache) and off-topic
+    questions get a random vector, i.e. a weak retrieval.
+    """
+    def __init__(
+        self,
+        documents: list[str],
+        vectors: np.ndarray,
+        noise: float = 0.15,
+        latency: float = 0.0,
+        min_score: float = 2.0
+    ):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.noise = noise
+        self.latency = latency
+        self.min_score = min_score
+        self.scale = float(np.linalg.norm(self.vectors, axis=1).mean()) if len(self.vectors) else 1.0
+        self.counters = {"calls": 0}
+
+        self.doc_words = [self._words(document) for document in documents]
+        document_frequency: dict[str, int] = {}
+        for words in self.doc_words:
+            for word in words:
+                document_frequency[word] = document_frequency.get(word, 0) + 1
+        self.idf = {
+            word: math.log(len(documents) / frequency)
+            for word, frequency in document_frequency.items()
+        }
+
+
+    @classmethod
+    def for_documents(cls, documents: list[str], dimensions: int = 64, seed: int = 0, **kwargs) -> "FakeEmbeddings":
+        """
+        An embedder to build an index from scratch with, no real model needed.
+        Every document is anchored on a random unit vector leaning towards a
+        shared direction, one knowledge base clusters like real embeddings do
+        (squared distances around 0.4 between documents, 2 to off-topic texts).
+        """
+        rng = np.random.default_rng(seed)
+        spread = rng.standard_normal((len(documents), dimensions))
+        spread /= np.linalg.norm(spread, axis=1, keepdims=True)
+        shared = rng.standard_normal(dimensions)
+        vectors = 0.9 * shared / np.linalg.norm(shared) + 0.45 * spread
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return cls(documents, vectors, **kwargs)
+
+
+    @staticmethod
+    def _words(text: str) -> set[str]:
+        return {word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 2}
+
+
+    def vector(self, text: str) -> list[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        words = self._words(text)
+        scores = [sum(self.idf[word] for word in words & doc_words) for doc_words in self.doc_words]
+        best = int(np.argmax(scores)) if scores else -1
+
+        dimensions = self.vectors.shape[1]
+        if best < 0 or scores[best] < self.min_score:
+            vector = rng.standard_normal(dimensions) * self.scale / math.sqrt(dimensions)
+        else:
+            anchor = self.vectors[best]
+            noise = rng.standard_normal(dimensions) * np.linalg.norm(anchor) / math.sqrt(dimensions)
+            vector = anchor + self.noise * noise
+        return vector.astype(np.float32).tolist()
+
+
+    def embed_query(self, text: str) -> list[float]:
+        self.counters["calls"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.vector(text)
+
+
+    async def aembed_query(self, text: str) -> list[float]:
+        self.counters["calls"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.vector(text)
+
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.vector(text) for text in texts]
+
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+class InMemoryRedis:
+    """
+    The subset of redis.asyncio.Redis the app uses, in process memory.
+    Values come back as bytes, like the app's client (no decode_responses).
+
+    Every command holds one of max_connections slots for latency seconds,
+    like a round trip on the app's BlockingConnectionPool; a subscribed
+    pub/sub holds its slot until closed. EVAL runs the app's Lua scripts
+    as Python (see scripts()).
+    """
+    def __init__(self, latency: float = 0.0, max_connections: int = 20):
+        self.latency = latency
+        self.max_connections = max_connections
+        self._data: dict[str, Any] = {}
+        self._expires: dict[str, float] = {}
+        self._subscribers: dict[str, list[asyncio.Queue]] = {}
+        self._slots = asyncio.Semaphore(max_connections)
+        self._scripts: Optional[dict[str, Callable]] = None
+        self.in_use = 0
+        self.counters = {
+            "commands": 0,
+            "peak_connections": 0,
+            "connection_waits": 0,
+            "connection_wait_seconds": 0.0
+        }
+
+
+    async def acquire(self) -> None:
+        if self._slots.locked():
+            self.counters["connection_waits"] += 1
+        started = time.perf_counter()
+        await self._slots.acquire()
+        self.counters["connection_wait_seconds"] += time.perf_counter() - started
+        self.in_use += 1
+        self.counters["peak_connections"] = max(self.counters["peak_connections"], self.in_use)
+
+
+    def release(self) -> None:
+        self.in_use -= 1
+        self._slots.release()
+
+
+    @asynccontextmanager
+    async def _round_trip(self, commands: int = 1):
+        await self.acquire()
+        try:
+            self.counters["commands"] += commands
+            await asyncio.sleep(self.latency)
+            yield
+        finally:
+            self.release()
+
+
+    def _alive(self, name: str) -> bool:
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return name in self._data
+
+
+    # commands, applied without awaiting so a pipeline is atomic like MULTI/EXEC
+
+    def _get(self, name: str) -> Optional[bytes]:
+        return self._data[name] if self._alive(name) else None
+
+
+    def _set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[float] = None,
+        px: Optional[float] = None,
+        nx: bool = False
+    ) -> Optional[bool]:
+        if nx and self._alive(name):
+            return None
+        self._data[name] = _encode(value)
+        self._expires.pop(name, None)
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        if ttl is not None:
+            self._expires[name] = time.monotonic() + ttl
+        return True
+
+
+    def _setex(self, name: str, time: float, value: Any) -> bool:
+        return self._set(name, value, ex=time)
+
+
+    def _exists(self, *names: str) -> int:
+        return sum(self._alive(name) for name in names)
+
+
+    def _delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            if self._alive(name):
+                del self._data[name]
+                deleted += 1
+            self._expires.pop(name, None)
+        return deleted
+
+
+    def _incr(self, name: str) -> int:
+        value = int(self._get(name) or 0) + 1
+        self._data[name] = _encode(value)
+        return value
+
+
+    def _expire(self, name: str, seconds: float) -> bool:
+        if not self._alive(name):
+            return False
+        self._expires[name] = time.monotonic() + float(seconds)
+        return True
+
+
+    def _hgetall(self, name: str) -> dict[bytes, bytes]:
+        return dict(self._data[name]) if self._alive(name) else {}
+
+
+    def _hmget(self, name: str, keys: list) -> list[Optional[bytes]]:
+        fields = self._data[name] if self._alive(name) else {}
+        return [fields.get(_encode(key)) for key in keys]
+
+
+    def _hset(self, name: str, key: str, value: Any) -> int:
+        if not self._alive(name):
+            self._data[name] = {}
+        is_new = _encode(key) not in self._data[name]
+        self._data[name][_encode(key)] = _encode(value)
+        return int(is_new)
+
+
+    def _hdel(self, name: str, *keys: str) -> int:
+        if not self._alive(name):
+            return 0
+        return sum(self._data[name].pop(_encode(key), None) is not None for key in keys)
+
+
+    def _sadd(self, name: str, *values: Any) -> int:
+        if not self._alive(name):
+            self._data[name] = set()
+        members = self._data[name]
+        added = {_encode(value) for value in values} - members
+        members.update(added)
+        return len(added)
+
+
+    def _zadd(self, name: str, mapping: dict) -> int:
+        if not self._alive(name):
+            self._data[name] = {}
+        scores = self._data[name]
+        added = sum(_encode(member) not in scores for member in mapping)
+        scores.update({_encode(member): float(score) for member, score in mapping.items()})
+        return added
+
+
+    def _zrange(self, name: str, start: int, end: int) -> list[bytes]:
+        if not self._alive(name):
+            return []
+        members = sorted(self._data[name], key=lambda member: (self._data[name][member], member))
+        return members[start:None if end == -1 else end + 1]
+
+
+    def _zrangebyscore(self, name: str, min: Any, max: Any) -> list[bytes]:
+        low, high = float(min), float(max)
+        return [member for member in self._zrange(name, 0, -1) if low <= self._data[name][member] <= high]
+
+
+    def _zrem(self, name: str, *members: Any) -> int:
+        if not self._alive(name):
+            return 0
+        return sum(self._data[name].pop(_encode(member), None) is not None for member in members)
+
+
+    def _sunion(self, keys, *args: str) -> Members:
+        names = [keys] if isinstance(keys, str) else list(keys)
+        names.extend(args)
+        members: Members = set()
+        for name in names:
+            if self._alive(name):
+                members |= self._data[name]
+        return members
+
+
+    async def get(self, name: str) -> Optional[bytes]:
+        async with self._round_trip():
+            return self._get(name)
+
+
+    async def set(self, name: str, value: Any, ex=None, px=None, nx: bool = False) -> Optional[bool]:
+        async with self._round_trip():
+            return self._set(name, value, ex=ex, px=px, nx=nx)
+
+
+    async def setex(self, name: str, time: float, value: Any) -> bool:
+        async with self._round_trip():
+            return self._setex(name, time, value)
+
+
+    async def exists(self, *names: str) -> int:
+        async with self._round_trip():
+            return self._exists(*names)
+
+
+    async def delete(self, *names: str) -> int:
+        async with self._round_trip():
+            return self._delete(*names)
+
+
+    async def incr(self, name: str) -> int:
+        async with self._round_trip():
+            return self._incr(name)
+
+
+    async def expire(self, name: str, time: float) -> bool:
+        async with self._round_trip():
+            return self._expire(name, time)
+
+
+    async def hgetall(self, name: str) -> dict[bytes, bytes]:
+        async with self._round_trip():
+            return self._hgetall(name)
+
+
+    async def hmget(self, name: str, keys: list) -> list[Optional[bytes]]:
+        async with self._round_trip():
+            return self._hmget(name, keys)
+
+
+    async def hset(self, name: str, key: str, value: Any) -> int:
+        async with self._round_trip():
+            return self._hset(name, key, value)
+
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        async with self._round_trip():
+            return self._hdel(name, *keys)
+
+
+    async def sadd(self, name: str, *values: Any) -> int:
+        async with self._round_trip():
+            return self._sadd(name, *values)
+
+
+    async def zadd(self, name: str, mapping: dict) -> int:
+        async with self._round_trip():
+            return self._zadd(name, mapping)
+
+
+    async def zrange(self, name: str, start: int, end: int) -> list[bytes]:
+        async with self._round_trip():
+            return self._zrange(name, start, end)
+
+
+    async def zrangebyscore(self, name: str, min: Any, max: Any) -> list[bytes]:
+        async with self._round_trip():
+            return self._zrangebyscore(name, min, max)
+
+
+    async def zrem(self, name: str, *members: Any) -> int:
+        async with self._round_trip():
+            return self._zrem(name, *members)
+
+
+    async def sunion(self, keys, *args: str) -> Members:
+        async with self._round_trip():
+            return self._sunion(keys, *args)
+
+
+    async def publish(self, channel: str, message: Any) -> int:
+        async with self._round_trip():
+            queues = self._subscribers.get(channel, [])
+            for queue in queues:
+                queue.put_nowait({"type": "message", "channel": _encode(channel), "data": _encode(message)})
+            return len(queues)
+
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        if self._scripts is None:
+            self._scripts = scripts()
+        run = self._scripts.get(script)
+        if run is None:
+            raise NotImplementedError("InMemoryRedis only runs the app's known Lua scripts")
+        async with self._round_trip():
+            return run(self, list(keys_and_args[:numkeys]), list(keys_and_args[numkeys:]))
+
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+
+    def pubsub(self) -> "InMemoryPubSub":
+        return InMemoryPubSub(self)
+
+
+    async def ping(self) -> bool:
+        async with self._round_trip():
+            return True
+
+
+    async def aclose(self) -> None:
+        return None
+
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "connection_wait_seconds": round(self.counters["connection_wait_seconds"], 4),
+            "max_connections": self.max_connections,
+            "keys": len(self._data)
+        }
+
+
+class InMemoryPipeline:
+    """Queued commands sent in one round trip"""
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self.commands: list[tuple[str, tuple, dict]] = []
+
+
+    def __getattr__(self, command: str):
+        if not hasattr(self.redis, f"_{command}"):
+            raise AttributeError(command)
+
+        def queue(*args, **kwargs) -> "InMemoryPipeline":
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+
+    async def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        async with self.redis._round_trip(len(commands)):
+            return [getattr(self.redis, f"_{command}")(*args, **kwargs) for command, args, kwargs in commands]
+
+
+class InMemoryPubSub:
+    """Holds a pool slot while subscribed, like redis-py's PubSub connection"""
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.channels: list[str] = []
+
+
+    async def subscribe(self, *channels: str) -> None:
+        if not self.channels:
+            await self.redis.acquire()
+        for channel in channels:
+            self.redis._subscribers.setdefault(channel, []).append(self.queue)
+            self.channels.append(channel)
+            self.queue.put_nowait({"type": "subscribe", "channel": _encode(channel), "data": len(self.channels)})
+
+
+    async def listen(self) -> AsyncIterator[dict]:
+        while True:
+            yield await self.queue.get()
+
+
+    async def aclose(self) -> None:
+        if not self.channels:
+            return
+        for channel in self.channels:
+            self.redis._subscribers[channel].remove(self.queue)
+        self.channels = []
+        self.redis.release()
+
+
+def scripts() -> dict[str, Callable]:
+    """Python equivalents of the Lua scripts the app sends with EVAL"""
+    from api.services.chatbot_service import RELEASE_LOCK_SCRIPT, REGISTER_DEPENDENCIES_SCRIPT
+
+    def release_lock(redis: InMemoryRedis, keys: list, args: list) -> int:
+        if redis._get(keys[0]) == _encode(args[0]):
+            return redis._delete(keys[0])
+        return 0
+
+    def register_dependencies(redis: InMemoryRedis, keys: list, args: list) -> int:
+        for key in keys:
+            redis._sadd(key, args[0])
+            redis._expire(key, args[1])
+        return len(keys)
+
+    return {
+        RELEASE_LOCK_SCRIPT: release_lock,
+        REGISTER_DEPENDENCIES_SCRIPT: register_dependencies
+    }
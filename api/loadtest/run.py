@@ -0,0 +1,465 @@
+"""
+Offline load test of api.main:app.
+
+Groq, the embedding model and Redis are replaced by the stand-ins of
+api.loadtest.fakes, the rate limiter is disabled and the query embedding
+disk cache is not touched. Everything else (routing, middleware, caches,
+retrieval over the persisted index, prompt building) is the real app, so
+a performance change can be measured before it reaches production.
+
+Usage:
+    python -m api.loadtest.run                                   # 30s, 16 concurrent users
+    python -m api.loadtest.run --duration 60 --concurrency 64 --stream
+    python -m api.loadtest.run --rate 50 --transport http       # open loop over real sockets
+    python -m api.loadtest.run --mix paraphrase=0.7,off_topic=0.3 --llm-ttft 0.8
+    python -m api.loadtest.run --queries recorded.jsonl --json report.json
+
+--transport asgi (default) calls the app in process; httpx buffers the
+body there, so stream time to first byte is only measured with --transport
+http, which serves the app with uvicorn on a local port.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from api.loadtest.fakes import FakeEmbeddings, FakeGroq, InMemoryRedis
+from api.loadtest.workload import QueryMix, Query, build_pools, load_queries, parse_mix
+
+# only used when the environment doesn't provide them, the fakes never call out
+PLACEHOLDER_ENV = {
+    "EMBEDDING_MODEL_API_KEY": "loadtest",
+    "MODEL_NAME": "models/gemini-embedding-001",
+    "LLM_API_KEY": "loadtest",
+    "LLM_NAME": "loadtest",
+    "DEV_ORIGIN": "http://localhost:3000",
+    "PROD_ORIGIN": "http://localhost:3000",
+    "REQUEST_SECRET_KEY": "loadtest"
+}
+# forced: fake query vectors must not reach the shared disk cache, and the
+# fake embedder reuses the stored vectors whatever model built them. Exported
+# for the modules not imported yet, set on the settings for those that are
+FORCED_SETTINGS = {
+    "EMBEDDING_CACHE_DISK_ENABLED": False,
+    "VERIFY_INDEX_ON_STARTUP": False,
+    "WARMUP_ON_STARTUP": False,
+    "KNOWLEDGE_WATCH_ENABLED": False
+}
+SAMPLE_INTERVAL = 0.05  # seconds between saturation samples
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def latency_summary(values: list[float]) -> dict[str, float]:
+    """p50/p95/p99/max in milliseconds"""
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "max": round(max(values, default=0.0) * 1000, 1)
+    }
+
+
+def answer_source(server_timing: str) -> str:
+    """source desc of the Server-Timing header"""
+    for entry in server_timing.split(","):
+        name, _, params = entry.strip().partition(";")
+        if name == "source":
+            return params.partition("desc=")[2].strip('"') or "unknown"
+    return "unknown"
+
+
+@dataclass
+class Sample:
+    kind: str
+    status: int
+    latency: float
+    ttfb: Optional[float] = None
+    source: str = "unknown"
+    error: Optional[str] = None
+
+
+@dataclass
+class Saturation:
+    """Peaks sampled every SAMPLE_INTERVAL while the load runs"""
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    peak_threads: int = 0
+    peak_executor_queue: int = 0
+    loop_lag: list[float] = field(default_factory=list)
+
+
+def configure_environment() -> None:
+    for name, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(name, value)
+    os.environ.update({name: str(value).lower() for name, value in FORCED_SETTINGS.items()})
+
+
+def force_settings() -> None:
+    """The environment is read once, when the settings are first imported"""
+    from api.config.settings import settings
+
+    for name, value in FORCED_SETTINGS.items():
+        setattr(settings, name, value)
+
+
+def install_fakes(args: argparse.Namespace) -> dict:
+    """Swap the external clients of the imported app modules for the fakes"""
+    from api.routes.chatbot_router import limiter
+    from api.scripts import chatbot
+    from api.scripts.vector_store import embedding_model, vector_store
+    from api.services.chatbot_service import chatbot_service
+
+    force_settings()
+    stored = vector_store.get(include=["documents", "embeddings"])
+    if not stored["ids"]:
+        raise SystemExit("The index is empty, run `python -m api.ingest build` first")
+
+    fakes = {
+        "llm": FakeGroq(
+            ttft=args.llm_ttft,
+            tokens_per_second=args.llm_tps,
+            answer_tokens=args.llm_answer_tokens,
+            error_rate=args.llm_error_rate,
+            seed=args.seed
+        ),
+        "embeddings": FakeEmbeddings(
+            stored["documents"],
+            stored["embeddings"],
+            noise=args.embed_noise,
+            latency=args.embed_latency
+        ),
+        "redis": InMemoryRedis(latency=args.redis_latency, max_connections=args.redis_connections)
+    }
+    chatbot.llm = fakes["llm"]
+    embedding_model.embeddings = fakes["embeddings"]
+    # the disk store may be open already, and L1 may hold vectors of the real model
+    embedding_model._db = None
+    embedding_model._l1.clear()
+    chatbot_service.redis_client = fakes["redis"]
+    if chatbot_service.semantic_cache:
+        chatbot_service.semantic_cache.redis_client = fakes["redis"]
+    limiter.enabled = False
+    return fakes
+
+
+async def send(client: httpx.AsyncClient, query: Query, path: str, headers: dict, stream: bool) -> Sample:
+    started = time.perf_counter()
+    try:
+        if not stream:
+            response = await client.post(path, json=query.payload(), headers=headers)
+            return Sample(
+                kind=query.kind,
+                status=response.status_code,
+                latency=time.perf_counter() - started,
+                source=answer_source(response.headers.get("server-timing", "")),
+                error=None if response.status_code == 200 else response.text[:200]
+            )
+
+        ttfb = None
+        last_event = None
+        async with client.stream("POST", path, json=query.payload(), headers=headers) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    last_event = line[len("event:"):].strip()
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - started
+        error = None
+        if response.status_code != 200 or last_event != "done":
+            error = f"stream ended with {last_event or 'no event'}"
+        return Sample(
+            kind=query.kind,
+            status=response.status_code,
+            latency=time.perf_counter() - started,
+            ttfb=ttfb,
+            source=answer_source(response.headers.get("server-timing", "")),
+            error=error
+        )
+    except httpx.HTTPError as e:
+        return Sample(query.kind, 0, time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+
+
+async def sample_saturation(saturation: Saturation, stop: asyncio.Event) -> None:
+    """Event loop lag, threads and default executor backlog while the load runs"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = time.perf_counter() + SAMPLE_INTERVAL
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        saturation.loop_lag.append(max(0.0, time.perf_counter() - expected))
+        saturation.peak_threads = max(saturation.peak_threads, threading.active_count())
+        # private attributes, absent until the first to_thread call
+        work_queue = getattr(getattr(loop, "_default_executor", None), "_work_queue", None)
+        if work_queue is not None:
+            saturation.peak_executor_queue = max(saturation.peak_executor_queue, work_queue.qsize())
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    mix: QueryMix,
+    args: argparse.Namespace,
+    headers: dict,
+    saturation: Saturation
+) -> tuple[list[Sample], float]:
+    """Closed loop (--concurrency users back to back) or open loop (--rate arrivals per second)"""
+    path = "/api/chat-ai/chat/stream" if args.stream else "/api/chat-ai/chat"
+    samples: list[Sample] = []
+    sent = 0
+
+    async def one(query: Query) -> None:
+        saturation.in_flight += 1
+        saturation.peak_in_flight = max(saturation.peak_in_flight, saturation.in_flight)
+        try:
+            samples.append(await send(client, query, path, headers, args.stream))
+        finally:
+            saturation.in_flight -= 1
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    def more() -> bool:
+        return time.perf_counter() < deadline and (not args.requests or sent < args.requests)
+
+    if args.rate:
+        # open loop: arrivals don't wait for responses, so queueing shows up as latency
+        tasks = set()
+        while more():
+            await asyncio.sleep(mix.rng.expovariate(args.rate))
+            if saturation.in_flight >= args.concurrency:
+                samples.append(Sample("dropped", 0, 0.0, error="client concurrency limit"))
+                continue
+            sent += 1
+            task = asyncio.create_task(one(mix.next()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    else:
+        async def user() -> None:
+            nonlocal sent
+            while more():
+                sent += 1
+                await one(mix.next())
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+
+    return samples, time.perf_counter() - started
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    configure_environment()
+    from api.config.settings import settings
+    from api.main import app
+    from api.scripts.knowledge_catalog import catalog
+
+    fakes = install_fakes(args)
+    if args.queries:
+        mix = QueryMix(replay=load_queries(args.queries), seed=args.seed)
+    else:
+        weights = parse_mix(args.mix) if args.mix else None
+        mix = QueryMix(build_pools(catalog, args.seed), weights, seed=args.seed)
+    headers = {"request-secret-key": settings.REQUEST_SECRET_KEY} if settings.REQUEST_SECRET_KEY else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with app.router.lifespan_context(app):
+        server = server_task = None
+        if args.transport == "http":
+            import uvicorn
+            port = free_port()
+            server = uvicorn.Server(uvicorn.Config(
+                app, host="127.0.0.1", port=port, lifespan="off", log_level="warning", access_log=False
+            ))
+            server_task = asyncio.create_task(server.serve())
+            while not server.started:
+                await asyncio.sleep(0.01)
+            client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=timeout)
+        else:
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout
+            )
+
+        saturation = Saturation()
+        stop = asyncio.Event()
+        try:
+            async with client:
+                if args.warmup:
+                    warmup = argparse.Namespace(**{**vars(args), "requests": args.warmup, "rate": None})
+                    await drive(client, mix, warmup, headers, Saturation())
+                    print(f"Warm-up: {args.warmup} request(s)")
+
+                sampler = asyncio.create_task(sample_saturation(saturation, stop))
+                samples, elapsed = await drive(client, mix, args, headers, saturation)
+                stop.set()
+                await sampler
+        finally:
+            if server is not None:
+                server.should_exit = True
+                await server_task
+
+    return build_report(args, samples, elapsed, saturation, fakes)
+
+
+def build_report(
+    args: argparse.Namespace,
+    samples: list[Sample],
+    elapsed: float,
+    saturation: Saturation,
+    fakes: dict
+) -> dict:
+    completed = [sample for sample in samples if sample.kind != "dropped"]
+    ok = [sample for sample in completed if not sample.error]
+    ttfbs = [sample.ttfb for sample in ok if sample.ttfb is not None]
+
+    by_kind = {}
+    for kind in sorted({sample.kind for sample in completed}):
+        latencies = [sample.latency for sample in ok if sample.kind == kind]
+        by_kind[kind] = {
+            "requests": sum(sample.kind == kind for sample in completed),
+            **latency_summary(latencies)
+        }
+
+    return {
+        "config": {
+            "transport": args.transport,
+            "endpoint": "stream" if args.stream else "chat",
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "llm_ttft": args.llm_ttft,
+            "llm_tps": args.llm_tps,
+            "embed_latency": args.embed_latency,
+            "redis_latency": args.redis_latency
+        },
+        "requests": len(completed),
+        "errors": len(completed) - len(ok),
+        "dropped": len(samples) - len(completed),
+        "duration_seconds": round(elapsed, 2),
+        "rps": round(len(ok) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": latency_summary([sample.latency for sample in ok]),
+        "ttfb_ms": latency_summary(ttfbs) if ttfbs else None,
+        "by_kind": by_kind,
+        # streamed responses send their headers before the answer source is known
+        "sources": None if args.stream else dict(Counter(sample.source for sample in ok).most_common()),
+        "statuses": dict(Counter(sample.status for sample in completed).most_common()),
+        "error_samples": sorted({sample.error for sample in completed if sample.error})[:5],
+        "saturation": {
+            "peak_in_flight": saturation.peak_in_flight,
+            "peak_threads": saturation.peak_threads,
+            "peak_executor_queue": saturation.peak_executor_queue,
+            "loop_lag_ms": latency_summary(saturation.loop_lag),
+            "redis": fakes["redis"].stats()
+        },
+        "fakes": {
+            "llm": fakes["llm"].counters,
+            "embeddings": fakes["embeddings"].counters
+        }
+    }
+
+
+def print_report(report: dict) -> None:
+    config = report["config"]
+    print(
+        f"\n{report['requests']} request(s) in {report['duration_seconds']}s over {config['transport']} "
+        f"({config['endpoint']}, {'rate ' + str(config['rate']) + '/s' if config['rate'] else 'concurrency ' + str(config['concurrency'])})"
+    )
+    print(f"Throughput: {report['rps']} req/s, {report['errors']} error(s), {report['dropped']} dropped")
+
+    def row(label: str, summary: dict, requests: str = "") -> None:
+        print(f"  {label:<14} {requests:>8} {summary['p50']:>9} {summary['p95']:>9} {summary['p99']:>9} {summary['max']:>9}")
+
+    print(f"\n  {'latency ms':<14} {'requests':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    row("all", report["latency_ms"], str(report["requests"]))
+    if report["ttfb_ms"]:
+        row("first byte", report["ttfb_ms"])
+    for kind, summary in report["by_kind"].items():
+        row(kind, summary, str(summary["requests"]))
+
+    print()
+    if report["sources"]:
+        print(f"Answer sources: {report['sources']}")
+    print(f"Statuses: {report['statuses']}")
+    for error in report["error_samples"]:
+        print(f"  error: {error}")
+
+    saturation = report["saturation"]
+    redis = saturation["redis"]
+    print(
+        f"\nSaturation: peak {saturation['peak_in_flight']} in flight, {saturation['peak_threads']} threads, "
+        f"executor queue {saturation['peak_executor_queue']}, "
+        f"event loop lag p99 {saturation['loop_lag_ms']['p99']}ms (max {saturation['loop_lag_ms']['max']}ms)"
+    )
+    print(
+        f"Redis: {redis['commands']} commands, peak {redis['peak_connections']}/{redis['max_connections']} "
+        f"connections, {redis['connection_waits']} wait(s) for a connection ({redis['connection_wait_seconds']}s)"
+    )
+    print(f"Fakes: llm {report['fakes']['llm']}, embeddings {report['fakes']['embeddings']}")
+
+    llm = report["fakes"]["llm"]
+    if llm["rephrases"] and llm["calls"] == llm["rephrases"] + llm["errors"]:
+        print(
+            "\nNo answer was generated: every retrieval failed the quality gate. If the index was "
+            "built with another embedding model, its distances may not fit RETRIEVAL_QUALITY_THRESHOLD "
+            "and RETRIEVAL_RELEVANCE_THRESHOLD, set them for the run."
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m api.loadtest.run", description="Offline load test of the chat API")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0: duration only)")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed loop users, or max in flight with --rate")
+    parser.add_argument("--rate", type=float, default=None, help="open loop Poisson arrivals per second")
+    parser.add_argument("--warmup", type=int, default=0, help="requests sent before measuring")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream instead of /chat")
+    parser.add_argument("--transport", choices=("asgi", "http"), default="asgi")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--mix", help="kind=weight,... of qa_question, qa_variant, paraphrase, follow_up, off_topic")
+    parser.add_argument("--queries", type=Path, help="JSONL of recorded requests to replay instead of a mix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-ttft", type=float, default=0.3, help="fake Groq time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=80.0, help="fake Groq tokens per second")
+    parser.add_argument("--llm-answer-tokens", type=int, default=60)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="fake embedding call latency (s)")
+    parser.add_argument("--embed-noise", type=float, default=0.15, help="query vector noise, higher: fewer semantic cache hits")
+    parser.add_argument("--redis-latency", type=float, default=0.002, help="fake Redis round trip (s)")
+    parser.add_argument("--redis-connections", type=int, default=None, help="default: REDIS_MAX_CONNECTIONS")
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    parser.add_argument("--log-level", default="WARNING", help="app log level during the run")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s %(name)s: %(message)s")
+    if args.redis_connections is None:
+        configure_environment()
+        from api.config.settings import settings
+        args.redis_connections = settings.REDIS_MAX_CONNECTIONS
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
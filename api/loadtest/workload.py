@@ -0,0 +1,140 @@
+"""
+Query mixes replayed by the load test, built from the knowledge catalog or
+read from a JSONL file of recorded requests.
+"""
+import json
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from api.scripts.knowledge_catalog import KnowledgeCatalog
+
+# questions the knowledge base can't answer (weak retrieval, fallback)
+OFF_TOPIC = (
+    "what is the capital of france",
+    "can you help me with my math homework",
+    "recommend a good laptop for gaming",
+    "what's the weather tomorrow in cebu",
+    "how do i reset my router password",
+    "who won the basketball game last night"
+)
+# how widget users decorate a question
+PREFIXES = ("", "", "hi ", "hello po ", "good day, ", "ask ko lang ")
+SUFFIXES = ("", "", " po", " pls", "?", " po?", " thanks")
+
+# kind: weight. qa_question/qa_variant mostly take the QA fast path,
+# paraphrase the cache or RAG, follow_up the deterministic qa_id/action_id flow
+DEFAULT_MIX = {
+    "qa_question": 0.15,
+    "qa_variant": 0.15,
+    "paraphrase": 0.4,
+    "follow_up": 0.2,
+    "off_topic": 0.1
+}
+
+
+@dataclass(frozen=True)
+class Query:
+    kind: str
+    message: str
+    qa_id: Optional[str] = None
+    action_id: Optional[str] = None
+
+    def payload(self) -> dict:
+        """ChatRequest body"""
+        payload = {"message": self.message}
+        if self.qa_id:
+            payload["qa_id"] = self.qa_id
+        if self.action_id:
+            payload["action_id"] = self.action_id
+        return payload
+
+
+def paraphrase(question: str, rng: random.Random) -> str:
+    """Lowercase the question and wrap it the way users type it"""
+    return f"{rng.choice(PREFIXES)}{question.lower().rstrip('?!. ')}{rng.choice(SUFFIXES)}"
+
+
+def build_pools(knowledge: KnowledgeCatalog, seed: int = 0, paraphrases: int = 3) -> dict[str, list[Query]]:
+    """Queries of every kind of DEFAULT_MIX, from the catalog"""
+    rng = random.Random(seed)
+    pools: dict[str, list[Query]] = {kind: [] for kind in DEFAULT_MIX}
+
+    for qa in knowledge.qa_entries.values():
+        if qa.primary_question:
+            pools["qa_question"].append(Query("qa_question", qa.primary_question))
+        pools["qa_variant"].extend(Query("qa_variant", variant) for variant in qa.variants)
+        for question in qa.questions:
+            if not question:
+                continue
+            pools["paraphrase"].extend(
+                Query("paraphrase", paraphrase(question, rng)) for _ in range(paraphrases)
+            )
+
+    for group in knowledge.follow_ups.values():
+        for suggestion in group.suggestions:
+            pools["follow_up"].append(
+                Query("follow_up", suggestion.text, qa_id=suggestion.qa_id, action_id=suggestion.action_id)
+            )
+
+    pools["off_topic"] = [Query("off_topic", question) for question in OFF_TOPIC]
+    return {kind: queries for kind, queries in pools.items() if queries}
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """'paraphrase=0.5,follow_up=0.5' -> {"paraphrase": 0.5, "follow_up": 0.5}"""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Unknown query kind '{kind.strip()}', expected one of {', '.join(DEFAULT_MIX)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def load_queries(path: Path) -> list[Query]:
+    """Recorded requests, one JSON object per line: message, optional qa_id, action_id and kind"""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            queries.append(Query(
+                kind=data.get("kind", "replay"),
+                message=data.get("message", ""),
+                qa_id=data.get("qa_id"),
+                action_id=data.get("action_id")
+            ))
+    return queries
+
+
+class QueryMix:
+    """Endless, seeded stream of queries: weighted kinds, or a recording replayed in order"""
+    def __init__(
+        self,
+        pools: Optional[dict[str, list[Query]]] = None,
+        weights: Optional[dict[str, float]] = None,
+        replay: Optional[list[Query]] = None,
+        seed: int = 0
+    ):
+        self.rng = random.Random(seed)
+        self.replay = replay
+        self.position = 0
+        self.pools = pools or {}
+        weights = weights or DEFAULT_MIX
+        self.kinds = [kind for kind in weights if weights[kind] > 0 and self.pools.get(kind)]
+        self.weights = [weights[kind] for kind in self.kinds]
+        if not replay and not self.kinds:
+            raise ValueError("Empty query mix")
+
+
+    def next(self) -> Query:
+        if self.replay:
+            query = self.replay[self.position % len(self.replay)]
+            self.position += 1
+            return query
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        return self.rng.choice(self.pools[kind])
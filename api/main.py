@@ -1,14 +1,57 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+import asyncio
+
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
 from api.config.settings import settings
-from api.routes.chatbot_router import chatbot_router
+from api.routes.chatbot_router import chatbot_router, verify_admin_key
+from api.scripts.vector_store import verify_vector_store
+from api.services.chatbot_service import chatbot_service
+from api.services.knowledge_reload import knowledge_reloader
+from api.utils import metrics
+from api.utils.tracing import REQUEST_ID_HEADER, RequestTraceMiddleware
+from api.warmup import startup_warmup
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Refuse to serve from a missing or stale index.
+    The index is written by `python -m api.ingest build`, never by the server.
+    """
+    if settings.VERIFY_INDEX_ON_STARTUP:
+        problems = await asyncio.to_thread(verify_vector_store)
+        if problems:
+            raise RuntimeError(
+                "Vector index is missing or stale, run `python -m api.ingest build` first: "
+                + "; ".join(problems)
+            )
+    # keep in-process cached answers coherent with the other workers
+    background_tasks = [
+        asyncio.create_task(chatbot_service.listen_for_invalidations()),
+        # reload the knowledge base when another worker or the ingest CLI rebuilt it
+        asyncio.create_task(knowledge_reloader.listen())
+    ]
+    if settings.KNOWLEDGE_WATCH_ENABLED:
+        background_tasks.append(
+            asyncio.create_task(knowledge_reloader.watch(settings.KNOWLEDGE_WATCH_INTERVAL))
+        )
+    # pre-generate answers for the QA questions while serving traffic
+    if settings.WARMUP_ON_STARTUP:
+        background_tasks.append(asyncio.create_task(startup_warmup()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await chatbot_service.close()
+
+
 app = FastAPI(
     title="FAQs Chatbot for CVMS Website",
     description="Stateless chatbot to answer FAQs efficiently and autonomously",
-    version="0.1"
+    version="0.1",
+    lifespan=lifespan
 )
 
 # CORS Configuration - Allow request from frontend
@@ -18,8 +61,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["POST", "GET"],
     allow_headers=["*"],  # Allows all headers
+    # readable by the frontend to correlate slow requests with backend stages
+    expose_headers=[REQUEST_ID_HEADER, "Server-Timing"],
   )
 
+# request id, Server-Timing header and optional OpenTelemetry spans
+app.add_middleware(
+    RequestTraceMiddleware,
+    server_timing=settings.SERVER_TIMING_ENABLED,
+    timing_allow_origin=f"{settings.DEV_ORIGIN}, {settings.PROD_ORIGIN}",
+    otel=settings.OTEL_TRACING_ENABLED
+)
+
 # custom exception handler for rate limit
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded):
@@ -53,6 +106,22 @@ async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded)
         
 app.include_router(chatbot_router)
 
+
+async def verify_metrics_enabled():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+@app.get(
+    "/metrics",
+    include_in_schema=False,
+    dependencies=[Depends(verify_metrics_enabled), Depends(verify_admin_key)]
+)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint, scraped with the admin secret key"""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
 # API Root endpoint
 @app.get("/")
 async def root():
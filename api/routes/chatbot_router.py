@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
+from fastapi.responses import StreamingResponse
 
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from datetime import datetime, timezone
-import asyncio
+import json
 import logging
+import secrets
 
 from api.config.settings import settings
-from api.scripts.chatbot import retriever
+from api.scripts import chatbot as chatbot_module
+from api.scripts.chatbot import llm_breaker, prompt_builder, retry_policy
+from api.scripts.vector_store import embedding_model
 from api.schemas.chatbot_schemas import *
 from api.services.chatbot_service import chatbot_service
+from api.services.knowledge_reload import knowledge_reloader
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +31,30 @@ async def health_check(request: Request):
     """
     try:
         # Test the retriever
-        test_docs = await asyncio.to_thread(retriever.invoke, "test")
+        # looked up on each call, a knowledge reload swaps the retriever
+        test_docs = await chatbot_module.retriever.ainvoke("test")
+        
+        llm_circuit = llm_breaker.stats()
         
         return {
-            "status": "healthy",
+            # degraded: the LLM circuit is open, answers come from stored QA entries
+            "status": "healthy" if llm_circuit["state"] == "closed" else "degraded",
             "vector_store": "connected",
-            "documents_in_store": len(test_docs) > 0
+            "llm_circuit": llm_circuit,
+            "documents_in_store": len(test_docs) > 0,
+            "embedding_cache": embedding_model.stats(),
+            "semantic_cache": (
+                chatbot_service.semantic_cache.stats()
+                if chatbot_service.semantic_cache else None
+            ),
+            "single_flight": chatbot_service.single_flight.stats(),
+            "retries": retry_policy.stats(),
+            "prompt": prompt_builder.stats(),
+            "response_cache": (
+                chatbot_service.response_cache.stats()
+                if chatbot_service.response_cache else None
+            ),
+            "knowledge_reload": knowledge_reloader.stats()
         }
     except Exception as e:
         logger.error(f"Chatbot service health check failed: {str(e)}")
@@ -51,6 +74,50 @@ async def verify_request_key(request_secret_key: str = Header(None)):
         )
         
         
+async def verify_admin_key(admin_secret_key: str = Header(None), authorization: str = Header(None)):
+    """
+    Verify the admin secret key, admin endpoints don't exist without one configured.
+    The key is also accepted as a bearer token, what Prometheus scrape configs send.
+    """
+    if not settings.ADMIN_SECRET_KEY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not admin_secret_key and authorization and authorization[:7].lower() == "bearer ":
+        admin_secret_key = authorization[7:]
+    if not admin_secret_key or not secrets.compare_digest(admin_secret_key, settings.ADMIN_SECRET_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid request"
+        )
+
+
+@chatbot_router.post("/admin/reload", status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("5/minute")
+async def reload_knowledge(
+    request: Request,
+    rebuild_index: bool = True,
+    _: None = Depends(verify_admin_key)
+):
+    """
+    Reload the knowledge base (api/documents) in the background, without a restart.
+    param: rebuild_index: embed changed chunks and rewrite the index files first
+    (False: only reload the catalog and glossary, reopen the current index)
+    Progress and the last result: GET /admin/reload
+    """
+    if not knowledge_reloader.start(rebuild_index=rebuild_index):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A knowledge reload is already running"
+        )
+    return {"status": "started", "rebuild_index": rebuild_index}
+
+
+@chatbot_router.get("/admin/reload")
+@limiter.limit("30/minute")
+async def reload_status(request: Request, _: None = Depends(verify_admin_key)):
+    """Status of the knowledge reload in this worker"""
+    return knowledge_reloader.stats()
+
+
 @chatbot_router.post("/chat-react", response_model=ChatReactResponse)
 @limiter.limit("20/minute")
 async def chat_react(
@@ -135,4 +202,57 @@ async def chat(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error while processing chat request"
         )
-        
\ No newline at end of file
+        
+
+@chatbot_router.post("/chat/stream")
+@limiter.limit("10/minute")
+async def chat_stream(
+    request: Request,
+    chat_request: ChatRequest,
+    _: None = Depends(verify_request_key)  # hash secret key dependency
+):
+    """
+    Chat endpoint - streams the answer as Server-Sent Events.
+    event "token": {"text"} chunk of the answer, sent as the LLM generates it
+    event "done": the complete ChatResponse (cache hits only send this event)
+    event "error": {"detail"}
+    """
+    # if filled, the request likely made by bot 
+    if chat_request.honeypot:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid request"
+        )
+    
+    async def event_stream():
+        try:
+            async for event, data in chatbot_service.stream_chat_response(
+                message=chat_request.message,
+                qa_id=chat_request.qa_id,
+                action_id=chat_request.action_id
+            ):
+                if event == "done":
+                    data = ChatResponse(
+                        role="assistant",
+                        message=data["message"],
+                        created_at=datetime.now(timezone.utc),
+                        actions=[ActionLink(**action) for action in data["actions"]],
+                        message_suggestions=[MessageSuggestion(**sugg) for sugg in data["message_suggestions"]]
+                    ).model_dump(mode="json")
+                
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        
+        except Exception as e:
+            logger.exception(f"Chat stream endpoint error: {str(e)}")
+            error = {"detail": "Internal server error while processing chat request"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # disable proxy buffering so tokens reach the client immediately
+            "X-Accel-Buffering": "no"
+        }
+    )
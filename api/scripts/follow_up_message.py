@@ -1,80 +1,51 @@
-import json
-from pathlib import Path
+from collections import defaultdict
 import logging
 
+from api.scripts.knowledge_catalog import FollowUpRecord, KnowledgeCatalog, QARecord, catalog
+
 logger = logging.getLogger(__name__)
 
 class FollowUpMessage:
-    def __init__(self):
-        try:
-            THIS_FILE_DIR = Path(__file__).parent
-            DOCS_DIR = THIS_FILE_DIR.parent / "documents"
-            
-            follow_up_questions_file = DOCS_DIR / "suggest-follow-up-questions.json"
-            if not follow_up_questions_file.exists():
-                raise FileExistsError(f"File not found: {follow_up_questions_file.name}")
-        
-            self.follow_up_questions_data = {}
-            
-            # load follow_up_questions_file JSON file
-            with open(follow_up_questions_file, 'r', encoding='utf-8') as f:
-                self.follow_up_questions_data: dict = json.load(f)
-                
-            qa_file = DOCS_DIR / "cvms-qa-structured-data.jsonl"
-            if not qa_file.exists():
-                raise FileExistsError(f"File not found: {qa_file.name}")
-            
-            self.qa_file_data = {}
-            
-            # load cvms-qa-structured-data.jsonl JSONL file
-            with open(qa_file, 'r', encoding='utf-8') as f:
-                for line_number, line in enumerate(f, 1):
-                    line = line.strip()
-                    if not line: # skip empty lines
-                        continue
-                    
-                    qa_entry = json.loads(line)
-                    if "id" in qa_entry:
-                        self.qa_file_data[qa_entry["id"]] = qa_entry
-                    
-            action_file = DOCS_DIR / "cvms-structured-data.json"
-            if not action_file.exists():
-                raise FileExistsError(f"File not found: {action_file.name}")
-            
-            self.action_data = {}
-            
-            # load cvms-structured-data.json JSON file
-            with open(action_file, 'r', encoding='utf-8') as f:
-                action_list = json.load(f)
-                self.action_data = {action['id']: action for action in action_list}
+    def __init__(self, knowledge_catalog: KnowledgeCatalog = catalog):
+        self.catalog = knowledge_catalog
+        self.build_tag_index()
+    
+
+    def build_tag_index(self) -> None:
+        """
+        Precompute the keyword lookup of get_suggestions_by_keywords:
+        tag_entries keeps the follow-up records in file order, tag_postings maps
+        a lowercased tag word to the (entry index, tag index) pairs containing it
+        """
+        tag_entries: list[FollowUpRecord] = list(self.catalog.follow_ups.values())
+        tag_postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
         
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSON error: {e}")
-            
-        except KeyError as e:
-            logger.warning(f"Missing key: {e}")
+        for entry_index, group in enumerate(tag_entries):
+            for tag_index, tag in enumerate(group.tags):
+                for word in set(tag.lower().split()):
+                    tag_postings[word].append((entry_index, tag_index))
         
-        except Exception:
-            raise    
+        # rebuilt after a knowledge reload, swapped in together
+        self.tag_entries, self.tag_postings = tag_entries, dict(tag_postings)
+    
     
-
     def suggest_follow_ups(self, qa_id: str) -> list[dict[str, str]]:
         """
         Args:
             qa_id: use to map a key in suggest-follow-up-questions.json file
         """
-        data = self.follow_up_questions_data.get(qa_id)
-        if data and "suggestions" in data:
-            return data["suggestions"][:3]
+        group = self.catalog.follow_ups.get(qa_id)
+        if group:
+            return [suggestion.to_dict() for suggestion in group.suggestions[:3]]
         return []
     
     
-    def from_qa_follow_ups(self, qa_id: str) -> dict:
+    def from_qa_follow_ups(self, qa_id: str) -> QARecord | None:
         """
         Args:
             qa_id: use to map an answer key in cvms-qa-structured-data.jsonl file
         """
-        return self.qa_file_data.get(qa_id)
+        return self.catalog.qa(qa_id)
 
 
     def get_suggestions_by_keywords(self, message: str) -> list[dict]:
@@ -88,38 +59,34 @@ class FollowUpMessage:
         - Take 1 suggestion from each top entry until we have 3 total
         - Deduplicate by action_id/qa_id to avoid showing same button twice
         """
-        message_lower = message.lower()
-        message_words = set(message_lower.split())
+        message_words = set(message.lower().split())
         
-        # Collect all matches with their scores
-        matches = []
+        # Count shared words per (entry, tag), only for tags sharing a word with the message
+        tag_overlaps: dict[tuple[int, int], int] = defaultdict(int)
+        for word in message_words:
+            for posting in self.tag_postings.get(word, ()):
+                tag_overlaps[posting] += 1
         
-        for qa_id, data in self.follow_up_questions_data.items():
-            tags = data.get("tags", [])
-            
-            # Find highest overlap for this entry
-            max_overlap = 0
-            for tag in tags:
-                tag_words = set(tag.lower().split())
-                overlap = len(message_words & tag_words)
-                if overlap > max_overlap:
-                    max_overlap = overlap
-            
-            # Only include if there's actual overlap
-            if max_overlap > 0:
-                matches.append({
-                    'qa_id': qa_id,
-                    'data': data,
-                    'overlap': max_overlap
-                })
-                logger.info(f"Match: {qa_id} (overlap: {max_overlap})")
+        # Highest overlap per entry
+        entry_overlaps: dict[int, int] = {}
+        for (entry_index, _), overlap in tag_overlaps.items():
+            if overlap > entry_overlaps.get(entry_index, 0):
+                entry_overlaps[entry_index] = overlap
+        
+        # Sort by overlap score (highest first), ties in file order
+        matches = []
+        for entry_index in sorted(entry_overlaps, key=lambda i: (-entry_overlaps[i], i)):
+            group = self.tag_entries[entry_index]
+            matches.append({
+                'qa_id': group.qa_id,
+                'data': group,
+                'overlap': entry_overlaps[entry_index]
+            })
+            logger.debug(f"Match: {group.qa_id} (overlap: {entry_overlaps[entry_index]})")
         
         if not matches:
             return []
         
-        # Sort by overlap score (highest first)
-        matches.sort(key=lambda x: x['overlap'], reverse=True)
-        
         # Mix suggestions from top matches
         mixed_suggestions = []
         seen_ids = set()  # Track to avoid duplicates
@@ -134,20 +101,20 @@ class FollowUpMessage:
                 if len(mixed_suggestions) >= max_suggestions:
                     break
                 
-                suggestions = match['data'].get('suggestions', [])
+                suggestions = match['data'].suggestions
                 
                 # Get next suggestion from this entry
                 if suggestion_index < len(suggestions):
                     suggestion = suggestions[suggestion_index]
                     
                     # Create unique ID for deduplication
-                    unique_id = suggestion.get('action_id') or suggestion.get('qa_id')
+                    unique_id = suggestion.target_id
                     
                     if unique_id and unique_id not in seen_ids:
-                        mixed_suggestions.append(suggestion)
+                        mixed_suggestions.append(suggestion.to_dict())
                         seen_ids.add(unique_id)
                         added_any = True
-                        logger.info(f"Added suggestion: {suggestion.get('text')} from {match['qa_id']}")
+                        logger.debug(f"Added suggestion: {suggestion.text} from {match['qa_id']}")
             
             if not added_any:
                 break  # No more suggestions to add
@@ -172,21 +139,21 @@ class FollowUpMessage:
         if qa_id:
             qa_entry = self.from_qa_follow_ups(qa_id)
             if qa_entry:
-                message = qa_entry.get("answer", "")
+                message = qa_entry.answer
                 
                 # Attach action button if it exists in metadata
-                target_action_id = qa_entry.get("action_id")
-                if target_action_id and target_action_id in self.action_data:
-                    actions.append(self.action_data[target_action_id])
+                action = self.catalog.action(qa_entry.action_id)
+                if action:
+                    actions.append(action.to_dict())
                 
                 # Fetch its own follow-up suggestions
                 suggestions = self.suggest_follow_ups(qa_id)
         
         elif action_id:
-            if action_id in self.action_data:
-                action = self.action_data[action_id]
-                actions.append(action)
-                message = f"You can view {action.get('title', 'this page')} here 👇"
+            action = self.catalog.action(action_id)
+            if action:
+                actions.append(action.to_dict())
+                message = f"You can view {action.title or 'this page'} here 👇"
 
         return message, actions, suggestions
 
@@ -0,0 +1,325 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+THIS_FILE_DIR = Path(__file__).parent
+DOCS_DIR = THIS_FILE_DIR.parent / "documents"
+ACTIONS_FILE = "cvms-structured-data.json"
+QA_FILE = "cvms-qa-structured-data.jsonl"
+FOLLOW_UPS_FILE = "suggest-follow-up-questions.json"
+
+
+def _text(data: dict, key: str, default: str = "") -> str:
+    value = data.get(key, default)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"'{key}' must be a string")
+    return value
+
+
+def _texts(data: dict, key: str) -> tuple[str, ...]:
+    values = data.get(key) or []
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError(f"'{key}' must be a list of strings")
+    return tuple(values)
+
+
+def _required(data: dict, key: str) -> str:
+    value = _text(data, key)
+    if not value:
+        raise KeyError(key)
+    return value
+
+
+@dataclass(frozen=True, slots=True)
+class ActionRecord:
+    """One page of cvms-structured-data.json"""
+    id: str
+    title: str
+    url: str
+    button_text: str
+    description: str = ""
+    category: str = "General"
+    intent: tuple[str, ...] = ()
+    priority: int = 10
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ActionRecord":
+        return cls(
+            id=_required(data, "id"),
+            title=_required(data, "title"),
+            url=_required(data, "url"),
+            button_text=_required(data, "button_text"),
+            description=_text(data, "description"),
+            category=_text(data, "category", "General"),
+            intent=_texts(data, "intent"),
+            priority=int(data.get("priority", 10))
+        )
+
+
+    def to_link(self) -> dict[str, str]:
+        """The action button sent to the client"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'url': self.url,
+            'button_text': self.button_text
+        }
+
+
+    def to_dict(self) -> dict:
+        """Same shape as the source JSON entry"""
+        return {
+            'id': self.id,
+            'intent': list(self.intent),
+            'title': self.title,
+            'url': self.url,
+            'description': self.description,
+            'category': self.category,
+            'priority': self.priority,
+            'button_text': self.button_text
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class QARecord:
+    """One pre-defined Q&A entry of cvms-qa-structured-data.jsonl"""
+    id: str
+    primary_question: str = ""
+    variants: tuple[str, ...] = ()
+    answer: str = ""
+    category: str = "general"
+    tags: tuple[str, ...] = ()
+    action_id: Optional[str] = None
+    priority: int = 10
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QARecord":
+        return cls(
+            id=_required(data, "id"),
+            primary_question=_text(data, "primary_question"),
+            variants=_texts(data, "variants"),
+            answer=_text(data, "answer"),
+            category=_text(data, "category", "general"),
+            tags=_texts(data, "tags"),
+            action_id=data.get("action_id") or None,
+            priority=int(data.get("priority", 10))
+        )
+
+
+    @property
+    def questions(self) -> tuple[str, ...]:
+        """Primary question followed by its variants"""
+        return (self.primary_question, *self.variants)
+
+
+@dataclass(frozen=True, slots=True)
+class Suggestion:
+    """A follow-up button: either asks a QA entry or opens an action page"""
+    text: str
+    qa_id: Optional[str] = None
+    action_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Suggestion":
+        return cls(
+            text=_required(data, "text"),
+            qa_id=data.get("qa_id") or None,
+            action_id=data.get("action_id") or None
+        )
+
+
+    @property
+    def target_id(self) -> Optional[str]:
+        return self.action_id or self.qa_id
+
+
+    def to_dict(self) -> dict[str, str]:
+        suggestion = {"text": self.text}
+        if self.action_id:
+            suggestion["action_id"] = self.action_id
+        if self.qa_id:
+            suggestion["qa_id"] = self.qa_id
+        return suggestion
+
+
+@dataclass(frozen=True, slots=True)
+class FollowUpRecord:
+    """Follow-up suggestions of one QA entry (suggest-follow-up-questions.json)"""
+    qa_id: str
+    tags: tuple[str, ...] = ()
+    suggestions: tuple[Suggestion, ...] = ()
+
+    @classmethod
+    def from_dict(cls, qa_id: str, data: dict) -> "FollowUpRecord":
+        return cls(
+            qa_id=qa_id,
+            tags=_texts(data, "tags"),
+            suggestions=tuple(Suggestion.from_dict(suggestion) for suggestion in data.get("suggestions", []))
+        )
+
+
+class KnowledgeCatalog:
+    """
+    The structured documents (actions, Q&A, follow-up suggestions), parsed and
+    validated once and shared by retrieval, answering and ingestion.
+    Records are immutable; a reload builds a new catalog.
+    """
+    def __init__(
+        self,
+        actions: Iterable[ActionRecord] = (),
+        qa_entries: Iterable[QARecord] = (),
+        follow_ups: Iterable[FollowUpRecord] = ()
+    ):
+        # dicts keep file order
+        self.actions: dict[str, ActionRecord] = {action.id: action for action in actions}
+        self.qa_entries: dict[str, QARecord] = {qa.id: qa for qa in qa_entries}
+        self.follow_ups: dict[str, FollowUpRecord] = {group.qa_id: group for group in follow_ups}
+
+        self.qa_by_category: dict[str, tuple[QARecord, ...]] = self._group(self.qa_entries.values())
+        self.actions_by_category: dict[str, tuple[ActionRecord, ...]] = self._group(self.actions.values())
+
+
+    @staticmethod
+    def _group(records: Iterable) -> dict[str, tuple]:
+        groups: dict[str, list] = {}
+        for record in records:
+            groups.setdefault(record.category.lower(), []).append(record)
+        return {category: tuple(members) for category, members in groups.items()}
+
+
+    @classmethod
+    def load(cls, docs_dir: Path = DOCS_DIR) -> "KnowledgeCatalog":
+        """Parse the document files; invalid entries are logged and skipped"""
+        actions = []
+        for position, entry in enumerate(cls._read_json(docs_dir / ACTIONS_FILE, []), 1):
+            record = cls._parse(ActionRecord.from_dict, ACTIONS_FILE, f"entry {position}", entry)
+            if record:
+                actions.append(record)
+
+        qa_entries = []
+        for line_number, entry in cls._read_jsonl(docs_dir / QA_FILE):
+            record = cls._parse(QARecord.from_dict, QA_FILE, f"line {line_number}", entry)
+            if record:
+                qa_entries.append(record)
+
+        follow_ups = []
+        for qa_id, entry in cls._read_json(docs_dir / FOLLOW_UPS_FILE, {}).items():
+            record = cls._parse(lambda data: FollowUpRecord.from_dict(qa_id, data), FOLLOW_UPS_FILE, qa_id, entry)
+            if record:
+                follow_ups.append(record)
+
+        catalog = cls(actions, qa_entries, follow_ups)
+        logger.info(f"Knowledge catalog loaded: {catalog.stats()}")
+        return catalog
+
+
+    @staticmethod
+    def _read_json(file: Path, default):
+        if not file.exists():
+            logger.error(f"File not found: {file.name}")
+            return default
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON error in {file.name}: {e}")
+            return default
+        if not isinstance(data, type(default)):
+            logger.error(f"Unexpected top-level type in {file.name}: {type(data).__name__}")
+            return default
+        return data
+
+
+    @staticmethod
+    def _read_jsonl(file: Path) -> list[tuple[int, dict]]:
+        if not file.exists():
+            logger.error(f"File not found: {file.name}")
+            return []
+
+        entries = []
+        with open(file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line: # skip empty lines
+                    continue
+                try:
+                    entries.append((line_number, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    logger.warning(f"JSON error in {file.name} line {line_number}: {e}")
+        return entries
+
+
+    @staticmethod
+    def _parse(parser, file_name: str, location: str, entry):
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError("entry must be an object")
+            return parser(entry)
+        except KeyError as e:
+            logger.warning(f"Missing key in {file_name} {location}: {e}")
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalid entry in {file_name} {location}: {e}")
+        return None
+
+
+    def replace(self, other: "KnowledgeCatalog") -> None:
+        """
+        Adopt the records of a freshly loaded catalog in place, so every module
+        holding this instance sees them. No await in between, requests see
+        either the old or the new records.
+        """
+        (
+            self.actions,
+            self.qa_entries,
+            self.follow_ups,
+            self.qa_by_category,
+            self.actions_by_category
+        ) = (
+            other.actions,
+            other.qa_entries,
+            other.follow_ups,
+            other.qa_by_category,
+            other.actions_by_category
+        )
+
+
+    def changes(self, other: "KnowledgeCatalog") -> dict[str, set[str]]:
+        """
+        Returns:
+            Ids of the actions, QA entries and follow-up groups that were
+            added, removed or modified in other
+        """
+        def changed(old: dict, new: dict) -> set[str]:
+            return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+        return {
+            "actions": changed(self.actions, other.actions),
+            "qa_entries": changed(self.qa_entries, other.qa_entries),
+            "follow_ups": changed(self.follow_ups, other.follow_ups)
+        }
+
+
+    def action(self, action_id: Optional[str]) -> Optional[ActionRecord]:
+        return self.actions.get(action_id)
+
+
+    def qa(self, qa_id: Optional[str]) -> Optional[QARecord]:
+        return self.qa_entries.get(qa_id)
+
+
+    def stats(self) -> dict:
+        return {
+            "actions": len(self.actions),
+            "qa_entries": len(self.qa_entries),
+            "follow_ups": len(self.follow_ups),
+            "qa_categories": len(self.qa_by_category)
+        }
+
+
+catalog = KnowledgeCatalog.load()
@@ -0,0 +1,320 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable, Literal, Optional
+import logging
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from api.scripts.knowledge_catalog import ActionRecord, QARecord
+from api.utils.keywords_normalizer import KeywordsNormalizer, kw_norm
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str, normalizer: KeywordsNormalizer = kw_norm) -> list[str]:
+    """Expand shorthands with the normalizer (kw_norm), then split into word tokens"""
+    return TOKEN_PATTERN.findall(normalizer.normalize_message(text))
+
+
+def lexical_text(doc: Document, qa_records: dict[str, QARecord], action_records: dict[str, ActionRecord]) -> str:
+    """
+    Text a chunk is matched on lexically:
+    - QA: primary question, variants and tags
+    - action: title and intents
+    - narrative markdown: its section headers
+    """
+    doc_type = doc.metadata.get("type")
+    if doc_type == "qa":
+        qa = qa_records.get(doc.metadata.get("qa_id"))
+        return " ".join([*qa.questions, *qa.tags]) if qa else ""
+    if doc_type == "action":
+        action = action_records.get(doc.metadata.get("action_id"))
+        return " ".join([action.title, *action.intent]) if action else ""
+    return " ".join(
+        str(doc.metadata[header]) for header in ("Header 1", "Header 2", "Header 3")
+        if header in doc.metadata
+    )
+
+
+def _matches_filter(metadata: dict, filter: dict) -> bool:
+    """Chroma-style where filter evaluated against one metadata dict"""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(_matches_filter(metadata, f) for f in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches_filter(metadata, f) for f in condition):
+                return False
+        elif isinstance(condition, dict):
+            (operator, value), = condition.items()
+            actual = metadata.get(field)
+            if operator == "$eq" and actual != value:
+                return False
+            if operator == "$ne" and actual == value:
+                return False
+            if operator == "$in" and actual not in value:
+                return False
+            if operator == "$nin" and actual in value:
+                return False
+        elif metadata.get(field) != condition:
+            return False
+    return True
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 inverted index over the short lexical fields of each chunk.
+    Built by `python -m api.ingest build` and loaded read-only by the server.
+    """
+    def __init__(
+        self,
+        postings: dict[str, dict[str, int]],
+        doc_lengths: dict[str, int],
+        documents: dict[str, dict],
+        corpus_ids: list[str],
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        # ids of every chunk the index was built from, used to detect staleness
+        self.corpus_ids = corpus_ids
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(doc_lengths.values()) / len(doc_lengths)) if doc_lengths else 0.0
+
+        total = len(doc_lengths)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+
+    @classmethod
+    def build(
+        cls,
+        docs: list[Document],
+        qa_records: Iterable[QARecord],
+        action_records: Iterable[ActionRecord],
+        normalizer: KeywordsNormalizer = kw_norm
+    ) -> "LexicalIndex":
+        qa_by_id = {qa.id: qa for qa in qa_records}
+        action_by_id = {action.id: action for action in action_records}
+
+        postings: dict[str, dict[str, int]] = {}
+        doc_lengths: dict[str, int] = {}
+        documents: dict[str, dict] = {}
+
+        for doc in docs:
+            tokens = tokenize(lexical_text(doc, qa_by_id, action_by_id), normalizer)
+            if not tokens:
+                continue
+
+            chunk_id = doc.metadata["chunk_id"]
+            doc_lengths[chunk_id] = len(tokens)
+            documents[chunk_id] = {"page_content": doc.page_content, "metadata": doc.metadata}
+            for term, frequency in Counter(tokens).items():
+                postings.setdefault(term, {})[chunk_id] = frequency
+
+        return cls(postings, doc_lengths, documents, [doc.metadata["chunk_id"] for doc in docs])
+
+
+    def save(self, index_file: Path) -> None:
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = index_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "postings": self.postings,
+                    "doc_lengths": self.doc_lengths,
+                    "documents": self.documents,
+                    "corpus_ids": self.corpus_ids
+                },
+                f,
+                ensure_ascii=False
+            )
+        os.replace(tmp_file, index_file)
+
+
+    @classmethod
+    def load(cls, index_file: Path) -> "LexicalIndex":
+        with open(index_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(
+            data["postings"], data["doc_lengths"], data["documents"], data["corpus_ids"], data["k1"], data["b"]
+        )
+
+
+    def search(self, query: str, k: int = 8, filter: Optional[dict] = None) -> list[tuple[str, float]]:
+        """
+        query is already normalized by kw_norm, as the chat flow has it, and
+        is not expanded again (normalizing is not idempotent).
+        
+        Returns:
+            Up to k (chunk_id, bm25 score) pairs, best first
+        """
+        scores: dict[str, float] = {}
+        for term in set(TOKEN_PATTERN.findall(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for chunk_id, frequency in docs.items():
+                length_norm = 1 - self.b + self.b * self.doc_lengths[chunk_id] / self.avg_length
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                )
+
+        if filter:
+            scores = {
+                chunk_id: score for chunk_id, score in scores.items()
+                if _matches_filter(self.documents[chunk_id]["metadata"], filter)
+            }
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+    def document(self, chunk_id: str) -> Document:
+        stored = self.documents[chunk_id]
+        return Document(id=chunk_id, page_content=stored["page_content"], metadata=dict(stored["metadata"]))
+
+
+class HybridSearchIndex(VectorStore):
+    """
+    Dense retrieval fused with the BM25 index.
+    Scores stay squared L2 distances so relevance thresholds still apply:
+    - weighted: distance minus lexical_weight * (bm25 / best bm25)
+    - rrf: reciprocal-rank fusion decides the order, distances are the dense ones
+    Chunks found only lexically get the distance of the farthest dense
+    candidate, since they are at least that far from the query.
+    """
+    def __init__(
+        self,
+        dense: VectorStore,
+        lexical: LexicalIndex,
+        fusion: Literal["weighted", "rrf"] = "weighted",
+        lexical_weight: float = 0.3,
+        rrf_k: int = 60,
+        candidate_multiplier: int = 2
+    ):
+        self.dense = dense
+        self.lexical = lexical
+        self.fusion = fusion
+        self.lexical_weight = lexical_weight
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.dense.embeddings
+
+
+    def fuse(
+        self,
+        dense_results: list[tuple[Document, float]],
+        lexical_results: list[tuple[str, float]],
+        k: int
+    ) -> list[tuple[Document, float]]:
+        """Merge dense (doc, distance) and lexical (chunk_id, bm25) candidates into the top k"""
+        documents: dict[str, Document] = {}
+        distances: dict[str, float] = {}
+        dense_rank: dict[str, int] = {}
+        for rank, (doc, distance) in enumerate(dense_results):
+            chunk_id = doc.metadata.get("chunk_id") or doc.id
+            documents[chunk_id] = doc
+            distances[chunk_id] = distance
+            dense_rank[chunk_id] = rank
+
+        farthest = max(distances.values(), default=1.0)
+        best_bm25 = lexical_results[0][1] if lexical_results else 0.0
+        lexical_rank: dict[str, int] = {}
+        lexical_norm: dict[str, float] = {}
+        for rank, (chunk_id, score) in enumerate(lexical_results):
+            lexical_rank[chunk_id] = rank
+            lexical_norm[chunk_id] = score / best_bm25 if best_bm25 else 0.0
+            if chunk_id not in documents:
+                documents[chunk_id] = self.lexical.document(chunk_id)
+                distances[chunk_id] = farthest
+
+        if self.fusion == "rrf":
+            fused = {
+                chunk_id: sum(
+                    1.0 / (self.rrf_k + ranks[chunk_id] + 1)
+                    for ranks in (dense_rank, lexical_rank) if chunk_id in ranks
+                )
+                for chunk_id in documents
+            }
+            order = sorted(documents, key=lambda chunk_id: fused[chunk_id], reverse=True)
+        else:
+            for chunk_id, norm in lexical_norm.items():
+                distances[chunk_id] = max(0.0, distances[chunk_id] - self.lexical_weight * norm)
+            order = sorted(documents, key=lambda chunk_id: distances[chunk_id])
+
+        return [(documents[chunk_id], distances[chunk_id]) for chunk_id in order[:k]]
+
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        candidates = k * self.candidate_multiplier
+        dense_results = self.dense.similarity_search_with_score(query, k=candidates, filter=filter)
+        lexical_results = self.lexical.search(query, k=candidates, filter=filter)
+        return self.fuse(dense_results, lexical_results, k)
+
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        candidates = k * self.candidate_multiplier
+        dense_results = await self.dense.asimilarity_search_with_score(query, k=candidates, filter=filter)
+        lexical_results = self.lexical.search(query, k=candidates, filter=filter)
+        return self.fuse(dense_results, lexical_results, k)
+
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, filter=filter)]
+
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None, **kwargs: Any) -> list[str]:
+        raise NotImplementedError("HybridSearchIndex is read-only, rebuild it with `python -m api.ingest build`")
+
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: Optional[list[dict]] = None, **kwargs: Any):
+        raise NotImplementedError("HybridSearchIndex is built by `python -m api.ingest build`")
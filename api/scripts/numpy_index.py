@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from api.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.json"
+# names the version directory holding the current embeddings and records
+CURRENT_FILE = "CURRENT"
+# the previous version stays for readers that read the pointer just before a swap
+KEEP_VERSIONS = 2
+
+
+def current_version_dir(index_dir: Path) -> Optional[Path]:
+    """
+    Directory of the index version CURRENT points to, or index_dir itself for an
+    index written before versions existed. None when there is no index.
+    """
+    try:
+        version = (index_dir / CURRENT_FILE).read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return index_dir if (index_dir / RECORDS_FILE).exists() else None
+    return index_dir / version
+
+
+class NumpyVectorIndex(VectorStore):
+    """
+    Read-only in-process vector index.
+    Embeddings live in one contiguous float32 matrix that is memory-mapped
+    from disk, so forked workers share the same pages. Top-k is a single
+    matrix-vector product and metadata filters are boolean masks.
+    Scores are squared L2 distances, the same as Chroma's default space,
+    so relevance thresholds carry over unchanged.
+    """
+    def __init__(
+        self,
+        embedding: Embeddings,
+        matrix: np.ndarray,
+        ids: list[str],
+        texts: list[str],
+        metadatas: list[dict]
+    ):
+        self._embedding = embedding
+        self.matrix = matrix
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.squared_norms = np.einsum("ij,ij->i", matrix, matrix)
+        self._masks: dict[tuple[str, Any], np.ndarray] = {}
+
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+
+    @classmethod
+    def load(cls, index_dir: Path, embedding: Embeddings) -> "NumpyVectorIndex":
+        """Open an index written by `write`. The matrix is memory-mapped, not copied."""
+        version_dir = current_version_dir(index_dir)
+        if version_dir is None:
+            raise FileNotFoundError(f"No NumPy index in {index_dir}")
+
+        matrix = np.load(version_dir / EMBEDDINGS_FILE, mmap_mode="r")
+        with open(version_dir / RECORDS_FILE, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        # row i must be the embedding of record i, a mismatch would return the wrong documents
+        if matrix.shape[0] != len(records["ids"]):
+            raise ValueError(
+                f"NumPy index in {version_dir} has {matrix.shape[0]} embeddings for {len(records['ids'])} records"
+            )
+
+        return cls(
+            embedding=embedding,
+            matrix=matrix,
+            ids=records["ids"],
+            texts=records["documents"],
+            metadatas=records["metadatas"]
+        )
+
+
+    @staticmethod
+    def write(
+        index_dir: Path,
+        ids: list[str],
+        embeddings: Iterable[Iterable[float]],
+        texts: list[str],
+        metadatas: list[dict]
+    ) -> None:
+        """
+        Persist an index. Embeddings and records are written to a new version
+        directory, then the CURRENT pointer is swapped in one os.replace, so
+        readers always load a matching pair and never half a write.
+        """
+        index_dir.mkdir(parents=True, exist_ok=True)
+        matrix = np.ascontiguousarray(np.asarray(list(embeddings), dtype=np.float32))
+
+        version = f"v{time.time_ns()}"
+        version_dir = index_dir / version
+        version_dir.mkdir()
+        with open(version_dir / EMBEDDINGS_FILE, 'wb') as f:
+            np.save(f, matrix)
+        with open(version_dir / RECORDS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(
+                {"ids": ids, "documents": texts, "metadatas": metadatas},
+                f,
+                ensure_ascii=False
+            )
+
+        tmp_pointer = index_dir / f"{CURRENT_FILE}.tmp"
+        tmp_pointer.write_text(version, encoding='utf-8')
+        os.replace(tmp_pointer, index_dir / CURRENT_FILE)
+
+        # older versions, and the files of an index written before versions existed
+        versions = sorted(path for path in index_dir.iterdir() if path.is_dir() and path.name.startswith("v"))
+        for old_dir in versions[:-KEEP_VERSIONS]:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        for legacy_file in (EMBEDDINGS_FILE, RECORDS_FILE):
+            (index_dir / legacy_file).unlink(missing_ok=True)
+
+
+    def _field_mask(self, field: str, condition: Any) -> np.ndarray:
+        """Boolean mask for one metadata condition, cached per (field, value)"""
+        if isinstance(condition, dict):
+            (operator, value), = condition.items()
+            if operator == "$eq":
+                return self._field_mask(field, value)
+            if operator == "$ne":
+                return ~self._field_mask(field, value)
+            if operator == "$in":
+                return np.logical_or.reduce(
+                    [self._field_mask(field, v) for v in value] or [np.zeros(len(self.ids), dtype=bool)]
+                )
+            if operator == "$nin":
+                return ~self._field_mask(field, {"$in": value})
+            raise ValueError(f"Unsupported filter operator: {operator}")
+
+        mask_key = (field, condition)
+        mask = self._masks.get(mask_key)
+        if mask is None:
+            mask = np.fromiter(
+                (metadata.get(field) == condition for metadata in self.metadatas),
+                dtype=bool,
+                count=len(self.metadatas)
+            )
+            self._masks[mask_key] = mask
+        return mask
+
+
+    def _filter_mask(self, filter: dict) -> np.ndarray:
+        """Combine a Chroma-style where filter into one mask"""
+        masks = []
+        for field, condition in filter.items():
+            if field == "$and":
+                masks.extend(self._filter_mask(f) for f in condition)
+            elif field == "$or":
+                masks.append(np.logical_or.reduce([self._filter_mask(f) for f in condition]))
+            else:
+                masks.append(self._field_mask(field, condition))
+        return np.logical_and.reduce(masks)
+
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: Optional[dict] = None
+    ) -> list[tuple[Document, float]]:
+        query = np.asarray(embedding, dtype=np.float32)
+        distances = self.squared_norms - 2.0 * (self.matrix @ query) + float(query @ query)
+
+        if filter:
+            distances = np.where(self._filter_mask(filter), distances, np.inf)
+
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+
+        return [
+            (
+                Document(
+                    id=self.ids[i],
+                    page_content=self.texts[i],
+                    metadata=dict(self.metadatas[i])
+                ),
+                float(distances[i])
+            )
+            for i in top
+            if np.isfinite(distances[i])
+        ]
+
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filter=filter
+        )
+
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        # only the embedding is awaited, the search itself takes microseconds
+        embedding = await self._embedding.aembed_query(query)
+        with metrics.timed("vector_search"):
+            return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, filter=filter)]
+
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None, **kwargs: Any) -> list[str]:
+        raise NotImplementedError("NumpyVectorIndex is read-only, rebuild it with `python -m api.ingest build`")
+
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: Optional[list[dict]] = None, **kwargs: Any):
+        raise NotImplementedError("NumpyVectorIndex is built by `python -m api.ingest build`")
@@ -0,0 +1,188 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+import logging
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\w+")
+
+# per message overhead of the chat template (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate for Llama-style BPE vocabularies, no tokenizer download needed.
+    Punctuation counts as one token, a word as one token per 4 characters
+    (long and non-English words split into several pieces).
+    Errs slightly high, which is the safe side for a budget.
+    """
+    return sum(
+        max(1, math.ceil(len(piece) / 4)) if piece[0].isalnum() or piece[0] == "_" else 1
+        for piece in TOKEN_PIECE_PATTERN.findall(text)
+    )
+
+
+def word_set(text: str) -> frozenset[str]:
+    return frozenset(word.lower() for word in WORD_PATTERN.findall(text))
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PromptBuild:
+    messages: list[dict[str, str]]
+    knowledge_docs: list[Document]
+    qa_docs: list[Document]
+    action_docs: list[Document]
+    token_counts: dict[str, int] = field(default_factory=dict)
+    dropped_docs: int = 0
+
+
+class PromptBuilder:
+    """
+    Assembles the Groq messages within a token budget.
+    Context is ranked by type, then by retrieval order (best score first):
+    action docs (at most max_actions, they are short and drive the buttons),
+    then pre-defined Q&A, then narrative knowledge. Near-duplicate chunks are
+    dropped and anything that no longer fits the budget is left out.
+    """
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = 3000,
+        max_actions: int = 3,
+        dedupe_threshold: float = 0.85,
+        estimator: Callable[[str], int] = estimate_tokens
+    ):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.max_actions = max_actions
+        self.dedupe_threshold = dedupe_threshold
+        self.estimator = estimator
+        # the system prompt is static, count it once
+        self.system_tokens = estimator(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+        self.counters = {
+            "prompts": 0,
+            "total_tokens": 0,
+            "max_tokens": 0,
+            "dropped_docs": 0
+        }
+
+
+    def build(self, question: str, docs: list[Document]) -> PromptBuild:
+        """
+        Args:
+            question: the (possibly rephrased) user question
+            docs: relevant documents, best retrieval score first
+        """
+        action_docs = [doc for doc in docs if doc.metadata.get("type") == "action"][:self.max_actions]
+        qa_docs = [doc for doc in docs if doc.metadata.get("type") == "qa"]
+        knowledge_docs = [doc for doc in docs if doc.metadata.get("type") not in ("action", "qa")]
+
+        # fixed parts of the user message: headers and the question
+        question_tokens = self.estimator(f"CONTEXT:\n\nQUESTION:\n{question}") + MESSAGE_OVERHEAD_TOKENS
+        remaining = self.token_budget - self.system_tokens - question_tokens
+
+        kept: dict[str, list[Document]] = {"action": [], "qa": [], "knowledge": []}
+        seen_words: list[frozenset[str]] = []
+        dropped = len(docs) - len(action_docs) - len(qa_docs) - len(knowledge_docs)
+        context_tokens = 0
+
+        for kind, candidates in (("action", action_docs), ("qa", qa_docs), ("knowledge", knowledge_docs)):
+            for doc in candidates:
+                words = word_set(doc.page_content)
+                if any(jaccard(words, seen) >= self.dedupe_threshold for seen in seen_words):
+                    dropped += 1
+                    continue
+
+                cost = self.estimator(doc.page_content) + 1
+                if cost > remaining:
+                    dropped += 1
+                    continue
+
+                kept[kind].append(doc)
+                seen_words.append(words)
+                remaining -= cost
+                context_tokens += cost
+
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": self._user_content(question, kept)}
+        ]
+
+        token_counts = {
+            "system": self.system_tokens,
+            "context": context_tokens,
+            "question": question_tokens,
+            "total": self.system_tokens + context_tokens + question_tokens
+        }
+        self._report(token_counts, dropped)
+
+        return PromptBuild(
+            messages=messages,
+            knowledge_docs=kept["knowledge"],
+            qa_docs=kept["qa"],
+            action_docs=kept["action"],
+            token_counts=token_counts,
+            dropped_docs=dropped
+        )
+
+
+    def _user_content(self, question: str, kept: dict[str, list[Document]]) -> str:
+        # Build knowledge base
+        knowledge = "\n\n".join([doc.page_content for doc in kept["knowledge"]])
+
+        # Build QA context
+        qa_context = ""
+        if kept["qa"]:
+            qa_context = "\n\nPRE-DEFINED Q&A:\n"
+            for qa_doc in kept["qa"]:
+                qa_context += f"{qa_doc.page_content}\n"
+
+        # Build actions context
+        actions_context = ""
+        if kept["action"]:
+            actions_context = "\n\nYOU CAN VIEW THE PAGE HERE (mention if relevant)\n"
+            for action_doc in kept["action"]:
+                actions_context += f"{action_doc.page_content}\n"
+
+        return (
+            "CONTEXT:\n"
+            f"{knowledge}\n\n"
+            f"{qa_context}"
+            f"{actions_context}\n"
+            "QUESTION:\n"
+            f"{question}"
+        )
+
+
+    def _report(self, token_counts: dict[str, int], dropped: int) -> None:
+        self.counters["prompts"] += 1
+        self.counters["total_tokens"] += token_counts["total"]
+        self.counters["max_tokens"] = max(self.counters["max_tokens"], token_counts["total"])
+        self.counters["dropped_docs"] += dropped
+        logger.info(
+            f"Prompt tokens ~{token_counts['total']} (system {token_counts['system']}, "
+            f"context {token_counts['context']}, question {token_counts['question']}), "
+            f"{dropped} doc(s) dropped"
+        )
+
+
+    def stats(self) -> dict:
+        prompts = self.counters["prompts"]
+        return {
+            **self.counters,
+            "avg_tokens": round(self.counters["total_tokens"] / prompts, 1) if prompts else 0.0,
+            "token_budget": self.token_budget
+        }
@@ -0,0 +1,131 @@
+import re
+from typing import Iterable, Optional
+import logging
+
+from api.config.settings import settings
+from api.scripts.knowledge_catalog import QARecord, catalog
+from api.utils.keywords_normalizer import kw_norm
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_PATTERN = re.compile(r"[^\w\s]+")
+
+
+def question_key(normalized: str) -> str:
+    """Drop punctuation and collapse whitespace of a message kw_norm already normalized"""
+    return " ".join(NON_WORD_PATTERN.sub(" ", normalized).split())
+
+
+def normalize_question(text: str) -> str:
+    """kw_norm expansion, then drop punctuation and collapse whitespace"""
+    return question_key(kw_norm.normalize_message(text))
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Levenshtein distance restricted to a diagonal band.
+    Returns max_distance + 1 as soon as the distance is known to exceed the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    beyond = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [beyond] * (len(b) + 1)
+        current[0] = i
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        for j in range(low, high + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1,          # deletion
+                current[j - 1] + 1,       # insertion
+                previous[j - 1] + cost    # substitution
+            )
+        if min(current[low - 1:high + 1]) > max_distance:
+            return beyond
+        previous = current
+
+    return min(previous[len(b)], beyond)
+
+
+class QAMatcher:
+    """
+    Precomputed lookup of normalized QA questions (primary question and variants).
+    A typed message that exactly or nearly matches a known question is
+    answered from the stored QA entry, without retrieval or the LLM.
+    """
+    def __init__(self, qa_entries: Iterable[QARecord], max_edits: int = 2, min_fuzzy_length: int = 8):
+        self.max_edits = max_edits
+        self.min_fuzzy_length = min_fuzzy_length
+        self.index(qa_entries)
+
+
+    def index(self, qa_entries: Iterable[QARecord]) -> None:
+        """(Re)build the lookup tables, swapped in once complete"""
+        exact: dict[str, str] = {}
+        # questions bucketed by length so fuzzy matching only visits plausible candidates
+        by_length: dict[int, list[tuple[str, str]]] = {}
+
+        ambiguous: set[str] = set()
+        for qa in qa_entries:
+            for question in qa.questions:
+                normalized = normalize_question(question)
+                if not normalized or normalized in ambiguous:
+                    continue
+                if exact.setdefault(normalized, qa.id) != qa.id:
+                    # the same question belongs to several entries, leave it to RAG
+                    logger.warning(f"Question '{normalized}' maps to several QA entries, excluded from fast path")
+                    ambiguous.add(normalized)
+                    del exact[normalized]
+
+        for normalized, qa_id in exact.items():
+            by_length.setdefault(len(normalized), []).append((normalized, qa_id))
+
+        self.exact, self.by_length = exact, by_length
+
+
+    def match(self, message: str) -> Optional[str]:
+        """
+        Returns:
+            qa_id of the exact match, or of the single closest question within
+            max_edits; None when there is no confident match
+        """
+        return self.match_normalized(kw_norm.normalize_message(message))
+
+
+    def match_normalized(self, message: str) -> Optional[str]:
+        """
+        match() of a message kw_norm already normalized, as the chat flow has it.
+        Normalizing is not idempotent, it must run exactly once.
+        """
+        normalized = question_key(message)
+        qa_id = self.exact.get(normalized)
+        if qa_id or len(normalized) < self.min_fuzzy_length:
+            return qa_id
+
+        best_distance = self.max_edits + 1
+        best_ids: set[str] = set()
+        for length in range(len(normalized) - self.max_edits, len(normalized) + self.max_edits + 1):
+            for question, candidate_id in self.by_length.get(length, ()):
+                distance = bounded_edit_distance(normalized, question, self.max_edits)
+                if distance < best_distance:
+                    best_distance = distance
+                    best_ids = {candidate_id}
+                elif distance == best_distance and distance <= self.max_edits:
+                    best_ids.add(candidate_id)
+
+        # ambiguous near matches go through RAG
+        if len(best_ids) == 1:
+            return best_ids.pop()
+        return None
+
+
+qa_matcher = QAMatcher(
+    catalog.qa_entries.values(),
+    max_edits=settings.QA_FAST_PATH_MAX_EDITS,
+    min_fuzzy_length=settings.QA_FAST_PATH_MIN_FUZZY_LENGTH
+)
@@ -1,5 +1,6 @@
+import hashlib
 import json
-from uuid import uuid4
+import os
 from pathlib import Path
 from datetime import datetime
 import logging
@@ -8,30 +9,76 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_text_splitters import MarkdownHeaderTextSplitter
 from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
 
 from api.config.settings import settings
+from api.scripts.knowledge_catalog import KnowledgeCatalog, catalog
+from api.scripts.lexical_index import HybridSearchIndex, LexicalIndex
+from api.scripts.numpy_index import NumpyVectorIndex, RECORDS_FILE, current_version_dir
+from api.utils.embedding_cache import CachedQueryEmbeddings
+from api.utils import metrics
+from api.utils.keywords_normalizer import KeywordsNormalizer, kw_norm
 
 logger = logging.getLogger(__name__)
 
 THIS_FILE_DIR = Path(__file__).parent
 DOCS_DIR = THIS_FILE_DIR.parent / "documents"
 PERSISTENT_CHROMADB = THIS_FILE_DIR.parent / "chroma_db"
+INGEST_MANIFEST = PERSISTENT_CHROMADB / "ingest_manifest.json"
+NUMPY_INDEX_DIR = PERSISTENT_CHROMADB / "numpy_index"
+LEXICAL_INDEX_FILE = PERSISTENT_CHROMADB / "lexical_index.json"
+# flock()ed by a worker rebuilding the index while Redis (and its reload lock) is down
+REBUILD_LOCK_FILE = PERSISTENT_CHROMADB / "rebuild.lock"
+EMBEDDING_CACHE_FILE = THIS_FILE_DIR.parent / "cache" / "query_embeddings.sqlite3"
+COLLECTION_NAME = "cvms_doc_collections"
 
-# initiate embedding model
-embedding_model = GoogleGenerativeAIEmbeddings(
-    api_key=settings.EMBEDDING_MODEL_API_KEY,
-    model=settings.MODEL_NAME
+# metadata that changes on every load and must not affect chunk ids
+VOLATILE_METADATA_KEYS = {"chunk_id", "added_date"}
+
+# initiate embedding model, query vectors are cached in memory and on disk,
+# keyed by the query text the chat flow already normalized
+embedding_model = CachedQueryEmbeddings(
+    GoogleGenerativeAIEmbeddings(
+        api_key=settings.EMBEDDING_MODEL_API_KEY,
+        model=settings.MODEL_NAME
+    ),
+    model_name=settings.MODEL_NAME,
+    cache_path=EMBEDDING_CACHE_FILE if settings.EMBEDDING_CACHE_DISK_ENABLED else None,
+    l1_max_items=settings.EMBEDDING_CACHE_L1_SIZE,
+    l2_max_items=settings.EMBEDDING_CACHE_L2_SIZE
 )
 
+class AsyncChroma(Chroma):
+    """
+    Chroma whose async searches await the (cached) query embedding and then
+    query the local collection inline, instead of running the whole sync
+    search in the default thread pool.
+    """
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict | None = None,
+        **kwargs
+    ) -> list[tuple[Document, float]]:
+        embedding = await self.embeddings.aembed_query(query)
+        with metrics.timed("vector_search"):
+            return self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter, **kwargs)
+    
+    
+    async def asimilarity_search(self, query: str, k: int = 4, filter: dict | None = None, **kwargs) -> list[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, filter=filter, **kwargs)]
+
+
 # specify a directory for persistence embeddings 
-vector_store = Chroma(
-    collection_name="cvms_doc_collections",
+vector_store = AsyncChroma(
+    collection_name=COLLECTION_NAME,
     embedding_function=embedding_model,
     persist_directory=str(PERSISTENT_CHROMADB)
 )
 
 # load the mardown file
-def load_markdown_files() -> list[Document]:
+def load_markdown_files(docs_dir: Path = DOCS_DIR) -> list[Document]:
     """Load and chunk markdown files by headers"""
     md_splitter = MarkdownHeaderTextSplitter(
         headers_to_split_on=[
@@ -43,7 +90,7 @@ def load_markdown_files() -> list[Document]:
     
     chunks = []
     
-    for md_file in DOCS_DIR.glob("*.md"):
+    for md_file in docs_dir.glob("*.md"):
         with open(md_file, 'r', encoding='utf-8') as f:
             content = f.read()
             
@@ -53,7 +100,6 @@ def load_markdown_files() -> list[Document]:
         # add metadata
         for chunk in md_chunks:
             chunk.metadata.update({
-                "chunk_id": str(uuid4()),
                 "source": md_file.name,
                 "doc_type": "faq",
                 "type": "knowledge",
@@ -66,120 +112,355 @@ def load_markdown_files() -> list[Document]:
 
 
 # load JSON
-def load_json_files() -> list[Document]:
-    """Load data from JSON and convert to embeddable documents"""
-    json_files = DOCS_DIR / "cvms-structured-data.json"
-    
-    if not json_files.exists():
-        print(f"JSON file name {json_files.name} not found")
-        return []
+def load_json_files(knowledge: KnowledgeCatalog = catalog) -> list[Document]:
+    """Convert the catalog actions (cvms-structured-data.json) to embeddable documents"""
+    structured_json_docs = []
     
-    with open(json_files, 'r', encoding='utf-8') as f:
-        json_list = json.load(f)
-        
-        structured_json_docs = []
-        
-        for j in json_list:
-            # create embeddable text
-            keywords = ', '.join(j.get('intent', []))
-            text = f"""[ACTION:{j['id']}]
-                    Title: {j['title']}
-                    Description: {j['description']}
+    for action in knowledge.actions.values():
+        # create embeddable text
+        keywords = ', '.join(action.intent)
+        text = f"""[ACTION:{action.id}]
+                    Title: {action.title}
+                    Description: {action.description}
                     Keywords: {keywords}
-                    Category: {j.get('category', 'General')}
+                    Category: {action.category}
                     """
-                    
-            # create the document
-            doc = Document(
-                page_content=text,
-                metadata={
-                    'chunk_id': str(uuid4()),
-                    'type': 'action',
-                    'doc_type': 'faq',
-                    'action_id': j['id'],
-                    'url': j['url'],
-                    'title': j['title'],
-                    'button_text': j['button_text'],
-                    'source': json_files.name,
-                    'added_date': datetime.now().isoformat()
-                }
-            )
-            structured_json_docs.append(doc)
+                
+        # create the document
+        doc = Document(
+            page_content=text,
+            metadata={
+                'type': 'action',
+                'doc_type': 'faq',
+                'action_id': action.id,
+                'url': action.url,
+                'title': action.title,
+                'button_text': action.button_text,
+                'source': "cvms-structured-data.json",
+                'added_date': datetime.now().isoformat()
+            }
+        )
+        structured_json_docs.append(doc)
         
     return structured_json_docs
 
 
 # load JSONL
-def load_qa_jsonl_files() -> list[Document]:
+def load_qa_jsonl_files(knowledge: KnowledgeCatalog = catalog) -> list[Document]:
     """
-    Load cvms-question-&-answer-structured-data.jsonl and convert each entry into a LangChain Document
+    Convert the catalog Q&A entries (cvms-qa-structured-data.jsonl) into LangChain Documents
     Optimized for normalizer + Chroma + Google embeddings
     """
-    jsonl_files = DOCS_DIR / "cvms-qa-structured-data.jsonl"
-    
-    if not jsonl_files.exists():
-        print(f"JSONL file name {jsonl_files.name} not found")
-        return []
-    
     jsonl_docs = []
     
-    with open(jsonl_files, 'r', encoding='utf-8') as f:
-        for line_number, line in enumerate(f, 1):
-            line = line.strip()
-            if not line: # skip empty lines
-                continue
-    
-            try:
-                qa: dict = json.loads(line)
-                
-                # create embeddable text
-                text = f"""Question: {qa.get('primary_question', '')}
-                Variants: {', '.join(qa.get('variants', []))}
-                Answer: {qa.get('answer', '')}
-                Category: {qa.get('category', '')}
-                Tags: {', '.join(qa.get('tags', []))}"""
-                            
-                doc = Document(
-                    page_content=text,
-                    metadata={
-                        "chunk_id": str(uuid4()),
-                        "type": "qa",          
-                        "doc_type": "faq",
-                        "qa_id": qa["id"],
-                        "category": qa.get("category", "general"),
-                        "action_id": qa.get("action_id"),   # used by chatbot to show action button
-                        "source": jsonl_files.name,
-                        "added_date": datetime.now().isoformat(),
-                        "priority": qa.get("priority", 10)
-                    }
-                )
-                jsonl_docs.append(doc)
-            
-            except json.JSONDecodeError as e:
-                logger.warning(f"JSON error in {jsonl_files.name} line {line_number}: {e}")
-                continue
-            except KeyError as e:
-                logger.warning(f"Missing key in {jsonl_files.name} line {line_number}: {e}")
-                continue
+    for qa in knowledge.qa_entries.values():
+        # create embeddable text
+        text = f"""Question: {qa.primary_question}
+                Variants: {', '.join(qa.variants)}
+                Answer: {qa.answer}
+                Category: {qa.category}
+                Tags: {', '.join(qa.tags)}"""
+                        
+        doc = Document(
+            page_content=text,
+            metadata={
+                "type": "qa",          
+                "doc_type": "faq",
+                "qa_id": qa.id,
+                "category": qa.category,
+                "action_id": qa.action_id,   # used by chatbot to show action button
+                "source": "cvms-qa-structured-data.jsonl",
+                "added_date": datetime.now().isoformat(),
+                "priority": qa.priority
+            }
+        )
+        jsonl_docs.append(doc)
             
     return jsonl_docs
     
 
-# Load and index documents
-# Load MD files
-md_chunks = load_markdown_files()
+def content_hash_id(doc: Document) -> str:
+    """
+    Deterministic chunk id derived from the chunk content and its stable metadata.
+    The same chunk always maps to the same id, so re-ingesting is idempotent.
+    """
+    stable_metadata = {
+        key: value for key, value in doc.metadata.items()
+        if key not in VOLATILE_METADATA_KEYS
+    }
+    payload = json.dumps(
+        {"content": doc.page_content, "metadata": stable_metadata},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_all_documents(knowledge: KnowledgeCatalog = catalog, docs_dir: Path = DOCS_DIR) -> list[Document]:
+    """Load every document source and stamp each chunk with its content-hashed id"""
+    # Load MD files, actions and links in json, Q&A JSONL
+    all_docs = load_markdown_files(docs_dir) + load_json_files(knowledge) + load_qa_jsonl_files(knowledge)
+    
+    for doc in all_docs:
+        doc.metadata["chunk_id"] = content_hash_id(doc)
+        
+    return all_docs
+
+
+def load_manifest() -> dict:
+    """Read the ingestion manifest written by the last successful sync"""
+    if not INGEST_MANIFEST.exists():
+        return {}
+    
+    try:
+        with open(INGEST_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"Unreadable ingest manifest {INGEST_MANIFEST.name}: {e}")
+        return {}
+
+
+def write_manifest(docs: list[Document]) -> dict:
+    """Atomically persist the ids and sources of the indexed chunks"""
+    manifest = {
+        "collection": COLLECTION_NAME,
+        "embedding_model": settings.MODEL_NAME,
+        "updated_at": datetime.now().isoformat(),
+        "chunks": {
+            doc.metadata["chunk_id"]: {
+                "source": doc.metadata.get("source"),
+                "type": doc.metadata.get("type")
+            }
+            for doc in docs
+        }
+    }
+    
+    PERSISTENT_CHROMADB.mkdir(parents=True, exist_ok=True)
+    tmp_file = INGEST_MANIFEST.with_suffix(".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, INGEST_MANIFEST)
+    
+    return manifest
+
+
+def sync_vector_store(docs: list[Document]) -> dict[str, int]:
+    """
+    Bring the persisted collection in line with the given documents.
+    Only new or changed chunks are embedded, chunks no longer produced
+    by any source are deleted, and nothing is embedded when the
+    collection is already up to date.
+    
+    Returns:
+        dict with the number of added, deleted and unchanged chunks
+    """
+    desired = {doc.metadata["chunk_id"]: doc for doc in docs}
+    manifest = load_manifest()
+    
+    # the collection itself is the source of truth for what is embedded
+    existing_ids = set(vector_store.get(include=[])["ids"])
+    
+    # vectors from a different embedding model are not comparable, re-embed everything
+    if manifest and manifest.get("embedding_model") != settings.MODEL_NAME:
+        logger.info(
+            f"Embedding model changed ({manifest.get('embedding_model')} -> {settings.MODEL_NAME}). "
+            "Re-embedding all chunks."
+        )
+        to_delete = existing_ids
+        to_add = list(desired)
+    else:
+        to_delete = existing_ids - desired.keys()
+        to_add = [chunk_id for chunk_id in desired if chunk_id not in existing_ids]
+    
+    summary = {
+        "added": len(to_add),
+        "deleted": len(to_delete),
+        "unchanged": len(desired) - len(to_add)
+    }
+    
+    if not to_add and not to_delete:
+        logger.info(f"Vector store up to date ({len(desired)} chunks). Skipping embedding.")
+        if set(manifest.get("chunks", {})) != desired.keys():
+            write_manifest(docs)
+        return summary
+    
+    if to_delete:
+        vector_store.delete(ids=list(to_delete))
+    
+    if to_add:
+        vector_store.add_documents(
+            documents=[desired[chunk_id] for chunk_id in to_add],
+            ids=to_add
+        )
+    
+    write_manifest(docs)
+    logger.info(
+        f"Vector store synced: {summary['added']} added, "
+        f"{summary['deleted']} deleted, {summary['unchanged']} unchanged"
+    )
+    
+    return summary
+
+
+def verify_vector_store(docs: list[Document] | None = None) -> list[str]:
+    """
+    Check the persisted index against the current documents without embedding anything.
+    
+    Returns:
+        List of problems found. Empty list means the index is present and fresh.
+    """
+    manifest = load_manifest()
+    if not manifest:
+        return [f"Ingest manifest not found in {PERSISTENT_CHROMADB}"]
+    
+    problems = []
+    if manifest.get("embedding_model") != settings.MODEL_NAME:
+        problems.append(
+            f"Index built with embedding model {manifest.get('embedding_model')}, "
+            f"configured model is {settings.MODEL_NAME}"
+        )
+    
+    indexed_ids = set(manifest.get("chunks", {}))
+    expected_ids = {doc.metadata["chunk_id"] for doc in (docs or load_all_documents())}
+    
+    if indexed_ids != expected_ids:
+        problems.append(
+            f"Index is stale: {len(expected_ids - indexed_ids)} chunks not indexed, "
+            f"{len(indexed_ids - expected_ids)} chunks no longer in documents"
+        )
+    
+    collection_count = vector_store._collection.count()
+    if collection_count != len(indexed_ids):
+        problems.append(
+            f"Collection holds {collection_count} chunks, manifest lists {len(indexed_ids)}"
+        )
+    
+    if settings.VECTOR_BACKEND == "numpy":
+        version_dir = current_version_dir(NUMPY_INDEX_DIR)
+        if version_dir is None:
+            problems.append(f"NumPy index not found in {NUMPY_INDEX_DIR}")
+        else:
+            with open(version_dir / RECORDS_FILE, 'r', encoding='utf-8') as f:
+                numpy_ids = set(json.load(f)["ids"])
+            if numpy_ids != indexed_ids:
+                problems.append("NumPy index does not match the manifest")
+    
+    if settings.HYBRID_SEARCH_ENABLED:
+        if not LEXICAL_INDEX_FILE.exists():
+            problems.append(f"Lexical index not found: {LEXICAL_INDEX_FILE.name}")
+        elif set(LexicalIndex.load(LEXICAL_INDEX_FILE).corpus_ids) != indexed_ids:
+            problems.append("Lexical index does not match the manifest")
+    
+    return problems
+
+
+def vector_store_stats() -> dict:
+    """Summarize the persisted index for the ingest CLI"""
+    manifest = load_manifest()
+    chunks: dict = manifest.get("chunks", {})
+    
+    by_source: dict[str, int] = {}
+    by_type: dict[str, int] = {}
+    for chunk in chunks.values():
+        by_source[chunk.get("source")] = by_source.get(chunk.get("source"), 0) + 1
+        by_type[chunk.get("type")] = by_type.get(chunk.get("type"), 0) + 1
+    
+    return {
+        "persist_directory": str(PERSISTENT_CHROMADB),
+        "collection": COLLECTION_NAME,
+        "embedding_model": manifest.get("embedding_model"),
+        "updated_at": manifest.get("updated_at"),
+        "manifest_chunks": len(chunks),
+        "collection_chunks": vector_store._collection.count(),
+        "numpy_index": current_version_dir(NUMPY_INDEX_DIR) is not None,
+        "lexical_index": LEXICAL_INDEX_FILE.exists(),
+        "by_source": by_source,
+        "by_type": by_type
+    }
+
+
+def export_numpy_index() -> int:
+    """
+    Dump the Chroma collection into the memory-mappable NumPy index.
+    Reuses the stored vectors, nothing is re-embedded.
+    
+    Returns:
+        Number of exported chunks
+    """
+    collection = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    NumpyVectorIndex.write(
+        NUMPY_INDEX_DIR,
+        ids=collection["ids"],
+        embeddings=collection["embeddings"],
+        texts=collection["documents"],
+        metadatas=collection["metadatas"]
+    )
+    return len(collection["ids"])
+
 
-# Load actions and links in json 
-action_chunks = load_json_files()
+def build_lexical_index(
+    docs: list[Document],
+    knowledge: KnowledgeCatalog = catalog,
+    normalizer: KeywordsNormalizer = kw_norm
+) -> int:
+    """
+    Write the BM25 index over QA variants/tags, action intents and markdown headers,
+    tokenized with the normalizer's glossary.
+    
+    Returns:
+        Number of lexically indexed chunks
+    """
+    lexical_index = LexicalIndex.build(docs, knowledge.qa_entries.values(), knowledge.actions.values(), normalizer)
+    lexical_index.save(LEXICAL_INDEX_FILE)
+    return len(lexical_index.doc_lengths)
 
-# Load Q&A JSONL
-qa_chunks = load_qa_jsonl_files()
 
-# Combine all file chunks
-all_docs = md_chunks + action_chunks + qa_chunks
+def rebuild_indexes(
+    knowledge: KnowledgeCatalog = catalog,
+    docs_dir: Path = DOCS_DIR,
+    normalizer: KeywordsNormalizer = kw_norm
+) -> dict[str, int]:
+    """
+    Sync the vector store with the documents, then rewrite the NumPy export
+    and the lexical index. Blocking, embeds new or changed chunks.
+    A reload passes the catalog and glossary it is about to swap in.
+    
+    Returns:
+        dict with the added, deleted and unchanged chunk counts, plus the
+        number of exported and lexically indexed chunks
+    """
+    docs = load_all_documents(knowledge, docs_dir)
+    summary = sync_vector_store(docs)
+    summary["exported"] = export_numpy_index()
+    summary["lexical"] = build_lexical_index(docs, knowledge, normalizer)
+    return summary
 
-# Create UUIDs
-uuids = [str(uuid4()) for _ in range(len(all_docs))]
 
-# Store in vector DB
-vector_store.add_documents(documents=all_docs, ids=uuids)
+def open_search_index() -> VectorStore:
+    """
+    Return the retrieval backend selected by settings.VECTOR_BACKEND,
+    fused with the BM25 index when settings.HYBRID_SEARCH_ENABLED.
+    Missing index files fall back to plain Chroma, the startup check reports them.
+    """
+    dense_index: VectorStore = vector_store
+    if settings.VECTOR_BACKEND == "numpy":
+        if current_version_dir(NUMPY_INDEX_DIR) is not None:
+            dense_index = NumpyVectorIndex.load(NUMPY_INDEX_DIR, embedding_model)
+        else:
+            logger.warning(f"NumPy index not found in {NUMPY_INDEX_DIR}, using Chroma")
+    
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return dense_index
+    
+    if not LEXICAL_INDEX_FILE.exists():
+        logger.warning(f"Lexical index not found: {LEXICAL_INDEX_FILE.name}, using vector search only")
+        return dense_index
+    
+    return HybridSearchIndex(
+        dense=dense_index,
+        lexical=LexicalIndex.load(LEXICAL_INDEX_FILE),
+        fusion=settings.HYBRID_FUSION,
+        lexical_weight=settings.HYBRID_LEXICAL_WEIGHT,
+        rrf_k=settings.HYBRID_RRF_K
+    )
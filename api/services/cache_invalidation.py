@@ -0,0 +1,41 @@
+import json
+import logging
+
+import redis
+
+from api.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# pub/sub channel carrying evicted response cache keys, INVALIDATE_ALL clears everything
+INVALIDATION_CHANNEL = "faq:invalidate"
+INVALIDATE_ALL = "*"
+# pub/sub channel telling workers to reload the knowledge base from disk
+RELOAD_CHANNEL = "faq:reload"
+
+
+def reload_message(origin: str) -> str:
+    """Payload of RELOAD_CHANNEL, origin lets the sending worker skip its own message"""
+    return json.dumps({"origin": origin})
+
+
+def broadcast_knowledge_change() -> bool:
+    """
+    Tell running API workers to reload the knowledge base and reopen the
+    index; each drops the cached answers built from changed documents.
+    Used by offline tools (e.g. `python -m api.ingest build`) after the
+    knowledge base changed. Returns False when Redis is unreachable.
+    """
+    try:
+        client = redis.Redis.from_url(
+            settings.get_redis_client_uri(),
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            socket_timeout=settings.REDIS_READ_TIMEOUT
+        )
+        with client:
+            receivers = client.publish(RELOAD_CHANNEL, reload_message("ingest"))
+        logger.info(f"Knowledge reload broadcast to {receivers} worker(s)")
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Could not broadcast knowledge reload: {e}")
+        return False
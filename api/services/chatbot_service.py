@@ -1,25 +1,92 @@
 import asyncio
 import json
 import logging
-from typing import List, Optional, Tuple
+import time
+import uuid
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 import redis
+import redis.asyncio as aioredis
 
 from api.config.settings import settings
-from api.scripts.chatbot import chatbot, llm_message_rephraser
+from api.scripts.chatbot import (
+    chatbot,
+    degraded_answer,
+    finalize_response,
+    llm_breaker,
+    prepare_chat,
+    prompt_sources,
+    retry_policy,
+    stream_tokens
+)
 from api.scripts.follow_up_message import follow_up_message
+from api.scripts.knowledge_catalog import catalog
+from api.scripts.qa_matcher import qa_matcher
+from api.scripts.vector_store import embedding_model
+from api.services.cache_invalidation import INVALIDATE_ALL, INVALIDATION_CHANNEL
+from api.services.semantic_cache import SemanticCache
+from api.utils import metrics, tracing
 from api.utils.keywords_normalizer import kw_norm
+from api.utils.circuit_breaker import CircuitOpenError
+from api.utils.link_marker_filter import LinkMarkerFilter
+from api.utils.retry_policy import EmptyResponseError
+from api.utils.single_flight import SingleFlight
+from api.utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# delete the generation lock only if it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# record a cached answer (ARGV[1]) in the dependency sets KEYS, refreshing their TTL (ARGV[2])
+REGISTER_DEPENDENCIES_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    redis.call("sadd", key, ARGV[1])
+    redis.call("expire", key, ARGV[2])
+end
+return #KEYS
+"""
+# set of the cache keys whose answer was built from a knowledge item
+DEPENDENCY_KEY_PREFIX = "faq:deps:"
+
 
 class ChatbotService:
     """Service layer for chatbot business logic"""
     
     def __init__(self):
-        self.max_attempts: int = 3
-        self.retry_delay: float = 1.0
-        self.redis_client = redis.from_url(settings.get_redis_client_uri())
+        self.retry_delay: float = 1.0 # invalidation listener reconnect delay
+        # bounded pool: requests wait up to REDIS_POOL_TIMEOUT for a free connection
+        self.redis_pool = aioredis.BlockingConnectionPool.from_url(
+            settings.get_redis_client_uri(),
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            socket_timeout=settings.REDIS_READ_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL
+        )
+        self.redis_client = aioredis.Redis(connection_pool=self.redis_pool)
         self.CACHED_KEY_TTL = 604800  # 7 days in seconds
+        self.single_flight = SingleFlight()
+        # in-process L1 in front of the Redis response cache
+        self.response_cache: Optional[TTLCache] = None
+        if settings.RESPONSE_CACHE_L1_ENABLED:
+            self.response_cache = TTLCache(
+                max_items=settings.RESPONSE_CACHE_L1_SIZE,
+                ttl=settings.RESPONSE_CACHE_L1_TTL
+            )
+        self.semantic_cache: Optional[SemanticCache] = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                redis_client=self.redis_client,
+                embeddings=embedding_model,
+                model_name=settings.MODEL_NAME,
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES
+            )
     
     
     async def get_chat_response(
@@ -43,109 +110,275 @@ class ChatbotService:
         # Deterministic Flow Bypass
         if qa_id or action_id:
             logger.info(f"Deterministic flow triggered (qa_id={qa_id}, action_id={action_id})")
-            ai_response, actions, suggestions = await asyncio.to_thread(
-                follow_up_message.follow_up_message_orchestrator, qa_id, action_id
-            )
-            return ai_response, actions, suggestions
+            tracing.annotate("source", "deterministic")
+            # in-memory lookups only, cheaper inline than a thread hop
+            return follow_up_message.follow_up_message_orchestrator(qa_id, action_id)
 
         # Handle edge case: empty message after strip
         if not message or message.isspace():
+            tracing.annotate("source", "empty")
             return self._get_empty_message_response(), [], []
         
         # Transform short hands into complete words
-        message = kw_norm.normalize_message(message)
+        with metrics.timed("normalize"):
+            message = kw_norm.normalize_message(message)
+        
+        # QA fast path: known questions are answered from the QA entry, no retrieval or LLM
+        if settings.QA_FAST_PATH_ENABLED:
+            fast_qa_id = qa_matcher.match_normalized(message)
+            if fast_qa_id:
+                logger.info(f"QA fast path hit ({fast_qa_id}) for: {message[:50]}...")
+                tracing.annotate("source", "fast_path")
+                tracing.annotate("qa_id", fast_qa_id)
+                return follow_up_message.follow_up_message_orchestrator(qa_id=fast_qa_id)
         
         # Normalize message for cache key
         cache_key = kw_norm.normalize_cache_key(message)
         
-        # Redis Cache Check
+        # Redis Cache Check, then the semantic cache
+        with metrics.timed("cache_lookup"):
+            cached = await self._lookup_cached(message, cache_key)
+        if cached:
+            return cached
+        
+        # Concurrent misses of the same question share one generation
+        if settings.SINGLE_FLIGHT_ENABLED:
+            # the request that generates re-labels its own trace as rag
+            tracing.annotate("source", "coalesced")
+            return await self.single_flight.do(
+                cache_key, lambda: self._generate_coalesced(message, cache_key)
+            )
+        return await self._generate_response(message, cache_key)
+    
+    
+    async def _generate_response(self, message: str, cache_key: str) -> Tuple[str, List[dict], List[dict]]:
+        """RAG/LLM flow, caching a valid answer. Failed stages are retried inside chatbot()."""
+        # overall budget shared by every stage and retry of this request
+        deadline = time.monotonic() + settings.CHAT_LATENCY_BUDGET
+        tracing.annotate("source", "rag")
+        
         try:
-            cached_data = self.redis_client.get(cache_key)
-            if cached_data:
-                logger.info(f"Cache hit for: {message[:50]}...")
-                parsed = json.loads(cached_data)
-                return (
-                    parsed['message'], 
-                    parsed.get('actions', []), 
-                    parsed.get('message_suggestions', [])
-                )
-        except redis.RedisError as e:
-            logger.warning(f"Redis error during cache check: {e}. Proceeding without cache.")
+            # Call chatbot function, weak retrievals are rephrased inside before generation
+            ai_response, actions, detected_qa_id = await chatbot(message, deadline=deadline)
+        except Exception as e:
+            logger.error(f"Chat generation failed: {type(e).__name__}: {str(e)}")
+            raise Exception("Failed to get response from chatbot") from e
         
-        # Retry logic for RAG/LLM flow
-        ai_response = ""
-        actions = []
-        suggestions = []
-        last_error = None
+        if not self._is_valid_response(ai_response):
+            raise Exception("Chatbot returned an empty response")
         
-        for attempt in range(1, self.max_attempts + 1):
-            try:
-                # Call chatbot function
-                ai_response, actions, detected_qa_id = await asyncio.to_thread(chatbot, message)
-                
-                # If fallback message exists, rephrase
-                CORE_FALLBACK = "facebook messenger"
-                if CORE_FALLBACK in ai_response.lower() and not message.startswith("REPHRASED:"):
-                    logger.info("LLM couldn't answer. Rephrasing query...")
-                    rephrased_message = await asyncio.to_thread(llm_message_rephraser, message)
-                    
-                    ai_response, actions, detected_qa_id = await asyncio.to_thread(
-                            chatbot, f"REPHRASE: {rephrased_message}", True
-                        )
+        suggestions = self._get_suggestions(detected_qa_id, message)
+        
+        # Don't cache fallback or degraded answers
+        if self._is_cacheable(ai_response):
+            await self._cache_response(
+                cache_key, message, ai_response, actions, suggestions,
+                self._dependencies(detected_qa_id, actions)
+            )
+        
+        return ai_response, actions, suggestions
+    
+    
+    async def stream_chat_response(
+        self, 
+        message: str, 
+        qa_id: Optional[str] = None, 
+        action_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Streaming variant of get_chat_response for Server-Sent Events.
+        Answers that need no generation (deterministic flows, fast path, cache hits)
+        are sent as a single "done" event. Otherwise the LLM text is forwarded as
+        "token" events as it arrives and "done" carries the final message,
+        actions and message_suggestions. The answer is cached once complete.
+        
+        Yields:
+            (event, data) pairs: "token" {"text"}, "done" {"message", "actions",
+            "message_suggestions"} or "error" {"detail"}
+        """
+        if qa_id or action_id:
+            logger.info(f"Deterministic flow triggered (qa_id={qa_id}, action_id={action_id})")
+            tracing.annotate("source", "deterministic")
+            yield "done", self._done_event(*follow_up_message.follow_up_message_orchestrator(qa_id, action_id))
+            return
 
-                # Fetch follow-up suggestions if a QA intent was matched
-                if detected_qa_id:
-                    suggestions = await asyncio.to_thread(
-                            follow_up_message.suggest_follow_ups, 
-                            detected_qa_id
+        if not message or message.isspace():
+            tracing.annotate("source", "empty")
+            yield "done", self._done_event(self._get_empty_message_response(), [], [])
+            return
+        
+        with metrics.timed("normalize"):
+            message = kw_norm.normalize_message(message)
+        
+        if settings.QA_FAST_PATH_ENABLED:
+            fast_qa_id = qa_matcher.match_normalized(message)
+            if fast_qa_id:
+                logger.info(f"QA fast path hit ({fast_qa_id}) for: {message[:50]}...")
+                tracing.annotate("source", "fast_path")
+                tracing.annotate("qa_id", fast_qa_id)
+                yield "done", self._done_event(
+                    *follow_up_message.follow_up_message_orchestrator(qa_id=fast_qa_id)
+                )
+                return
+        
+        cache_key = kw_norm.normalize_cache_key(message)
+        with metrics.timed("cache_lookup"):
+            cached = await self._lookup_cached(message, cache_key)
+        if cached:
+            yield "done", self._done_event(*cached)
+            return
+        
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            async for event, data in self._stream_generation(message, cache_key):
+                yield event, data
+            return
+        
+        # another request is already generating this answer, send its result once ready
+        try:
+            followed, result = await self.single_flight.wait(cache_key)
+        except Exception as e:
+            logger.error(f"Coalesced generation failed: {str(e)}")
+            yield "error", {"detail": "Internal server error while processing chat request"}
+            return
+        if followed:
+            tracing.annotate("source", "coalesced")
+            yield "done", self._done_event(*result)
+            return
+        
+        acquired, lock_token = await self._acquire_lock(cache_key)
+        if not acquired:
+            cached = await self._wait_for_leader(cache_key)
+            if cached:
+                tracing.annotate("source", "coalesced")
+                yield "done", self._done_event(*cached)
+                return
+        
+        self.single_flight.start(cache_key)
+        result = None
+        try:
+            async for event, data in self._stream_generation(message, cache_key):
+                if event == "done":
+                    result = (data["message"], data["actions"], data["message_suggestions"])
+                yield event, data
+        finally:
+            self.single_flight.finish(
+                cache_key, result, None if result else RuntimeError("Streaming generation failed")
+            )
+            await self._release_lock(cache_key, lock_token)
+    
+    
+    async def _stream_generation(self, message: str, cache_key: str) -> AsyncIterator[Tuple[str, dict]]:
+        """Stream a freshly generated answer as token events followed by done, caching it"""
+        tracing.annotate("source", "rag")
+        try:
+            deadline = time.monotonic() + settings.CHAT_LATENCY_BUDGET
+            messages, action_docs, qa_docs, detected_qa_id = await prepare_chat(message, deadline=deadline)
+            attempt = 1
+            degraded = False
+            with metrics.timed("generation"):
+                while True:
+                    link_filter = LinkMarkerFilter()
+                    raw_response = ""
+                    sent = False
+                    try:
+                        tokens = retry_policy.bounded(
+                            "generation", stream_tokens(messages), deadline, llm_breaker
                         )
+                        async for token in tokens:
+                            raw_response += token
+                            text = link_filter.feed(token)
+                            if text:
+                                sent = True
+                                yield "token", {"text": text}
+                        if not raw_response.strip():
+                            raise EmptyResponseError("LLM returned an empty response")
+                        break
+                    except CircuitOpenError:
+                        degraded = True
+                        break
+                    except Exception as e:
+                        # text already on the client can't be taken back, only retry clean failures
+                        delay = None if sent else retry_policy.next_delay("generation", e, attempt, deadline)
+                        if delay is None:
+                            raise
+                        await asyncio.sleep(delay)
+                        attempt += 1
+            
+            if degraded:
+                # LLM circuit is open, the stored QA answer is sent in the done event
+                ai_response, actions, detected_qa_id = degraded_answer(qa_docs)
+            else:
+                text = link_filter.flush()
+                if text:
+                    yield "token", {"text": text}
                 
-                # If no suggestions yet (e.g. RAG flow), check for keyword triggers
-                if not suggestions:
-                    suggestions = await asyncio.to_thread(
-                        follow_up_message.get_suggestions_by_keywords,
-                        message
-                    )
-
-                # Validate response
-                if self._is_valid_response(ai_response):
-                    logger.info(f"Successfully got response on attempt {attempt}")
-                    
-                    # Don't cache fallback
-                    if CORE_FALLBACK not in ai_response.lower():
-                        try:
-                            cache_data = json.dumps({
-                                'message': ai_response,
-                                'actions': actions,
-                                'message_suggestions': suggestions
-                            })
-                            self.redis_client.setex(
-                                name=cache_key,
-                                time=self.CACHED_KEY_TTL,
-                                value=cache_data
-                            )
-                            logger.info(f"Cached response for: {message}")
-                        except redis.RedisError as e:
-                            logger.warning(f"Redis error during cache set: {e}")
-                            
-                    return ai_response, actions, suggestions
-                
-                logger.warning(f"Empty response on attempt {attempt}/{self.max_attempts}")
-                
-            except Exception as e:
-                last_error = e
-                logger.error(f"Attempt {attempt}/{self.max_attempts} failed: {str(e)}")
-                
-                if attempt < self.max_attempts:
-                    await asyncio.sleep(self.retry_delay)
-                else:
-                    raise Exception(
-                        f"Failed to get response after {self.max_attempts} attempts"
-                    ) from last_error
+                ai_response, actions, detected_qa_id = finalize_response(
+                    raw_response, action_docs, qa_docs, detected_qa_id
+                )
+            
+            suggestions = self._get_suggestions(detected_qa_id, message)
+            
+            if not self._is_valid_response(ai_response):
+                yield "error", {"detail": "Chatbot returned an empty response"}
+                return
+            
+            if self._is_cacheable(ai_response):
+                await self._cache_response(
+                    cache_key, message, ai_response, actions, suggestions,
+                    self._dependencies(detected_qa_id, actions)
+                )
+            
+            yield "done", self._done_event(ai_response, actions, suggestions)
+        
+        except Exception as e:
+            logger.exception(f"Streaming chat failed: {str(e)}")
+            yield "error", {"detail": "Internal server error while processing chat request"}
+    
+    
+    async def warm_cache(self, message: str) -> str:
+        """
+        Make sure the answer for message is in the response cache.
+        Questions the QA fast path matches are answered before the cache is
+        read, generating them would waste an LLM call: their QA answer is
+        cached and indexed instead, so paraphrases reach it through the
+        semantic cache.
+        
+        Returns:
+            "cached" if it was already cached, "seeded" for a fast path QA
+            answer, "generated", or "skipped" when the answer is not cacheable
+            (fallback, or a fast path question without a semantic cache)
+        """
+        message = kw_norm.normalize_message(message)
+        cache_key = kw_norm.normalize_cache_key(message)
+        
+        if await self.redis_client.exists(cache_key):
+            return "cached"
+        
+        if settings.QA_FAST_PATH_ENABLED:
+            fast_qa_id = qa_matcher.match_normalized(message)
+            if fast_qa_id:
+                return await self._seed_qa_answer(message, cache_key, fast_qa_id)
+        
+        ai_response, _, _ = await self.single_flight.do(
+            cache_key, lambda: self._generate_coalesced(message, cache_key)
+        )
+        return "generated" if self._is_cacheable(ai_response) else "skipped"
+    
+    
+    async def _seed_qa_answer(self, message: str, cache_key: str, qa_id: str) -> str:
+        """Cache the QA entry's own answer for the semantic cache, no retrieval or LLM"""
+        if not self.semantic_cache:
+            return "skipped"
         
-        raise Exception(
-            f"Chatbot returned empty responses after {self.max_attempts} attempts"
+        ai_response, actions, suggestions = follow_up_message.follow_up_message_orchestrator(qa_id=qa_id)
+        if not self._is_cacheable(ai_response):
+            return "skipped"
+        
+        await self._cache_response(
+            cache_key, message, ai_response, actions, suggestions,
+            self._dependencies(qa_id, actions) | {f"qa:{qa_id}"}
         )
+        return "seeded"
     
     
     async def chat_react(self, user_query: str, is_like: bool = True) -> dict:
@@ -163,14 +396,18 @@ class ChatbotService:
         Raises:
             ValueError: If cache key not found
         """
-        # Normalize to get cache key
-        cache_key = kw_norm.normalize_cache_key(user_query)
+        # Normalize the same way get_chat_response does to get cache key
+        cache_key = kw_norm.normalize_cache_key(kw_norm.normalize_message(user_query))
         
         try:
             # Check if cached response exists
-            if not self.redis_client.exists(cache_key):
-                logger.warning(f"Cache key not found: {cache_key}")
-                raise ValueError(f"No cached response found for this query")
+            if not await self.redis_client.exists(cache_key):
+                # the answer may have been served from a paraphrased cached question
+                semantic_key = await self._semantic_lookup(kw_norm.normalize_message(user_query))
+                if not semantic_key or not await self.redis_client.exists(semantic_key):
+                    logger.warning(f"Cache key not found: {cache_key}")
+                    raise ValueError(f"No cached response found for this query")
+                cache_key = semantic_key
             
             # Use pipeline to batch Redis operations
             pipe = self.redis_client.pipeline()
@@ -181,7 +418,7 @@ class ChatbotService:
                 pipe.expire(f"{cache_key}:likes", self.CACHED_KEY_TTL)
                 pipe.get(f"{cache_key}:likes")
                 pipe.get(f"{cache_key}:dislikes")
-                results = pipe.execute()
+                results = await pipe.execute()
                 
                 likes = int(results[1] or 0)
                 dislikes = int(results[2] or 0)
@@ -201,7 +438,7 @@ class ChatbotService:
                 pipe.expire(f"{cache_key}:dislikes", self.CACHED_KEY_TTL)
                 pipe.get(f"{cache_key}:likes")
                 pipe.get(f"{cache_key}:dislikes")
-                results = pipe.execute()
+                results = await pipe.execute()
                 
                 likes = int(results[1] or 0)
                 dislikes = int(results[2] or 0)
@@ -217,7 +454,13 @@ class ChatbotService:
                     pipe.delete(cache_key)
                     pipe.delete(f"{cache_key}:likes")
                     pipe.delete(f"{cache_key}:dislikes")
-                    pipe.execute()
+                    await pipe.execute()
+                    
+                    if self.semantic_cache:
+                        await self.semantic_cache.remove(cache_key)
+                    
+                    # drop the answer from every worker's in-process cache
+                    await self.invalidate(cache_key)
                     
                     logger.warning(f"Cache deleted for: {cache_key} (Likes: {likes}, Dislikes: {dislikes})")
                     
@@ -244,6 +487,347 @@ class ChatbotService:
             raise Exception("Failed to process reaction due to cache error")
      
     
+    async def invalidate(self, cache_key: Optional[str] = None) -> None:
+        """
+        Evict a cached answer (or all of them when cache_key is None, e.g. after
+        the knowledge base changed) from the in-process cache of every worker.
+        """
+        self._invalidate_local(cache_key)
+        try:
+            await self.redis_client.publish(INVALIDATION_CHANNEL, cache_key or INVALIDATE_ALL)
+        except redis.RedisError as e:
+            logger.warning(f"Redis error publishing cache invalidation: {e}")
+    
+    
+    async def invalidate_dependencies(self, dependencies: Iterable[str]) -> int:
+        """
+        Delete the cached answers built from any of the given knowledge items
+        (chunk:<id>, action:<id>, follow_up:<qa_id>, follow_up:keywords)
+        from Redis, the semantic index and every worker's in-process cache.
+        
+        Returns:
+            Number of cached answers deleted
+        """
+        dependency_keys = [f"{DEPENDENCY_KEY_PREFIX}{dependency}" for dependency in dependencies]
+        if not dependency_keys:
+            return 0
+        
+        try:
+            members = await self.redis_client.sunion(dependency_keys)
+            cache_keys = sorted(key.decode() if isinstance(key, bytes) else key for key in members)
+            await self.redis_client.delete(*cache_keys, *dependency_keys)
+        except redis.RedisError as e:
+            logger.warning(f"Redis error invalidating dependent answers: {e}")
+            return 0
+        
+        for cache_key in cache_keys:
+            if self.semantic_cache:
+                await self.semantic_cache.remove(cache_key)
+            await self.invalidate(cache_key)
+        
+        logger.info(f"Invalidated {len(cache_keys)} cached answer(s) depending on {len(dependency_keys)} changed item(s)")
+        return len(cache_keys)
+    
+    
+    async def listen_for_invalidations(self) -> None:
+        """
+        Apply invalidations published by other workers. Runs for the lifetime
+        of the app; reconnects after Redis errors. If messages were missed
+        meanwhile, entries are still bounded by the L1 TTL.
+        """
+        if self.response_cache is None and self.semantic_cache is None:
+            return
+        
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # anything cached while unsubscribed may be stale
+                self._invalidate_local(None)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    cache_key = data.decode() if isinstance(data, bytes) else data
+                    self._invalidate_local(None if cache_key == INVALIDATE_ALL else cache_key)
+            except redis.RedisError as e:
+                logger.warning(f"Cache invalidation listener error: {e}. Reconnecting...")
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                await pubsub.aclose()
+    
+    
+    def _invalidate_local(self, cache_key: Optional[str]) -> None:
+        # the semantic mirror only syncs additions incrementally, removals come from here
+        if self.semantic_cache is not None:
+            if cache_key is None:
+                self.semantic_cache.mark_stale()
+            else:
+                self.semantic_cache.forget(cache_key)
+        if self.response_cache is None:
+            return
+        if cache_key is None:
+            self.response_cache.clear()
+        else:
+            self.response_cache.delete(cache_key)
+    
+    
+    async def close(self) -> None:
+        """Release pooled Redis connections on shutdown"""
+        await self.redis_client.aclose()
+        await self.redis_pool.disconnect()
+    
+    
+    async def _generate_coalesced(self, message: str, cache_key: str) -> Tuple[str, List[dict], List[dict]]:
+        """
+        Generate under the cross-worker lock. When another worker holds it,
+        reuse the answer it caches instead of calling the LLM again.
+        """
+        acquired, lock_token = await self._acquire_lock(cache_key)
+        if not acquired:
+            cached = await self._wait_for_leader(cache_key)
+            if cached:
+                return cached
+        
+        try:
+            return await self._generate_response(message, cache_key)
+        finally:
+            await self._release_lock(cache_key, lock_token)
+    
+    
+    async def _acquire_lock(self, cache_key: str) -> Tuple[bool, Optional[str]]:
+        """
+        Try to become the worker that generates the answer for cache_key.
+        
+        Returns:
+            (acquired, lock_token). acquired is False when another worker holds
+            the lock; lock_token is None when there is nothing to release
+        """
+        if not settings.SINGLE_FLIGHT_REDIS_LOCK:
+            return True, None
+        
+        lock_token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis_client.set(
+                self._lock_key(cache_key),
+                lock_token,
+                nx=True,
+                px=settings.SINGLE_FLIGHT_LOCK_TTL_MS
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Redis error acquiring generation lock: {e}. Proceeding without it.")
+            return True, None
+        
+        return (True, lock_token) if acquired else (False, None)
+    
+    
+    async def _release_lock(self, cache_key: str, lock_token: Optional[str]) -> None:
+        if lock_token is None:
+            return
+        try:
+            # only delete the lock if it is still ours, it may have expired and been re-acquired
+            await self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, self._lock_key(cache_key), lock_token)
+        except redis.RedisError as e:
+            logger.warning(f"Redis error releasing generation lock: {e}")
+    
+    
+    async def _wait_for_leader(self, cache_key: str) -> Optional[Tuple[str, List[dict], List[dict]]]:
+        """
+        Poll for the answer another worker is generating.
+        Returns None when it released the lock without caching one (e.g. fallback)
+        or the wait timed out, the caller then generates the answer itself.
+        """
+        lock_key = self._lock_key(cache_key)
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+        
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+            try:
+                pipe = self.redis_client.pipeline()
+                pipe.get(cache_key)
+                pipe.exists(lock_key)
+                cached_data, locked = await pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Redis error waiting for generation lock: {e}")
+                return None
+            
+            if cached_data:
+                logger.info(f"Reused answer generated by another worker for: {cache_key[:50]}...")
+                return self._parse_cached_response(cached_data)
+            if not locked:
+                return None
+        
+        logger.warning(f"Timed out waiting for generation lock: {cache_key[:50]}...")
+        return None
+    
+    
+    def _lock_key(self, cache_key: str) -> str:
+        return f"faq:lock:{cache_key}"
+    
+    
+    async def _lookup_cached(self, message: str, cache_key: str) -> Optional[Tuple[str, List[dict], List[dict]]]:
+        """Exact cache check (L1, then Redis), then the semantic cache for paraphrased questions"""
+        try:
+            cached = await self._get_cached(cache_key)
+            if cached:
+                logger.info(f"Cache hit for: {message[:50]}...")
+                metrics.cache_lookups.labels("hit").inc()
+                tracing.annotate("source", "cache")
+                return cached
+        except redis.RedisError as e:
+            logger.warning(f"Redis error during cache check: {e}. Proceeding without cache.")
+        
+        # reuse the answer of a paraphrased cached question
+        semantic_key = await self._semantic_lookup(message)
+        if semantic_key:
+            try:
+                cached = await self._get_cached(semantic_key)
+                if cached:
+                    logger.info(f"Semantic cache hit for: {message[:50]}...")
+                    metrics.cache_lookups.labels("semantic_hit").inc()
+                    tracing.annotate("source", "semantic_cache")
+                    return cached
+                
+                # answer expired or was deleted, drop its stale index entry
+                await self.semantic_cache.remove(semantic_key)
+            except redis.RedisError as e:
+                logger.warning(f"Redis error during semantic cache check: {e}")
+        
+        metrics.cache_lookups.labels("miss").inc()
+        return None
+    
+    
+    async def _get_cached(self, cache_key: str) -> Optional[Tuple[str, List[dict], List[dict]]]:
+        """Read-through lookup: in-process L1 first, then Redis (populating L1)"""
+        if self.response_cache is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                return cached
+        
+        cached_data = await self.redis_client.get(cache_key)
+        if not cached_data:
+            return None
+        
+        cached = self._parse_cached_response(cached_data)
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, cached)
+        return cached
+    
+    
+    async def _cache_response(
+        self, 
+        cache_key: str, 
+        message: str, 
+        ai_response: str, 
+        actions: List[dict], 
+        suggestions: List[dict],
+        dependencies: Iterable[str] = ()
+    ) -> None:
+        """
+        Store a generated answer in Redis and index it for semantic lookups.
+        dependencies: knowledge items it was built from, see invalidate_dependencies
+        """
+        try:
+            cache_data = json.dumps({
+                'message': ai_response,
+                'actions': actions,
+                'message_suggestions': suggestions
+            })
+            await self.redis_client.setex(
+                name=cache_key,
+                time=self.CACHED_KEY_TTL,
+                value=cache_data
+            )
+            logger.info(f"Cached response for: {message}")
+            
+            dependency_keys = [f"{DEPENDENCY_KEY_PREFIX}{dependency}" for dependency in dependencies]
+            if dependency_keys:
+                await self.redis_client.eval(
+                    REGISTER_DEPENDENCIES_SCRIPT, len(dependency_keys), *dependency_keys,
+                    cache_key, self.CACHED_KEY_TTL
+                )
+        except redis.RedisError as e:
+            logger.warning(f"Redis error during cache set: {e}")
+        
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, (ai_response, actions, suggestions))
+        
+        await self._semantic_index(cache_key, message)
+    
+    
+    def _dependencies(self, detected_qa_id: Optional[str], actions: List[dict]) -> set[str]:
+        """Knowledge items a freshly generated answer depends on"""
+        # retrieved chunks in the prompt (content hashed: any edit gives a new chunk id)
+        dependencies = {f"chunk:{chunk_id}" for chunk_id in prompt_sources.get()}
+        # action buttons, also hydrated from the catalog without being retrieved
+        dependencies.update(f"action:{action['id']}" for action in actions if action.get('id'))
+        # follow-ups: the detected intent's own, or keyword matches over every group
+        group = catalog.follow_ups.get(detected_qa_id) if detected_qa_id else None
+        dependencies.add(f"follow_up:{detected_qa_id}" if group and group.suggestions else "follow_up:keywords")
+        return dependencies
+    
+    
+    def _get_suggestions(self, detected_qa_id: Optional[str], message: str) -> List[dict]:
+        """Follow-ups of the matched QA intent, else keyword triggered suggestions"""
+        with metrics.timed("suggestions"):
+            suggestions = []
+            if detected_qa_id:
+                suggestions = follow_up_message.suggest_follow_ups(detected_qa_id)
+            
+            # If no suggestions yet (e.g. RAG flow), check for keyword triggers
+            if not suggestions:
+                suggestions = follow_up_message.get_suggestions_by_keywords(message)
+        return suggestions
+    
+    
+    def _done_event(self, ai_response: str, actions: List[dict], suggestions: List[dict]) -> dict:
+        return {
+            "message": ai_response,
+            "actions": actions,
+            "message_suggestions": suggestions
+        }
+    
+    
+    async def _semantic_lookup(self, message: str) -> Optional[str]:
+        """Return the cache key of a semantically equivalent cached question, if any"""
+        if not self.semantic_cache:
+            return None
+        try:
+            match = await self.semantic_cache.lookup(message)
+            return match[0] if match else None
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}. Proceeding without it.")
+            return None
+    
+    
+    async def _semantic_index(self, cache_key: str, message: str) -> None:
+        """Index a freshly cached answer for semantic lookups"""
+        if not self.semantic_cache:
+            return
+        try:
+            await self.semantic_cache.add(cache_key, message)
+        except Exception as e:
+            logger.warning(f"Semantic cache indexing failed: {e}")
+    
+    
+    def _parse_cached_response(self, cached_data: bytes) -> Tuple[str, List[dict], List[dict]]:
+        """Decode a cached JSON response into (message, actions, message_suggestions)"""
+        parsed = json.loads(cached_data)
+        return (
+            parsed['message'], 
+            parsed.get('actions', []), 
+            parsed.get('message_suggestions', [])
+        )
+    
+    
+    def _is_cacheable(self, response: str) -> bool:
+        """
+        Fallback answers are never cached, nor answers produced while the LLM
+        circuit is not closed (they may be degraded stored answers)
+        """
+        return "facebook messenger" not in response.lower() and llm_breaker.state == "closed"
+    
+    
     def _is_valid_response(self, response: Optional[str]) -> bool:
         """Check if response is valid and non-empty"""
         return bool(response and response.strip())
@@ -0,0 +1,323 @@
+"""
+Knowledge base hot reload.
+
+Reloads the catalog (actions, Q&A, follow-ups), the keywords glossary and
+the retrieval index without restarting the workers. Triggered by the admin
+endpoint, the optional document watcher (KNOWLEDGE_WATCH_ENABLED) or
+`python -m api.ingest build`.
+
+The worker that rebuilds the index tells the others over pub/sub, each one
+then swaps in the new documents and drops only the cached answers built
+from chunks, actions or follow-ups that changed.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Optional
+
+import redis
+
+try:
+    import fcntl
+except ImportError:
+    # no file lock (Windows): without Redis the rebuild is skipped
+    fcntl = None
+
+from api.scripts import chatbot
+from api.scripts.follow_up_message import follow_up_message
+from api.scripts.knowledge_catalog import DOCS_DIR, KnowledgeCatalog, catalog
+from api.scripts.qa_matcher import qa_matcher
+from api.scripts.vector_store import REBUILD_LOCK_FILE, load_manifest, open_search_index, rebuild_indexes
+from api.services.cache_invalidation import RELOAD_CHANNEL, reload_message
+from api.services.chatbot_service import RELEASE_LOCK_SCRIPT, ChatbotService, chatbot_service
+from api.utils.keywords_normalizer import GLOSSARY_FILE, KeywordsNormalizer, kw_norm
+
+logger = logging.getLogger(__name__)
+
+# held by the worker rebuilding the index so concurrent reloads don't embed twice
+RELOAD_LOCK_KEY = "faq:reload:lock"
+RELOAD_LOCK_TTL = 1800  # seconds
+WATCHED_SUFFIXES = {".md", ".json", ".jsonl"}
+
+
+def indexed_chunk_ids() -> set[str]:
+    """Chunk ids listed in the ingest manifest of the persisted index"""
+    return set(load_manifest().get("chunks", {}))
+
+
+def documents_snapshot(docs_dir: Path = DOCS_DIR) -> dict[str, tuple[int, int]]:
+    """(mtime_ns, size) of every watched document file"""
+    return {
+        path.name: (path.stat().st_mtime_ns, path.stat().st_size)
+        for path in sorted(docs_dir.iterdir())
+        if path.suffix in WATCHED_SUFFIXES and path.is_file()
+    }
+
+
+def try_file_lock(lock_file: Path) -> Optional[IO]:
+    """
+    Non-blocking exclusive flock() of lock_file, shared by the workers of a
+    host (the ones writing the same index files).
+    
+    Returns:
+        The open lock file, closing it releases the lock; None when another
+        process holds it or file locks are not available
+    """
+    if fcntl is None:
+        return None
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(lock_file, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class KnowledgeReloader:
+    """
+    One reload at a time per worker. New documents are loaded and the index
+    rebuilt in threads while requests keep using the current ones; the
+    in-memory structures are then swapped in without an await in between.
+    """
+    def __init__(self, service: ChatbotService, docs_dir: Path = DOCS_DIR):
+        self.service = service
+        self.docs_dir = docs_dir
+        self.worker_id = uuid.uuid4().hex
+        self.retry_delay: float = 1.0 # reload listener reconnect delay
+        self.indexed_chunks = indexed_chunk_ids()
+        self.last_reload: dict = {}
+        self.counters = {
+            "reloads": 0,
+            "failures": 0,
+            "invalidated_answers": 0
+        }
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked() or (self._task is not None and not self._task.done())
+
+
+    def start(self, rebuild_index: bool = True) -> bool:
+        """
+        Reload in the background.
+
+        Returns:
+            False when a reload is already running in this worker
+        """
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self._run(rebuild_index))
+        return True
+
+
+    async def _run(self, rebuild_index: bool) -> None:
+        try:
+            await self.reload(rebuild_index)
+        except Exception as e:
+            logger.exception(f"Knowledge reload failed: {e}")
+
+
+    async def reload(self, rebuild_index: bool = True) -> dict:
+        """
+        Args:
+            rebuild_index: embed changed chunks and rewrite the index files first,
+                otherwise only reopen the index another process rebuilt
+
+        Returns:
+            Summary of the reload
+        """
+        async with self._lock:
+            started_at = time.monotonic()
+            try:
+                new_catalog = await asyncio.to_thread(KnowledgeCatalog.load, self.docs_dir)
+                # compiled aside, live requests keep the current glossary until the swap
+                normalizer = await asyncio.to_thread(KeywordsNormalizer, self.docs_dir / GLOSSARY_FILE.name)
+                glossary_changed = normalizer.keywords_glossary != kw_norm.keywords_glossary
+
+                index_summary = None
+                if rebuild_index:
+                    index_summary = await self._rebuild(new_catalog, normalizer)
+                    if index_summary is None:
+                        return self._finish({"status": "skipped", "reason": "index rebuild running in another worker"})
+
+                summary = await self._apply(new_catalog, normalizer)
+                summary.update({
+                    "status": "reloaded",
+                    "index": index_summary,
+                    "glossary_changed": glossary_changed,
+                    "duration_seconds": round(time.monotonic() - started_at, 3)
+                })
+            except Exception as e:
+                self.counters["failures"] += 1
+                self._finish({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+                raise
+
+        if index_summary is not None:
+            await self._broadcast()
+        return self._finish(summary)
+
+
+    async def _rebuild(self, new_catalog: KnowledgeCatalog, normalizer: KeywordsNormalizer) -> Optional[dict]:
+        """
+        Rebuild the index files under the cross-worker reload lock, or under a
+        file lock on the index directory while Redis is unavailable: the index
+        files are never written by two workers at once.
+        Returns None when another worker holds the lock.
+        """
+        lock_token = uuid.uuid4().hex
+        file_lock = None
+        try:
+            acquired = await self.service.redis_client.set(
+                RELOAD_LOCK_KEY, lock_token, nx=True, ex=RELOAD_LOCK_TTL
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Redis error acquiring the reload lock: {e}. Falling back to the index file lock.")
+            lock_token = None
+            file_lock = await asyncio.to_thread(try_file_lock, REBUILD_LOCK_FILE)
+            acquired = file_lock is not None
+        if not acquired:
+            logger.info("Index rebuild already running in another worker")
+            return None
+
+        try:
+            # the lexical index is tokenized with the new glossary
+            return await asyncio.to_thread(rebuild_indexes, new_catalog, self.docs_dir, normalizer)
+        finally:
+            if file_lock is not None:
+                file_lock.close()
+            if lock_token:
+                try:
+                    # only our own lock: it may have expired and been taken by another worker
+                    await self.service.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, RELOAD_LOCK_KEY, lock_token)
+                except redis.RedisError:
+                    pass
+
+
+    async def _apply(self, new_catalog: KnowledgeCatalog, normalizer: KeywordsNormalizer) -> dict:
+        """Swap in the new documents and index, then drop the answers they invalidate"""
+        new_chunks = await asyncio.to_thread(indexed_chunk_ids)
+        # index files are read in a thread, requests keep using the old index meanwhile
+        new_index = await asyncio.to_thread(open_search_index)
+
+        changes = catalog.changes(new_catalog)
+        removed_chunks = self.indexed_chunks - new_chunks if new_chunks else set()
+
+        # no await from here on: requests see either the old or the new documents and index
+        chatbot.set_search_index(new_index)
+        catalog.replace(new_catalog)
+        kw_norm.replace(normalizer)
+        follow_up_message.build_tag_index()
+        qa_matcher.index(catalog.qa_entries.values())
+        self.indexed_chunks = new_chunks
+
+        dependencies = {f"chunk:{chunk_id}" for chunk_id in removed_chunks}
+        dependencies.update(f"action:{action_id}" for action_id in changes["actions"])
+        # QA answers seeded by the warm-up
+        dependencies.update(f"qa:{qa_id}" for qa_id in changes["qa_entries"])
+        if changes["follow_ups"]:
+            # keyword suggestions may come from any group
+            dependencies.update(f"follow_up:{qa_id}" for qa_id in changes["follow_ups"])
+            dependencies.add("follow_up:keywords")
+        invalidated = await self.service.invalidate_dependencies(dependencies)
+
+        self.counters["reloads"] += 1
+        self.counters["invalidated_answers"] += invalidated
+        logger.info(
+            f"Knowledge reloaded: {len(changes['qa_entries'])} QA, {len(changes['actions'])} action, "
+            f"{len(changes['follow_ups'])} follow-up change(s), {len(removed_chunks)} chunk(s) removed, "
+            f"{invalidated} cached answer(s) invalidated"
+        )
+        return {
+            "changed": {name: len(ids) for name, ids in changes.items()},
+            "removed_chunks": len(removed_chunks),
+            "invalidated_answers": invalidated
+        }
+
+
+    async def _broadcast(self) -> None:
+        try:
+            await self.service.redis_client.publish(RELOAD_CHANNEL, reload_message(self.worker_id))
+        except redis.RedisError as e:
+            logger.warning(f"Redis error broadcasting knowledge reload: {e}")
+
+
+    def _finish(self, summary: dict) -> dict:
+        self.last_reload = {**summary, "finished_at": datetime.now(timezone.utc).isoformat()}
+        return summary
+
+
+    async def listen(self) -> None:
+        """
+        Reload when another worker (or the ingest CLI) rebuilt the index.
+        Runs for the lifetime of the app; reconnects after Redis errors.
+        """
+        while True:
+            pubsub = self.service.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(RELOAD_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        origin = json.loads(message["data"]).get("origin")
+                    except (ValueError, AttributeError):
+                        origin = None
+                    if origin == self.worker_id:
+                        continue
+                    await self._run(rebuild_index=False)
+            except redis.RedisError as e:
+                logger.warning(f"Knowledge reload listener error: {e}. Reconnecting...")
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                await pubsub.aclose()
+
+
+    async def watch(self, interval: float) -> None:
+        """
+        Poll api/documents and reload (rebuilding the index) once a change has
+        been stable for one interval, so half-written files are not picked up.
+        """
+        snapshot = await asyncio.to_thread(documents_snapshot, self.docs_dir)
+        pending = None
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = await asyncio.to_thread(documents_snapshot, self.docs_dir)
+            except OSError as e:
+                logger.warning(f"Could not scan {self.docs_dir}: {e}")
+                continue
+
+            if current == snapshot:
+                pending = None
+                continue
+            if current != pending:
+                pending = current
+                continue
+
+            changed = sorted(
+                name for name in current.keys() | snapshot.keys() if current.get(name) != snapshot.get(name)
+            )
+            logger.info(f"Knowledge documents changed ({', '.join(changed)}), reloading")
+            snapshot, pending = current, None
+            await self._run(rebuild_index=True)
+
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "running": self.running,
+            "indexed_chunks": len(self.indexed_chunks),
+            "last_reload": self.last_reload or None
+        }
+
+
+knowledge_reloader = KnowledgeReloader(chatbot_service)
@@ -0,0 +1,234 @@
+import logging
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import redis
+import redis.asyncio as aioredis
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Semantic lookup layer over the Redis response cache.
+    Every cached answer key is stored together with the embedding of its
+    normalized question in a Redis hash. A new question reuses a cached
+    answer when its embedding is within the similarity threshold of one
+    of those questions, so paraphrases skip retrieval and the LLM.
+    A sorted set next to the hash holds when each entry was indexed; once
+    the index is full the oldest entries make room for new ones. The same
+    set lets workers pull only what others indexed since their last refresh;
+    the whole hash is read again only after an invalidation (see mark_stale).
+    """
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        embeddings: Embeddings,
+        model_name: str,
+        threshold: float = 0.93,
+        max_entries: int = 5000,
+        refresh_interval: float = 60.0
+    ):
+        self.redis_client = redis_client
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        # vectors of different models are not comparable, keep one index per model
+        self.index_key = f"faq:semantic:{model_name}"
+        self.added_key = f"{self.index_key}:added"
+
+        # local mirror of the Redis hash: keys[i] <-> matrix[i] (unit vectors)
+        self._keys: list[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._loaded_at: float = 0.0
+        # wall-clock time of the last sync, entries indexed after it are fetched incrementally
+        self._synced_at: float = 0.0
+        self._stale = True
+
+        self.counters = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+
+    async def _embed(self, message: str) -> np.ndarray:
+        vector = np.asarray(await self.embeddings.aembed_query(message), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+    def mark_stale(self) -> None:
+        """Entries may have been removed elsewhere, read the whole index on the next refresh"""
+        self._stale = True
+
+
+    async def _refresh(self, force: bool = False) -> None:
+        """Sync the mirror with Redis so entries cached by other workers are visible"""
+        if not force and not self._stale and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+
+        synced_at = time.time()
+        # cleared up front so a mark_stale() arriving mid-reload is kept
+        stale, self._stale = self._stale, False
+        try:
+            if stale:
+                await self._reload()
+            else:
+                await self._fetch_new()
+        except Exception:
+            self._stale = self._stale or stale
+            raise
+        self._synced_at = synced_at
+        self._loaded_at = time.monotonic()
+
+
+    async def _reload(self) -> None:
+        entries = await self.redis_client.hgetall(self.index_key)
+        keys = []
+        vectors = []
+        for key, blob in entries.items():
+            keys.append(key.decode() if isinstance(key, bytes) else key)
+            vectors.append(np.frombuffer(blob, dtype=np.float32))
+
+        self._keys = keys
+        self._matrix = np.vstack(vectors) if vectors else None
+
+
+    async def _fetch_new(self) -> None:
+        """Append the entries indexed since the last sync"""
+        # overlap by one interval so clock skew between hosts doesn't hide entries
+        since = self._synced_at - self.refresh_interval
+        known = set(self._keys)
+        new_keys = [
+            key for key in (
+                member.decode() if isinstance(member, bytes) else member
+                for member in await self.redis_client.zrangebyscore(self.added_key, since, "+inf")
+            )
+            if key not in known
+        ]
+        if not new_keys:
+            return
+
+        blobs = await self.redis_client.hmget(self.index_key, new_keys)
+        # removed between the two reads
+        fetched = [(key, blob) for key, blob in zip(new_keys, blobs) if blob is not None]
+        # a local add may have raced in while awaiting
+        known = set(self._keys)
+        fetched = [(key, blob) for key, blob in fetched if key not in known]
+        if not fetched:
+            return
+
+        rows = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in fetched])
+        self._keys = self._keys + [key for key, _ in fetched]
+        self._matrix = rows if self._matrix is None else np.vstack([self._matrix, rows])
+
+
+    async def lookup(self, message: str) -> Optional[Tuple[str, float]]:
+        """
+        Find the cached answer key whose question is closest to the message.
+
+        Returns:
+            (cache_key, similarity) when above the threshold, otherwise None
+        """
+        self.counters["lookups"] += 1
+        try:
+            await self._refresh()
+        except redis.RedisError as e:
+            logger.warning(f"Redis error loading semantic cache index: {e}")
+
+        # the mirror may be swapped while awaiting the embedding
+        keys, matrix = self._keys, self._matrix
+        if matrix is None:
+            self.counters["misses"] += 1
+            return None
+
+        similarities = matrix @ await self._embed(message)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+
+        if similarity < self.threshold:
+            self.counters["misses"] += 1
+            return None
+
+        self.counters["hits"] += 1
+        logger.info(f"Semantic cache hit ({similarity:.3f}) -> {keys[best]}")
+        return keys[best], similarity
+
+
+    async def add(self, cache_key: str, message: str) -> None:
+        """Index the question of a freshly cached answer"""
+        if cache_key in self._keys:
+            return
+        if len(self._keys) >= self.max_entries:
+            # down to 90% to amortize the cleanup
+            await self._evict_oldest(len(self._keys) - int(self.max_entries * 0.9) + 1)
+
+        vector = await self._embed(message)
+        await self.redis_client.hset(self.index_key, cache_key, vector.tobytes())
+        await self.redis_client.zadd(self.added_key, {cache_key: time.time()})
+
+        if cache_key in self._keys:
+            return
+        self._keys = self._keys + [cache_key]
+        row = vector[np.newaxis, :]
+        self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+
+
+    async def remove(self, cache_key: str) -> None:
+        """Drop an entry, e.g. after its answer expired or was disliked"""
+        await self._drop([cache_key])
+
+
+    def forget(self, cache_key: str) -> None:
+        """Drop an entry another worker removed from Redis, from the local mirror only"""
+        self._forget([cache_key])
+
+
+    async def _evict_oldest(self, count: int) -> None:
+        """Drop the count entries indexed first"""
+        by_age = [
+            key.decode() if isinstance(key, bytes) else key
+            for key in await self.redis_client.zrange(self.added_key, 0, -1)
+        ]
+        # entries without an insert time (indexed by an older version) count as oldest
+        dated = set(by_age)
+        undated = [key for key in self._keys if key not in dated]
+        victims = (undated + by_age)[:count]
+        logger.info(f"Semantic cache index full, evicting {len(victims)} oldest entries")
+        await self._drop(victims)
+
+
+    async def _drop(self, cache_keys: list[str]) -> None:
+        if not cache_keys:
+            return
+        await self.redis_client.hdel(self.index_key, *cache_keys)
+        await self.redis_client.zrem(self.added_key, *cache_keys)
+
+        entries = len(self._keys)
+        self._forget(cache_keys)
+        self.counters["evictions"] += entries - len(self._keys)
+
+
+    def _forget(self, cache_keys: list[str]) -> None:
+        dropped = set(cache_keys)
+        keep = [index for index, key in enumerate(self._keys) if key not in dropped]
+        if len(keep) == len(self._keys):
+            return
+        self._keys = [self._keys[index] for index in keep]
+        self._matrix = self._matrix[keep] if keep else None
+
+
+    def stats(self) -> dict:
+        """Hit-rate metrics for the health endpoint"""
+        lookups = self.counters["lookups"]
+        return {
+            **self.counters,
+            "entries": len(self._keys),
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold
+        }
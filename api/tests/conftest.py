@@ -0,0 +1,65 @@
+from pathlib import Path
+from typing import Callable
+from unittest.mock import AsyncMock
+
+import pytest
+
+
+class FakeClock:
+    """Monotonic clock the test moves by hand"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def make_service() -> Callable:
+    """
+    ChatbotService factory with a mocked Redis client and no semantic cache.
+    `cached` maps cache keys to the JSON Redis returns for them, `l1=False`
+    drops the in-process response cache too.
+    """
+    from api.services.chatbot_service import ChatbotService
+
+    def factory(cached: dict | None = None, l1: bool = True) -> ChatbotService:
+        service = ChatbotService()
+        service.redis_client = AsyncMock()
+        service.redis_client.get.side_effect = lambda key: (cached or {}).get(key)
+        service.semantic_cache = None
+        if not l1:
+            service.response_cache = None
+        return service
+
+    return factory
+
+
+@pytest.fixture
+def temp_index(tmp_path, monkeypatch) -> Callable:
+    """
+    Points the vector store, manifest, NumPy export and lexical index at
+    tmp_path. Called with the embedding function of the new collection,
+    returns the directory the index files go to.
+    """
+    from api.scripts import vector_store as vs
+
+    def factory(embedding_function) -> Path:
+        index_dir = tmp_path / "chroma_db"
+        monkeypatch.setattr(vs, "vector_store", vs.AsyncChroma(
+            collection_name=vs.COLLECTION_NAME,
+            embedding_function=embedding_function,
+            persist_directory=str(index_dir)
+        ))
+        monkeypatch.setattr(vs, "PERSISTENT_CHROMADB", index_dir)
+        monkeypatch.setattr(vs, "INGEST_MANIFEST", index_dir / "ingest_manifest.json")
+        monkeypatch.setattr(vs, "NUMPY_INDEX_DIR", index_dir / "numpy_index")
+        monkeypatch.setattr(vs, "LEXICAL_INDEX_FILE", index_dir / "lexical_index.json")
+        return index_dir
+
+    return factory
@@ -10,12 +10,11 @@ from api.scripts.follow_up_message import FollowUpMessage
 def debug_tags():
     follow_up = FollowUpMessage()
     
-    print(f"Total suggestion groups: {len(follow_up.follow_up_questions_data)}")
+    print(f"Total suggestion groups: {len(follow_up.catalog.follow_ups)}")
     
     wedding_id = "qa-wedding-pricing-hm"
-    if wedding_id in follow_up.follow_up_questions_data:
-        data = follow_up.follow_up_questions_data[wedding_id]
-        tags = data.get("tags", [])
+    if wedding_id in follow_up.catalog.follow_ups:
+        tags = follow_up.catalog.follow_ups[wedding_id].tags
         print(f"Tags for {wedding_id}: {tags}")
         
         message = "I want to inquire about wedding packages"
@@ -33,7 +32,7 @@ def debug_tags():
         print(f"ANY MATCH FOUND: {any_match}")
     else:
         print(f"ERROR: {wedding_id} not found in data!")
-        print(f"Available keys: {list(follow_up.follow_up_questions_data.keys())[:5]}")
+        print(f"Available keys: {list(follow_up.catalog.follow_ups.keys())[:5]}")
 
 if __name__ == '__main__':
     debug_tags()
@@ -0,0 +1,30 @@
+import os
+import time
+from unittest.mock import patch
+
+from api.benchmarks.hot_paths_bench import build_cases, compare, load_baseline, measure
+
+
+def test_every_case_runs_and_has_a_baseline():
+    with patch.dict(os.environ):
+        cases = build_cases()
+
+    for run_pass, calls in cases.values():
+        assert run_pass() is not None and calls > 0
+    assert set(load_baseline()["cases"]) == set(cases)
+
+
+def test_compare_flags_a_slower_case():
+    def slow():
+        time.sleep(0.0002)
+
+    def fast():
+        time.sleep(0.00005)
+
+    baseline = {"cases": measure({"case": (fast, 1)}, rounds=3, min_time=0.01)}
+    rows = compare(measure({"case": (slow, 1)}, rounds=3, min_time=0.01), baseline, threshold=1.5)
+
+    assert rows[0]["ratio"] > 1.5
+    assert rows[0]["regressed"]
+    assert not compare(baseline["cases"], baseline)[0]["regressed"]
+    assert compare({"new": {"us": 1.0, "relative": 1.0}}, baseline)[0]["ratio"] is None
@@ -0,0 +1,66 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+from api.scripts.chatbot import FALLBACK_MESSAGE
+from api.services.chatbot_service import REGISTER_DEPENDENCIES_SCRIPT, ChatbotService
+from api.utils.keywords_normalizer import kw_norm
+
+
+def fake_tokens(*tokens: str):
+    async def stream_tokens(messages, temperature=0.5):
+        for token in tokens:
+            yield token
+    return stream_tokens
+
+
+def collect(service: ChatbotService, message: str) -> list[tuple[str, dict]]:
+    async def run():
+        return [event async for event in service.stream_chat_response(message)]
+    return asyncio.run(run())
+
+
+@patch('api.services.chatbot_service.prepare_chat', new_callable=AsyncMock)
+def test_tokens_are_streamed_then_cached(mock_prepare, make_service):
+    mock_prepare.return_value = ([], [], [], None)
+    service = make_service()
+
+    with patch('api.services.chatbot_service.stream_tokens', fake_tokens("Open ", "daily ", "[LINK:", "contact-page]")):
+        events = collect(service, "what are your office hours today")
+
+    assert [event for event, _ in events] == ["token", "token", "done"]
+    assert "".join(data["text"] for event, data in events if event == "token") == "Open daily"
+    assert events[-1][1]["message"] == "Open daily"
+    service.redis_client.setex.assert_awaited_once()
+    # registered for invalidation when the linked page or the follow-ups change
+    register = next(c for c in service.redis_client.eval.await_args_list if c.args[0] == REGISTER_DEPENDENCIES_SCRIPT)
+    assert set(register.args[2:-2]) == {"faq:deps:action:contact-page", "faq:deps:follow_up:keywords"}
+
+
+@patch('api.services.chatbot_service.prepare_chat', new_callable=AsyncMock)
+def test_cache_hit_is_a_single_done_event(mock_prepare, make_service):
+    cache_key = kw_norm.normalize_cache_key(kw_norm.normalize_message("what are your office hours today"))
+    cached = {cache_key: json.dumps({
+        "message": "Cached answer", "actions": [], "message_suggestions": []
+    })}
+    service = make_service(cached)
+
+    events = collect(service, "what are your office hours today")
+
+    mock_prepare.assert_not_called()
+    assert events == [("done", {"message": "Cached answer", "actions": [], "message_suggestions": []})]
+
+
+@patch('api.services.chatbot_service.prepare_chat', new_callable=AsyncMock)
+def test_fallback_answers_are_streamed_but_not_cached(mock_prepare, make_service):
+    # a weak retrieval is still generated once, the prompt's fallback rule answers
+    mock_prepare.return_value = ([], [], [], None)
+    service = make_service()
+
+    with patch('api.services.chatbot_service.stream_tokens', fake_tokens(FALLBACK_MESSAGE)):
+        events = collect(service, "what are your office hours today")
+
+    assert [event for event, _ in events] == ["token", "done"]
+    assert events[-1][1]["message"] == FALLBACK_MESSAGE
+    assert events[-1][1]["actions"][0]["id"] == "facebook-main"
+    service.redis_client.setex.assert_not_awaited()
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain_core.documents import Document
+
+from api.config.settings import settings
+
+from api.scripts import chatbot as chatbot_module
+from api.scripts.chatbot import FALLBACK_MESSAGE, degraded_answer
+from api.utils.circuit_breaker import CircuitBreaker
+from api.utils.retry_policy import LatencyBudgetExceeded
+
+
+def make_breaker(clock) -> CircuitBreaker:
+    return CircuitBreaker("llm", failure_rate_threshold=0.5, slow_call_seconds=5,
+                          window_size=4, min_calls=4, open_seconds=30, clock=clock)
+
+
+def test_opens_on_error_rate_and_recovers_through_half_open(clock):
+    breaker = make_breaker(clock)
+
+    breaker.record_success(1.0)
+    breaker.record_failure()
+    breaker.record_success(1.0)
+    assert breaker.state == "closed"
+    breaker.record_failure()  # 2 of 4 bad
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now = 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial call at a time
+    breaker.record_success(1.0)
+    assert breaker.state == "closed"
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_slow_calls_trip_and_failed_trial_reopens(clock):
+    breaker = make_breaker(clock)
+
+    for _ in range(4):
+        breaker.record_success(6.0)
+    assert breaker.state == "open"
+
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 45
+    assert breaker.state == "open"
+
+
+def test_degraded_answer_uses_top_qa_entry():
+    qa_docs = [
+        Document(page_content="Question: ...", metadata={"type": "qa", "qa_id": "qa-booking-process"}),
+        Document(page_content="Question: ...", metadata={"type": "qa", "qa_id": "qa-general-pricing-hm"}),
+    ]
+
+    message, actions, qa_id = degraded_answer(qa_docs)
+    assert message.startswith("You can book by filling out the form")
+    assert qa_id == "qa-booking-process"
+    assert actions[0]["id"] == "booking-page"
+
+    assert degraded_answer([])[0] == FALLBACK_MESSAGE
+
+
+def test_open_circuit_skips_the_llm(clock):
+    docs = [(Document(page_content="Question: ...", metadata={"type": "qa", "qa_id": "qa-booking-process"}), 0.2)]
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+
+    with patch.object(chatbot_module, "llm_breaker", breaker), \
+            patch.object(chatbot_module.llm.chat.completions, "create", new_callable=AsyncMock) as mock_create, \
+            patch.object(chatbot_module.search_index, "asimilarity_search_with_score", AsyncMock(return_value=docs)):
+        message, actions, qa_id = asyncio.run(chatbot_module.chatbot("how do i book"))
+
+    mock_create.assert_not_called()
+    assert qa_id == "qa-booking-process"
+    assert actions[0]["id"] == "booking-page"
+
+
+def test_latency_budget_timeouts_open_the_breaker(clock):
+    breaker = make_breaker(clock)
+
+    async def hung_groq(**kwargs):
+        await asyncio.sleep(60)
+
+    async def ask():
+        return await chatbot_module.chatbot("what are your office hours", deadline=time.monotonic() + 0.01)
+
+    with patch.object(chatbot_module, "llm_breaker", breaker), \
+            patch.object(chatbot_module, "prepare_chat", AsyncMock(return_value=([], [], [], None))), \
+            patch.object(chatbot_module.llm.chat.completions, "create", hung_groq):
+        for _ in range(4):
+            with pytest.raises(LatencyBudgetExceeded):
+                asyncio.run(ask())
+
+    assert breaker.stats()["failures"] == 4
+    assert breaker.state == "open"
+
+
+def test_consumer_stopping_early_releases_the_trial_call(clock):
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now = 30
+
+    async def chunks():
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Open "))])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="daily"))])
+
+    async def read_one_token():
+        tokens = chatbot_module.stream_tokens([])
+        await anext(tokens)
+        await tokens.aclose()
+
+    with patch.object(chatbot_module, "llm_breaker", breaker), \
+            patch.object(chatbot_module.llm.chat.completions, "create", AsyncMock(return_value=chunks())):
+        asyncio.run(read_one_token())
+
+    assert breaker.state == "half_open"
+    assert breaker.stats()["failures"] == 4
+    assert breaker.allow()
+
+
+def test_cancelled_streams_leave_the_breaker_closed(clock):
+    breaker = make_breaker(clock)
+
+    async def hung_groq(**kwargs):
+        await asyncio.sleep(60)
+
+    async def disconnect():
+        # the client closes the tab while the answer is generated
+        task = asyncio.create_task(chatbot_module.stream_response([]))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with patch.object(chatbot_module, "llm_breaker", breaker), \
+            patch.object(chatbot_module.llm.chat.completions, "create", hung_groq):
+        for _ in range(6):
+            asyncio.run(disconnect())
+
+    assert breaker.state == "closed"
+    assert breaker.stats()["failures"] == 0
+
+    # a cancelled trial call gives its slot back
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now = 30
+    with patch.object(chatbot_module, "llm_breaker", breaker), \
+            patch.object(chatbot_module.llm.chat.completions, "create", hung_groq):
+        asyncio.run(disconnect())
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+@patch('api.services.chatbot_service.prepare_chat', new_callable=AsyncMock)
+def test_streamed_generation_stops_at_the_latency_budget(mock_prepare, make_service, clock):
+    mock_prepare.return_value = ([], [], [], None)
+    breaker = make_breaker(clock)
+
+    async def hung_tokens(messages, temperature=0.5):
+        yield "Open "
+        await asyncio.sleep(60)
+        yield "daily"
+
+    async def collect():
+        return [event async for event in make_service().stream_chat_response("what are your office hours today")]
+
+    started = time.monotonic()
+    with patch.object(settings, "CHAT_LATENCY_BUDGET", 0.05), \
+            patch('api.services.chatbot_service.stream_tokens', hung_tokens), \
+            patch('api.services.chatbot_service.llm_breaker', breaker):
+        events = asyncio.run(collect())
+
+    assert time.monotonic() - started < 5
+    assert [event for event, _ in events] == ["token", "error"]
+    assert breaker.stats()["failures"] == 1
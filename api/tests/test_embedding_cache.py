@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from api.utils.embedding_cache import CachedQueryEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.5, -1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def test_query_cache_hits_memory_then_disk(tmp_path):
+    inner = CountingEmbeddings()
+    cache_file = tmp_path / "emb.sqlite3"
+    cache = CachedQueryEmbeddings(inner, "model-a", cache_path=cache_file, key_fn=str.lower)
+
+    assert cache.embed_query("Wedding Price") == [13.0, 0.5, -1.0]
+    assert cache.embed_query("wedding price") == [13.0, 0.5, -1.0]
+    assert inner.calls == 1
+    assert cache.stats()["l1_hits"] == 1
+
+    # a fresh process only has the disk store
+    restarted = CachedQueryEmbeddings(inner, "model-a", cache_path=cache_file, key_fn=str.lower)
+    assert restarted.embed_query("wedding price") == [13.0, 0.5, -1.0]
+    assert inner.calls == 1
+    assert restarted.stats()["l2_hits"] == 1
+
+    # vectors are not shared across models
+    other_model = CachedQueryEmbeddings(inner, "model-b", cache_path=cache_file)
+    other_model.embed_query("wedding price")
+    assert inner.calls == 2
+
+
+def test_query_cache_evicts_least_recent():
+    inner = CountingEmbeddings()
+    cache = CachedQueryEmbeddings(inner, "model-a", l1_max_items=2)
+
+    for text in ("a", "b", "a", "c", "a"):
+        cache.embed_query(text)
+
+    assert inner.calls == 3
+    assert cache.stats()["l1_evictions"] == 1
+    cache.embed_query("b")
+    assert inner.calls == 4
+
+
+def test_recent_disk_hits_do_not_write_and_run_off_the_event_loop(tmp_path):
+    inner = CountingEmbeddings()
+    cache_file = tmp_path / "emb.sqlite3"
+    CachedQueryEmbeddings(inner, "model-a", cache_path=cache_file).embed_query("hours")
+
+    cache = CachedQueryEmbeddings(inner, "model-a", cache_path=cache_file)
+    disk_threads = []
+    l2_get = cache._l2_get
+
+    def recording_l2_get(key):
+        disk_threads.append(threading.get_ident())
+        return l2_get(key)
+
+    cache._l2_get = recording_l2_get
+    writes_before = cache._db.total_changes
+
+    async def lookup():
+        return threading.get_ident(), await cache.aembed_query("hours")
+
+    loop_thread, vector = asyncio.run(lookup())
+    assert vector == [5.0, 0.5, -1.0]
+    assert inner.calls == 1
+    assert cache._db.total_changes == writes_before
+    assert disk_threads and loop_thread not in disk_threads
+
+
+def test_disk_eviction_keeps_recently_read_rows(tmp_path, clock):
+    inner = CountingEmbeddings()
+    cache = CachedQueryEmbeddings(
+        inner, "model-a", cache_path=tmp_path / "emb.sqlite3",
+        l1_max_items=1, l2_max_items=3, touch_interval=10, clock=clock
+    )
+    for text in ("a", "bb", "ccc"):
+        clock.now += 1
+        cache.embed_query(text)
+
+    # "a" is the oldest write but was just read back from disk
+    clock.now += 20
+    cache.embed_query("a")
+    clock.now += 1
+    cache.embed_query("dddd")
+
+    assert cache.stats()["l2_evictions"] == 2
+    restarted = CachedQueryEmbeddings(inner, "model-a", cache_path=tmp_path / "emb.sqlite3")
+    calls = inner.calls
+    restarted.embed_query("a")
+    restarted.embed_query("dddd")
+    assert inner.calls == calls
+    restarted.embed_query("bb")
+    assert inner.calls == calls + 1
+
+
+def test_row_count_survives_restarts_and_overwrites(tmp_path):
+    inner = CountingEmbeddings()
+    cache_file = tmp_path / "emb.sqlite3"
+    cache = CachedQueryEmbeddings(inner, "model-a", cache_path=cache_file, l2_max_items=3)
+    for text in ("a", "bb"):
+        cache.embed_query(text)
+    # rewriting a key replaces its row, it doesn't add one
+    cache._l2_put("a", [0.0, 0.0, 0.0])
+
+    restarted = CachedQueryEmbeddings(inner, "model-a", cache_path=cache_file, l2_max_items=3)
+    (count,) = restarted._db.execute("SELECT n FROM query_embeddings_count").fetchone()
+    assert count == 2
+
+    restarted.embed_query("ccc")
+    assert restarted.stats()["l2_evictions"] == 0
+    restarted.embed_query("dddd")
+    assert restarted.stats()["l2_evictions"] == 2
+    (count,) = restarted._db.execute("SELECT n FROM query_embeddings_count").fetchone()
+    (rows,) = restarted._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+    assert count == rows == 2
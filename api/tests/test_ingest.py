@@ -0,0 +1,45 @@
+import json
+
+from langchain_core.embeddings import Embeddings
+
+from api import ingest
+from api.scripts import vector_store as vs
+
+
+class LengthEmbeddings(Embeddings):
+    """Cheap deterministic vectors, enough to build and open a real collection"""
+    def embed_query(self, text):
+        return [float(len(text) % 97), float(text.count(" ")), 1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def test_ingest_cli_verifies_a_freshly_built_index(temp_index, capsys):
+    temp_index(LengthEmbeddings())
+
+    assert ingest.main(["verify"]) == 1
+    assert "STALE" in capsys.readouterr().out
+
+    summary = vs.rebuild_indexes()
+    assert summary["added"] > 0
+
+    assert ingest.main(["verify"]) == 0
+    assert "Index is up to date" in capsys.readouterr().out
+
+    assert ingest.main(["stats"]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["collection_chunks"] == stats["manifest_chunks"] == summary["added"]
+
+
+def test_image_builds_do_not_broadcast(temp_index, monkeypatch, capsys):
+    temp_index(LengthEmbeddings())
+    broadcasts = []
+    monkeypatch.setattr(ingest, "broadcast_knowledge_change", lambda: broadcasts.append(1))
+
+    assert ingest.main(["build", "--no-broadcast"]) == 0
+    assert broadcasts == []
+    assert ingest.main(["verify"]) == 0
+
+    assert ingest.main(["build"]) == 0
+    assert broadcasts == [1]
@@ -0,0 +1,32 @@
+from api.utils.keywords_normalizer import KeywordsNormalizer
+
+
+def test_multi_word_phrases_use_longest_match():
+    normalizer = KeywordsNormalizer()
+
+    assert normalizer.normalize_message("Magkano po ang wedding coverage?") == "how much ang wedding coverage"
+    assert normalizer.normalize_message("how to book po sa inyo") == "booking process sa inyo"
+    assert normalizer.normalize_message("pa reserve po ng date") == "book ng date"
+
+
+def test_fillers_are_dropped_without_extra_spaces():
+    normalizer = KeywordsNormalizer()
+
+    assert normalizer.normalize_message("po po po") == ""
+    assert normalizer.normalize_message("may slot pa po") == "available pa"
+
+
+def test_replacements_are_not_normalized_again():
+    normalizer = KeywordsNormalizer()
+    normalizer.set_glossary({"tga": "taga", "taga": "from"})
+
+    assert normalizer.normalize_message("tga caloocan") == "taga caloocan"
+    assert normalizer.normalize_message("taga caloocan") == "from caloocan"
+
+
+def test_partial_phrase_falls_back_to_single_words():
+    normalizer = KeywordsNormalizer()
+    normalizer.set_glossary({"how to book": "booking process", "hm": "how much"})
+
+    assert normalizer.normalize_message("how to pay hm") == "how to pay how much"
+    assert normalizer.normalize_message("how to") == "how to"
@@ -0,0 +1,58 @@
+import dataclasses
+import json
+
+import pytest
+
+from api.scripts.knowledge_catalog import (
+    ACTIONS_FILE, DOCS_DIR, FOLLOW_UPS_FILE, QA_FILE, ActionRecord, KnowledgeCatalog, catalog
+)
+
+
+def write_docs(docs_dir):
+    actions = [
+        {"id": "services-page", "intent": ["services"], "title": "Services", "url": "/services",
+         "description": "All services", "category": "Services", "priority": 10, "button_text": "View Services"},
+        {"id": "broken-page", "title": "No url"},
+    ]
+    (docs_dir / ACTIONS_FILE).write_text(json.dumps(actions), encoding="utf-8")
+    (docs_dir / QA_FILE).write_text(
+        "\n".join([
+            json.dumps({"id": "qa-price", "category": "pricing", "primary_question": "How much?",
+                        "variants": ["hm"], "answer": "See services", "action_id": "services-page"}),
+            "{not json",
+            "",
+            json.dumps({"primary_question": "no id"}),
+            json.dumps({"id": "qa-book", "category": "Booking", "variants": "not a list"}),
+        ]),
+        encoding="utf-8"
+    )
+    follow_ups = {"qa-price": {"tags": ["price"], "suggestions": [{"text": "Book", "qa_id": "qa-book"}]}}
+    (docs_dir / FOLLOW_UPS_FILE).write_text(json.dumps(follow_ups), encoding="utf-8")
+
+
+def test_load_skips_invalid_entries(tmp_path):
+    write_docs(tmp_path)
+    loaded = KnowledgeCatalog.load(tmp_path)
+
+    assert list(loaded.actions) == ["services-page"]
+    assert list(loaded.qa_entries) == ["qa-price"]
+    assert loaded.qa("qa-price").questions == ("How much?", "hm")
+    assert loaded.action(loaded.qa("qa-price").action_id).to_link() == {
+        "id": "services-page", "title": "Services", "url": "/services", "button_text": "View Services"
+    }
+    assert loaded.qa_by_category == {"pricing": (loaded.qa("qa-price"),)}
+    assert loaded.follow_ups["qa-price"].suggestions[0].to_dict() == {"text": "Book", "qa_id": "qa-book"}
+
+
+def test_missing_files_give_an_empty_catalog(tmp_path):
+    empty = KnowledgeCatalog.load(tmp_path)
+    assert empty.stats() == {"actions": 0, "qa_entries": 0, "follow_ups": 0, "qa_categories": 0}
+
+
+def test_records_are_immutable_and_round_trip():
+    action = next(iter(catalog.actions.values()))
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        action.title = "changed"
+
+    for raw in json.loads((DOCS_DIR / ACTIONS_FILE).read_text(encoding="utf-8")):
+        assert ActionRecord.from_dict(raw).to_dict() == raw
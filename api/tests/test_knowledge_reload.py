@@ -0,0 +1,182 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis
+
+from api.scripts.knowledge_catalog import ActionRecord, FollowUpRecord, KnowledgeCatalog, QARecord, Suggestion
+from api.services import knowledge_reload
+from api.services.chatbot_service import RELEASE_LOCK_SCRIPT
+from api.services.knowledge_reload import RELOAD_LOCK_KEY, KnowledgeReloader
+
+QA = QARecord(id="qa-price", primary_question="How much?", answer="See services", action_id="services-page")
+SERVICES = ActionRecord(id="services-page", title="Services", url="/services", button_text="Services")
+FOLLOW_UP = FollowUpRecord(qa_id="qa-price", tags=("price",), suggestions=(Suggestion(text="Book", qa_id="qa-book"),))
+
+
+def make_reloader(new_catalog, indexed_before, indexed_after):
+    service = MagicMock()
+    service.invalidate_dependencies = AsyncMock(return_value=2)
+    service.redis_client = AsyncMock()
+    with patch.object(knowledge_reload, "indexed_chunk_ids", return_value=indexed_before):
+        reloader = KnowledgeReloader(service)
+
+    patches = [
+        patch.object(knowledge_reload, "catalog", KnowledgeCatalog([SERVICES], [QA], [FOLLOW_UP])),
+        patch.object(knowledge_reload.KnowledgeCatalog, "load", return_value=new_catalog),
+        patch.object(knowledge_reload, "indexed_chunk_ids", return_value=indexed_after),
+        patch.object(knowledge_reload, "open_search_index"),
+        patch.object(knowledge_reload.chatbot, "set_search_index"),
+        patch.object(knowledge_reload, "follow_up_message"),
+        patch.object(knowledge_reload, "qa_matcher"),
+        patch.object(knowledge_reload, "kw_norm"),
+    ]
+    return reloader, service, patches
+
+
+def test_reload_swaps_catalog_and_invalidates_only_changed_items():
+    renamed = ActionRecord(id="services-page", title="Our Services", url="/services", button_text="Services")
+    new_catalog = KnowledgeCatalog([renamed], [QA], [FOLLOW_UP])
+    reloader, service, patches = make_reloader(new_catalog, {"c1", "c2"}, {"c2", "c3"})
+
+    for p in patches:
+        p.start()
+    try:
+        summary = asyncio.run(reloader.reload(rebuild_index=False))
+        assert knowledge_reload.catalog.action("services-page").title == "Our Services"
+        # opened in a thread, swapped in on the event loop next to the catalog
+        knowledge_reload.chatbot.set_search_index.assert_called_once_with(
+            knowledge_reload.open_search_index.return_value
+        )
+        knowledge_reload.qa_matcher.index.assert_called_once()
+        knowledge_reload.follow_up_message.build_tag_index.assert_called_once()
+    finally:
+        for p in reversed(patches):
+            p.stop()
+
+    service.invalidate_dependencies.assert_awaited_once_with({"chunk:c1", "action:services-page"})
+    assert summary["status"] == "reloaded"
+    assert summary["changed"] == {"actions": 1, "qa_entries": 0, "follow_ups": 0}
+    assert reloader.indexed_chunks == {"c2", "c3"}
+    service.redis_client.publish.assert_not_awaited()
+
+
+def test_follow_up_changes_invalidate_keyword_suggestions_too():
+    changed = FollowUpRecord(qa_id="qa-price", tags=("price", "rates"), suggestions=FOLLOW_UP.suggestions)
+    reloader, service, patches = make_reloader(KnowledgeCatalog([SERVICES], [QA], [changed]), {"c1"}, {"c1"})
+
+    for p in patches:
+        p.start()
+    try:
+        asyncio.run(reloader.reload(rebuild_index=False))
+    finally:
+        for p in reversed(patches):
+            p.stop()
+
+    service.invalidate_dependencies.assert_awaited_once_with({"follow_up:qa-price", "follow_up:keywords"})
+
+
+def test_rebuild_is_skipped_while_another_worker_holds_the_lock():
+    reloader, service, patches = make_reloader(KnowledgeCatalog(), {"c1"}, {"c1"})
+    service.redis_client.set.return_value = None
+
+    with patch.object(knowledge_reload, "rebuild_indexes") as rebuild:
+        for p in patches:
+            p.start()
+        try:
+            summary = asyncio.run(reloader.reload(rebuild_index=True))
+        finally:
+            for p in reversed(patches):
+                p.stop()
+
+    rebuild.assert_not_called()
+    service.invalidate_dependencies.assert_not_awaited()
+    assert summary["status"] == "skipped"
+
+
+def test_without_redis_rebuilds_take_the_index_file_lock(tmp_path):
+    reloader, service, patches = make_reloader(KnowledgeCatalog([SERVICES], [QA], [FOLLOW_UP]), {"c1"}, {"c1"})
+    service.redis_client.set.side_effect = redis.ConnectionError("down")
+    lock_file = tmp_path / "rebuild.lock"
+
+    def run_reload():
+        for p in patches:
+            p.start()
+        try:
+            return asyncio.run(reloader.reload(rebuild_index=True))
+        finally:
+            for p in reversed(patches):
+                p.stop()
+
+    with patch.object(knowledge_reload, "REBUILD_LOCK_FILE", lock_file), \
+            patch.object(knowledge_reload, "rebuild_indexes", return_value={"added": 0}) as rebuild:
+        # another worker of this host is rebuilding
+        held = knowledge_reload.try_file_lock(lock_file)
+        try:
+            assert run_reload()["status"] == "skipped"
+        finally:
+            held.close()
+        rebuild.assert_not_called()
+
+        assert run_reload()["status"] == "reloaded"
+        rebuild.assert_called_once()
+
+    # released once the rebuild is done
+    knowledge_reload.try_file_lock(lock_file).close()
+
+
+def test_rebuild_uses_the_staged_glossary_and_releases_only_its_lock():
+    reloader, service, patches = make_reloader(KnowledgeCatalog([SERVICES], [QA], [FOLLOW_UP]), {"c1"}, {"c1"})
+    service.redis_client.set.return_value = True
+
+    with patch.object(knowledge_reload, "rebuild_indexes", return_value={"added": 0}) as rebuild:
+        for p in patches:
+            p.start()
+        try:
+            summary = asyncio.run(reloader.reload(rebuild_index=True))
+            live_glossary = knowledge_reload.kw_norm
+        finally:
+            for p in reversed(patches):
+                p.stop()
+
+    new_catalog, docs_dir, normalizer = rebuild.call_args.args
+    assert docs_dir == reloader.docs_dir
+    live_glossary.set_glossary.assert_not_called()
+    live_glossary.replace.assert_called_once_with(normalizer)
+    token = service.redis_client.set.await_args.args[1]
+    service.redis_client.eval.assert_awaited_once_with(RELEASE_LOCK_SCRIPT, 1, RELOAD_LOCK_KEY, token)
+    service.redis_client.delete.assert_not_awaited()
+    assert summary["status"] == "reloaded"
+
+
+def test_failed_rebuild_keeps_the_live_glossary():
+    reloader, service, patches = make_reloader(KnowledgeCatalog(), {"c1"}, {"c1"})
+    service.redis_client.set.return_value = True
+
+    with patch.object(knowledge_reload, "rebuild_indexes", side_effect=RuntimeError("embedding quota")):
+        for p in patches:
+            p.start()
+        try:
+            with pytest.raises(RuntimeError):
+                asyncio.run(reloader.reload(rebuild_index=True))
+            live_glossary = knowledge_reload.kw_norm
+        finally:
+            for p in reversed(patches):
+                p.stop()
+
+    live_glossary.replace.assert_not_called()
+    live_glossary.set_glossary.assert_not_called()
+    service.invalidate_dependencies.assert_not_awaited()
+
+
+def test_service_deletes_dependent_answers_everywhere(make_service):
+    service = make_service()
+    service.redis_client.sunion.return_value = {b"faq:how much wedding"}
+    service.response_cache.set("faq:how much wedding", ("old answer", [], []))
+
+    deleted = asyncio.run(service.invalidate_dependencies({"chunk:c1"}))
+
+    assert deleted == 1
+    service.redis_client.delete.assert_awaited_once_with("faq:how much wedding", "faq:deps:chunk:c1")
+    service.redis_client.publish.assert_awaited_once_with("faq:invalidate", "faq:how much wedding")
+    assert service.response_cache.get("faq:how much wedding") is None
@@ -0,0 +1,65 @@
+from langchain_core.documents import Document
+
+from api.scripts.knowledge_catalog import ActionRecord, QARecord
+from api.scripts.lexical_index import HybridSearchIndex, LexicalIndex
+from api.utils.keywords_normalizer import kw_norm
+
+QA_RECORDS = [
+    QARecord(id="qa-wedding", primary_question="How much is the wedding coverage?",
+             variants=("how much po sa wedding",), tags=("wedding price",)),
+    QARecord(id="qa-booking", primary_question="How do I book?",
+             variants=("pano magbook",), tags=("how to book",)),
+]
+ACTION_RECORDS = [
+    ActionRecord(id="services-page", title="Services", url="/services", button_text="Services",
+                 intent=("services", "coverage")),
+]
+
+
+def make_doc(chunk_id, **metadata):
+    return Document(page_content=chunk_id, metadata={"chunk_id": chunk_id, **metadata})
+
+
+DOCS = [
+    make_doc("c-wedding", type="qa", qa_id="qa-wedding"),
+    make_doc("c-booking", type="qa", qa_id="qa-booking"),
+    make_doc("c-services", type="action", action_id="services-page"),
+    make_doc("c-about", type="knowledge", **{"Header 2": "Company Overview"}),
+]
+
+
+def test_bm25_matches_shorthand_queries(tmp_path):
+    index = LexicalIndex.build(DOCS, QA_RECORDS, ACTION_RECORDS)
+    index.save(tmp_path / "lexical.json")
+    index = LexicalIndex.load(tmp_path / "lexical.json")
+
+    # queries arrive normalized by the chat flow
+    assert index.search(kw_norm.normalize_message("hm wedding"))[0][0] == "c-wedding"
+    assert index.search(kw_norm.normalize_message("pano magbook"))[0][0] == "c-booking"
+    assert index.search("company")[0][0] == "c-about"
+    assert index.search(kw_norm.normalize_message("hm wedding"), filter={"type": "action"}) == []
+
+
+def test_weighted_fusion_boosts_lexical_hits():
+    hybrid = HybridSearchIndex(dense=None, lexical=LexicalIndex.build(DOCS, QA_RECORDS, ACTION_RECORDS))
+    dense = [(DOCS[2], 0.5), (DOCS[3], 0.8)]
+    lexical = [("c-wedding", 4.0), ("c-services", 2.0)]
+
+    fused = hybrid.fuse(dense, lexical, k=3)
+
+    # c-wedding was only found lexically: farthest dense distance minus the full bonus
+    assert [(doc.metadata["chunk_id"], round(score, 2)) for doc, score in fused] == [
+        ("c-services", 0.35), ("c-wedding", 0.5), ("c-about", 0.8)
+    ]
+
+
+def test_rrf_fusion_keeps_dense_distances():
+    hybrid = HybridSearchIndex(
+        dense=None, lexical=LexicalIndex.build(DOCS, QA_RECORDS, ACTION_RECORDS), fusion="rrf"
+    )
+    dense = [(DOCS[3], 0.4), (DOCS[2], 0.6)]
+    lexical = [("c-services", 3.0)]
+
+    fused = hybrid.fuse(dense, lexical, k=2)
+
+    assert [(doc.metadata["chunk_id"], score) for doc, score in fused] == [("c-services", 0.6), ("c-about", 0.4)]
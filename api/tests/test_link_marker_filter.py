@@ -0,0 +1,44 @@
+import random
+import re
+
+from api.utils.link_marker_filter import LinkMarkerFilter
+
+ANSWERS = [
+    "  Our wedding coverage starts at P32,231. [LINK:services-page]\n",
+    "Book here [LINK:booking-form] or message us [LINK:facebook-main]",
+    "[LINK:services-page] Packages [are] listed [LINK on the page.",
+    "Unclosed marker at the end [LINK:services",
+    "An empty marker [LINK:] stays, a nested [LINK:a[LINK:b] does not.   ",
+]
+
+
+def stream(answer: str, sizes: list[int]) -> str:
+    link_filter = LinkMarkerFilter()
+    out = []
+    position = 0
+    for size in sizes:
+        out.append(link_filter.feed(answer[position:position + size]))
+        position += size
+    out.append(link_filter.feed(answer[position:]))
+    out.append(link_filter.flush())
+    return "".join(out)
+
+
+def test_streamed_output_matches_full_cleanup():
+    rng = random.Random(7)
+    for answer in ANSWERS:
+        expected = re.sub(r'\[LINK:[^\]]+\]', '', answer).strip()
+        assert stream(answer, [1] * len(answer)) == expected
+        for _ in range(50):
+            sizes = [rng.randint(1, 6) for _ in range(len(answer) // 3)]
+            assert stream(answer, sizes) == expected
+
+
+def test_marker_is_held_until_closed():
+    link_filter = LinkMarkerFilter()
+
+    assert link_filter.feed("Visit us ") == "Visit us"
+    assert link_filter.feed("[LI") == ""
+    assert link_filter.feed("NK:map") == ""
+    assert link_filter.feed("] today") == "  today"
+    assert link_filter.flush() == ""
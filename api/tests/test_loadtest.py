@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import os
+from collections import OrderedDict
+from unittest.mock import patch
+
+import numpy as np
+
+from api.loadtest.fakes import FakeEmbeddings, FakeGroq, InMemoryRedis
+from api.loadtest.run import FORCED_SETTINGS, percentile, run
+from api.loadtest.workload import QueryMix, build_pools
+from api.scripts.knowledge_catalog import catalog
+from api.services.chatbot_service import RELEASE_LOCK_SCRIPT, REGISTER_DEPENDENCIES_SCRIPT
+
+
+def test_in_memory_redis_covers_the_app_commands():
+    async def scenario():
+        redis = InMemoryRedis()
+        assert await redis.set("lock", "token", nx=True, px=50)
+        assert await redis.set("lock", "other", nx=True, px=50) is None
+        assert await redis.eval(RELEASE_LOCK_SCRIPT, 1, "lock", "other") == 0
+        assert await redis.eval(RELEASE_LOCK_SCRIPT, 1, "lock", "token") == 1
+
+        await redis.setex(name="answer", time=0.05, value='{"message": "hi"}')
+        assert await redis.get("answer") == b'{"message": "hi"}'
+        await asyncio.sleep(0.06)
+        assert await redis.exists("answer") == 0
+
+        await redis.eval(REGISTER_DEPENDENCIES_SCRIPT, 2, "deps:a", "deps:b", "answer", 60)
+        assert await redis.sunion(["deps:a", "deps:b"]) == {b"answer"}
+
+        pipe = redis.pipeline()
+        pipe.incr("likes")
+        pipe.expire("likes", 60)
+        pipe.get("likes")
+        assert await pipe.execute() == [1, True, b"1"]
+        return redis
+
+    redis = asyncio.run(scenario())
+    assert redis.stats()["commands"] == 12
+
+
+def test_in_memory_redis_pubsub_holds_a_connection():
+    async def scenario():
+        redis = InMemoryRedis(max_connections=2)
+        pubsub = redis.pubsub()
+        await pubsub.subscribe("faq:invalidate")
+        assert redis.in_use == 1
+
+        assert await redis.publish("faq:invalidate", "key") == 1
+        messages = pubsub.listen()
+        assert (await anext(messages))["type"] == "subscribe"
+        assert (await anext(messages))["data"] == b"key"
+
+        # one slot left: concurrent commands queue for it
+        await asyncio.gather(*(redis.get("key") for _ in range(3)))
+        assert redis.stats()["connection_waits"] == 2
+        await pubsub.aclose()
+        assert redis.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_fake_groq_streams_the_context_and_echoes_rephrases():
+    async def collect(messages):
+        stream = await FakeGroq(ttft=0, tokens_per_second=0, answer_tokens=3).create(messages=messages)
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(collect([{"role": "user", "content": "CONTEXT:\nOpen daily from nine\n\nQUESTION:\nhours"}]))
+    assert "".join(chunk.choices[0].delta.content or "" for chunk in chunks) == "Open daily from"
+    assert chunks[-1].x_groq.usage.completion_tokens == 3
+
+    chunks = asyncio.run(collect([{"role": "user", "content": "ORIGINAL MESSAGE:\nhm wedding"}]))
+    assert "".join(chunk.choices[0].delta.content or "" for chunk in chunks) == "hm wedding"
+
+
+def test_fake_embeddings_are_deterministic_and_topical():
+    vectors = np.eye(3, dtype=np.float32)
+    embeddings = FakeEmbeddings(
+        ["wedding photo coverage packages", "studio location caloocan", "payment downpayment installment"],
+        vectors,
+        noise=0.01,
+        min_score=1.0
+    )
+
+    wedding = embeddings.embed_query("how much is wedding coverage")
+    assert wedding == embeddings.embed_query("how much is wedding coverage")
+    assert int(np.argmax(wedding)) == 0
+    assert np.linalg.norm(np.array(embeddings.embed_query("capital of france")) - vectors, axis=1).min() > 0.1
+
+
+def test_query_mix_is_seeded():
+    pools = build_pools(catalog)
+    first = [QueryMix(pools, seed=3).next() for _ in range(20)]
+    assert first == [QueryMix(pools, seed=3).next() for _ in range(20)]
+    assert set(pools) >= {"qa_question", "paraphrase", "off_topic"}
+    assert percentile([0.1, 0.2, 0.3, 0.4], 50) == 0.2
+    assert percentile([0.1, 0.2, 0.3, 0.4], 99) == 0.4
+
+
+def test_smoke_run_against_the_app(tmp_path, temp_index):
+    from api.config.settings import settings
+    from api.routes.chatbot_router import limiter
+    from api.scripts import chatbot
+    from api.scripts import vector_store as vs
+    from api.services.chatbot_service import chatbot_service
+
+    # a small index of the fakes' own, whatever api/chroma_db holds or MODEL_NAME says
+    docs_dir = tmp_path / "documents"
+    docs_dir.mkdir()
+    (docs_dir / "studio.md").write_text(
+        "# Studio\n## Office hours\nWe are open Monday to Saturday, 9am to 6pm.\n"
+        "## Wedding packages\nWedding coverage starts at 35,000 with a same day edit.\n",
+        encoding="utf-8"
+    )
+    build_embeddings = FakeEmbeddings.for_documents(
+        [doc.page_content for doc in vs.load_all_documents(catalog, docs_dir)], noise=0.0
+    )
+
+    args = argparse.Namespace(
+        duration=10.0, requests=12, concurrency=4, rate=None, warmup=0, stream=False,
+        transport="asgi", timeout=10.0, mix=None, queries=None, seed=0,
+        llm_ttft=0.0, llm_tps=0.0, llm_answer_tokens=10, llm_error_rate=0.0,
+        embed_latency=0.0, embed_noise=0.15, redis_latency=0.0, redis_connections=8
+    )
+    # the run swaps the app's clients and settings for the fakes', put them back afterwards
+    with patch.dict(os.environ), \
+            patch.multiple(settings, **FORCED_SETTINGS), \
+            patch.object(vs.embedding_model, "embeddings", build_embeddings), \
+            patch.object(vs.embedding_model, "_db", vs.embedding_model._db), \
+            patch.object(vs.embedding_model, "_l1", OrderedDict()), \
+            patch.object(chatbot, "search_index", chatbot.search_index), \
+            patch.object(chatbot, "retriever", chatbot.retriever), \
+            patch.object(chatbot, "llm", chatbot.llm), \
+            patch.object(chatbot_service, "redis_client", chatbot_service.redis_client), \
+            patch.object(chatbot_service, "semantic_cache", None), \
+            patch.object(chatbot_service, "response_cache", None), \
+            patch.object(limiter, "enabled", limiter.enabled):
+        temp_index(vs.embedding_model)
+        assert vs.rebuild_indexes(catalog, docs_dir)["added"] > 0
+        chatbot.reload_search_index()
+
+        report = asyncio.run(run(args))
+
+    assert report["requests"] == 12
+    assert report["errors"] == 0
+    # retrieval over the temporary index passes the quality gate, answers get generated
+    assert report["fakes"]["llm"]["calls"] > report["fakes"]["llm"]["rephrases"]
+    assert report["saturation"]["redis"]["peak_connections"] <= 8
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from prometheus_client import REGISTRY
+
+from api.scripts import chatbot
+from api.utils import metrics
+from api.utils.keywords_normalizer import kw_norm
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_cache_hits_and_misses_are_counted(make_service):
+    message = "what are your office hours on sundays"
+    cache_key = kw_norm.normalize_cache_key(kw_norm.normalize_message(message))
+    cached = {cache_key: json.dumps({"message": "Closed", "actions": [], "message_suggestions": []})}
+    hits = sample("faqbot_cache_lookups_total", result="hit")
+    misses = sample("faqbot_cache_lookups_total", result="miss")
+    lookups = sample("faqbot_stage_seconds_count", stage="cache_lookup")
+
+    asyncio.run(make_service(cached, l1=False)._lookup_cached(message, cache_key))
+    asyncio.run(make_service(l1=False)._lookup_cached(message, cache_key))
+
+    assert sample("faqbot_cache_lookups_total", result="hit") == hits + 1
+    assert sample("faqbot_cache_lookups_total", result="miss") == misses + 1
+
+    asyncio.run(make_service(cached, l1=False).get_chat_response(message))
+    assert sample("faqbot_stage_seconds_count", stage="cache_lookup") == lookups + 1
+
+
+def fake_stream(*chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+    return stream()
+
+
+def content_chunk(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def test_stream_records_time_to_first_token_and_tokens():
+    usage_chunk = SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=None))],
+        x_groq=SimpleNamespace(usage=SimpleNamespace(completion_tokens=7))
+    )
+    first_tokens = sample("faqbot_llm_time_to_first_token_seconds_count", purpose="rephrase")
+    token_sum = sample("faqbot_llm_stream_tokens_sum", purpose="rephrase")
+
+    create = AsyncMock(return_value=fake_stream(content_chunk("studio "), content_chunk("location"), usage_chunk))
+    with patch.object(chatbot.llm.chat.completions, "create", create):
+        response = asyncio.run(chatbot.stream_response([], 0.3, purpose="rephrase"))
+
+    assert response == "studio location"
+    assert sample("faqbot_llm_time_to_first_token_seconds_count", purpose="rephrase") == first_tokens + 1
+    # the usage reported by Groq wins over the chunk count
+    assert sample("faqbot_llm_stream_tokens_sum", purpose="rephrase") == token_sum + 7
+
+
+def test_weak_retrieval_counts_a_rephrase_and_a_weak_generation():
+    rephrases = sample("faqbot_rephrases_total")
+    weak_retrievals = sample("faqbot_weak_retrievals_total")
+
+    weak = AsyncMock(return_value=[])
+    with patch.object(chatbot, "retrieve", weak), \
+            patch.object(chatbot, "llm_message_rephraser", AsyncMock(return_value="office hours")):
+        assert asyncio.run(chatbot.prepare_chat("what are your hrs?")) is not None
+
+    assert sample("faqbot_rephrases_total") == rephrases + 1
+    assert sample("faqbot_weak_retrievals_total") == weak_retrievals + 1
+
+
+def test_exposition_lists_the_stage_histograms():
+    with metrics.timed("normalize"):
+        pass
+
+    content, content_type = metrics.render()
+
+    assert content_type.startswith("text/plain")
+    assert b'faqbot_stage_seconds_bucket{le="0.0005",stage="normalize"}' in content
+
+
+def test_metrics_endpoint_needs_the_admin_key():
+    from fastapi.testclient import TestClient
+
+    from api.main import app, settings
+
+    client = TestClient(app)
+    with patch.object(settings, "METRICS_ENABLED", False), patch.object(settings, "ADMIN_SECRET_KEY", "s3cret"):
+        assert client.get("/metrics", headers={"admin-secret-key": "s3cret"}).status_code == 404
+
+    with patch.object(settings, "METRICS_ENABLED", True):
+        with patch.object(settings, "ADMIN_SECRET_KEY", None):
+            assert client.get("/metrics").status_code == 404
+        with patch.object(settings, "ADMIN_SECRET_KEY", "s3cret"):
+            assert client.get("/metrics").status_code == 401
+            assert client.get("/metrics", headers={"admin-secret-key": "wrong"}).status_code == 401
+            response = client.get("/metrics", headers={"admin-secret-key": "s3cret"})
+            assert response.status_code == 200
+            assert "faqbot_stage_seconds" in response.text
+            assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
@@ -32,9 +32,9 @@ def run_tests():
     print(f"Suggestions for 'wedding': {len(suggestions)}")
     if not suggestions:
         print("FAILED: No suggestions returned for 'wedding'")
-        print(f"Wedding pricing group in data: {'qa-wedding-pricing-hm' in follow_up.follow_up_questions_data}")
-        if 'qa-wedding-pricing-hm' in follow_up.follow_up_questions_data:
-            print(f"Tags: {follow_up.follow_up_questions_data['qa-wedding-pricing-hm'].get('tags')}")
+        print(f"Wedding pricing group in data: {'qa-wedding-pricing-hm' in follow_up.catalog.follow_ups}")
+        if 'qa-wedding-pricing-hm' in follow_up.catalog.follow_ups:
+            print(f"Tags: {follow_up.catalog.follow_ups['qa-wedding-pricing-hm'].tags}")
     
     assert len(suggestions) > 0
     assert "wedding portfolio" in suggestions[0]["text"].lower()
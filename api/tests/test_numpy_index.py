@@ -0,0 +1,78 @@
+import json
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+import pytest
+
+from api.scripts.numpy_index import RECORDS_FILE, NumpyVectorIndex, current_version_dir
+
+
+class LetterEmbeddings(Embeddings):
+    """Deterministic vectors from letter counts"""
+    def embed_query(self, text):
+        return [float(text.count(c)) for c in "aeiourst"]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+TEXTS = ["wedding price", "studio rates", "office location", "booking steps", "prenup shoot"]
+METADATAS = [
+    {"type": "qa", "doc_type": "faq"},
+    {"type": "action", "doc_type": "faq"},
+    {"type": "knowledge", "doc_type": "faq"},
+    {"type": "qa", "doc_type": "faq"},
+    {"type": "qa", "doc_type": "other"},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    embedding = LetterEmbeddings()
+    ids = [f"id-{i}" for i in range(len(TEXTS))]
+    NumpyVectorIndex.write(tmp_path, ids, embedding.embed_documents(TEXTS), TEXTS, METADATAS)
+    return NumpyVectorIndex.load(tmp_path, embedding)
+
+
+def test_scores_match_chroma(index, tmp_path):
+    chroma = Chroma(
+        collection_name="numpy_parity",
+        embedding_function=LetterEmbeddings(),
+        persist_directory=str(tmp_path / "chroma")
+    )
+    chroma.add_texts(TEXTS, metadatas=METADATAS, ids=index.ids)
+
+    expected = {doc.page_content: score for doc, score in chroma.similarity_search_with_score("wedding rates", k=5)}
+    actual = index.similarity_search_with_score("wedding rates", k=5)
+
+    assert [score for _, score in actual] == sorted(score for _, score in actual)
+    assert {doc.page_content: score for doc, score in actual} == pytest.approx(expected, rel=1e-4)
+
+
+def test_metadata_filters(index):
+    results = index.similarity_search_with_score(
+        "wedding", k=5, filter={"$and": [{"type": "qa"}, {"doc_type": "faq"}]}
+    )
+    assert {doc.page_content for doc, _ in results} == {"wedding price", "booking steps"}
+
+    results = index.similarity_search("wedding", k=5, filter={"type": {"$in": ["action", "knowledge"]}})
+    assert {doc.page_content for doc in results} == {"studio rates", "office location"}
+
+
+def test_rewrites_swap_embeddings_and_records_together(tmp_path):
+    embedding = LetterEmbeddings()
+    for count in (5, 3, 4):
+        ids = [f"id-{i}" for i in range(count)]
+        NumpyVectorIndex.write(tmp_path, ids, embedding.embed_documents(TEXTS[:count]), TEXTS[:count], METADATAS[:count])
+
+    reopened = NumpyVectorIndex.load(tmp_path, embedding)
+    assert reopened.ids == [f"id-{i}" for i in range(4)]
+    assert reopened.matrix.shape[0] == 4
+    # the current version and the previous one are kept
+    assert len([path for path in tmp_path.iterdir() if path.is_dir()]) == 2
+
+    # embeddings and records of different writes are refused, not mixed
+    version_dir = current_version_dir(tmp_path)
+    (version_dir / RECORDS_FILE).write_text(json.dumps({"ids": ["x"], "documents": ["x"], "metadatas": [{}]}))
+    with pytest.raises(ValueError):
+        NumpyVectorIndex.load(tmp_path, embedding)
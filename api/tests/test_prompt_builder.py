@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from api.scripts.prompt_builder import PromptBuilder, estimate_tokens
+
+
+def doc(text: str, doc_type: str = "knowledge") -> Document:
+    return Document(page_content=text, metadata={"type": doc_type})
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("How much?") == 3
+    # long words count as several pieces
+    assert estimate_tokens("photography") == 3
+
+
+def test_context_order_and_sections():
+    builder = PromptBuilder(system_prompt="Be brief.", token_budget=1000)
+    prompt = builder.build("hours?", [
+        doc("We are open daily from 9 to 5."),
+        doc("Question: hours? Answer: 9 to 5.", "qa"),
+        doc("[LINK:contact-page] Contact page", "action"),
+    ])
+
+    user = prompt.messages[1]["content"]
+    assert prompt.messages[0] == {"role": "system", "content": "Be brief."}
+    assert user.index("We are open daily") < user.index("PRE-DEFINED Q&A") < user.index("YOU CAN VIEW THE PAGE")
+    assert user.endswith("QUESTION:\nhours?")
+    assert prompt.token_counts["total"] == sum(
+        prompt.token_counts[part] for part in ("system", "context", "question")
+    )
+
+
+def test_near_duplicates_are_dropped():
+    builder = PromptBuilder(system_prompt="Be brief.", token_budget=1000)
+    prompt = builder.build("hours?", [
+        doc("We are open daily from 9 AM to 5 PM at our studio."),
+        doc("We are open daily from 9 AM to 5 PM at our studio!"),
+        doc("Wedding coverage starts at P32,231."),
+    ])
+
+    assert [d.page_content for d in prompt.knowledge_docs] == [
+        "We are open daily from 9 AM to 5 PM at our studio.",
+        "Wedding coverage starts at P32,231."
+    ]
+    assert prompt.dropped_docs == 1
+
+
+def test_budget_keeps_best_ranked_context():
+    chunk = " ".join(["word"] * 50)
+    builder = PromptBuilder(system_prompt="Be brief.", token_budget=170)
+    prompt = builder.build("hours?", [
+        doc(f"qa {chunk}", "qa"),
+        doc(f"first {chunk} alpha"),
+        doc(f"second {chunk} beta gamma delta epsilon zeta eta theta iota kappa lambda mu"),
+        doc("short tail chunk"),
+    ])
+
+    assert [d.page_content.split()[0] for d in prompt.qa_docs] == ["qa"]
+    # the second long chunk no longer fits, a later short one still does
+    assert [d.page_content.split()[0] for d in prompt.knowledge_docs] == ["first", "short"]
+    assert prompt.token_counts["total"] <= 170
+    assert builder.stats()["dropped_docs"] == 1
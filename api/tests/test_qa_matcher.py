@@ -0,0 +1,73 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from api.config.settings import settings
+from api.scripts.follow_up_message import follow_up_message
+from api.scripts.knowledge_catalog import QARecord, catalog
+from api.scripts.qa_matcher import QAMatcher, bounded_edit_distance, qa_matcher, question_key
+from api.utils.keywords_normalizer import kw_norm
+
+QA_ENTRIES = [
+    QARecord(id="qa-wedding", primary_question="How much is the wedding coverage?",
+             variants=("how much wedding package", "price ng wedding coverage")),
+    QARecord(id="qa-debut", primary_question="How much is the debut coverage?", variants=("how much debut",)),
+    QARecord(id="qa-general", primary_question="How much is the coverage?", variants=("price",)),
+]
+
+
+def test_bounded_edit_distance():
+    assert bounded_edit_distance("wedding", "weding", 2) == 1
+    assert bounded_edit_distance("kitten", "sitting", 3) == 3
+    assert bounded_edit_distance("kitten", "sitting", 2) == 3
+    assert bounded_edit_distance("abc", "abcdef", 2) == 3
+
+
+def test_exact_and_near_matches():
+    matcher = QAMatcher(QA_ENTRIES)
+
+    assert matcher.match("How much is the wedding coverage") == "qa-wedding"
+    assert matcher.match("magkano wedding package?") == "qa-wedding"
+    assert matcher.match("how much weding package") == "qa-wedding"
+    assert matcher.match("Price!") == "qa-general"
+
+
+def test_short_or_ambiguous_messages_fall_through():
+    matcher = QAMatcher(QA_ENTRIES)
+
+    assert matcher.match("prices") is None
+    assert matcher.match("how much is the wedding venue") is None
+    # a message equally close to two different entries is not a confident match
+    ambiguous = QAMatcher([
+        QARecord(id="a", primary_question="how much photos"),
+        QARecord(id="b", primary_question="how much photon"),
+    ])
+    assert ambiguous.match("how much photoss") == "a"
+    assert ambiguous.match("how much photox") is None
+
+
+def test_questions_shared_by_several_entries_are_excluded():
+    matcher = QAMatcher([
+        QARecord(id="qa-wedding", primary_question="wedding coverage", variants=("how much prenup",)),
+        QARecord(id="qa-prenup", primary_question="prenup coverage", variants=("how much prenup",)),
+    ])
+    assert matcher.match("how much prenup") is None
+    assert matcher.match("prenup coverage") == "qa-prenup"
+
+
+def test_dataset_questions_match_once_normalized():
+    # the chat flow hands over messages kw_norm already normalized, a second pass changes them
+    for qa in catalog.qa_entries.values():
+        for question in qa.questions:
+            normalized = kw_norm.normalize_message(question)
+            if question_key(normalized) in qa_matcher.exact:
+                assert qa_matcher.match_normalized(normalized) == qa.id, question
+
+
+def test_dataset_variant_takes_the_fast_path_through_the_service(make_service):
+    service = make_service()
+    service._lookup_cached = AsyncMock(side_effect=AssertionError("went past the fast path"))
+
+    with patch.object(settings, "QA_FAST_PATH_ENABLED", True):
+        response = asyncio.run(service.get_chat_response("pano magbook"))
+
+    assert response == follow_up_message.follow_up_message_orchestrator(qa_id="qa-booking-process")
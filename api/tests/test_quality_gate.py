@@ -0,0 +1,81 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from langchain_core.documents import Document
+
+from api.scripts import chatbot as chatbot_module
+from api.scripts.chatbot import FALLBACK_MESSAGE, assess_retrieval, chatbot
+
+CLOSE = [(Document(page_content="Open daily", metadata={"type": "faq"}), 0.3)]
+FAR = [(Document(page_content="Unrelated", metadata={"type": "faq"}), 1.2)]
+
+
+def test_assess_retrieval_thresholds():
+    relevant, is_high_quality = assess_retrieval(CLOSE + FAR)
+    assert [doc.page_content for doc in relevant] == ["Open daily"]
+    assert not is_high_quality  # mean distance 0.75
+
+    assert assess_retrieval(CLOSE) == ([CLOSE[0][0]], True)
+    assert assess_retrieval([]) == ([], False)
+
+
+@patch.object(chatbot_module, 'stream_response', new_callable=AsyncMock)
+@patch.object(chatbot_module, 'llm_message_rephraser', new_callable=AsyncMock)
+def test_weak_retrieval_is_rephrased_before_generation(mock_rephraser, mock_stream):
+    mock_rephraser.return_value = "What are the office hours?"
+    mock_stream.return_value = "We are open daily."
+    search = AsyncMock(side_effect=[FAR, CLOSE])
+
+    with patch.object(chatbot_module.search_index, 'asimilarity_search_with_score', search):
+        response, _, _ = asyncio.run(chatbot("anong oras kayo open"))
+
+    assert response == "We are open daily."
+    # the rephrase is normalized like the user's messages before retrieval
+    assert search.await_args_list[1].args[0] == "what are the office hours"
+    mock_rephraser.assert_awaited_once()
+    mock_stream.assert_awaited_once()
+
+
+@patch.object(chatbot_module, 'stream_response', new_callable=AsyncMock)
+@patch.object(chatbot_module, 'llm_message_rephraser', new_callable=AsyncMock)
+def test_still_weak_after_rephrase_generates_once(mock_rephraser, mock_stream):
+    mock_rephraser.return_value = "something else entirely"
+    mock_stream.return_value = FALLBACK_MESSAGE
+    search = AsyncMock(return_value=FAR)
+
+    with patch.object(chatbot_module.search_index, 'asimilarity_search_with_score', search):
+        response, actions, _ = asyncio.run(chatbot("zzz zzz zzz"))
+
+    # the prompt's fallback rule answers, from one generation
+    assert response == FALLBACK_MESSAGE
+    assert actions[0]["id"] == "facebook-main"
+    mock_rephraser.assert_awaited_once()
+    mock_stream.assert_awaited_once()
+
+
+@patch.object(chatbot_module, 'stream_response', new_callable=AsyncMock)
+@patch.object(chatbot_module, 'llm_message_rephraser', new_callable=AsyncMock)
+def test_greetings_are_answered_without_a_rephrase(mock_rephraser, mock_stream):
+    mock_stream.return_value = "Hello! How can I help you today?"
+    search = AsyncMock(return_value=FAR)
+
+    with patch.object(chatbot_module.search_index, 'asimilarity_search_with_score', search):
+        response, _, _ = asyncio.run(chatbot("hello"))
+
+    assert response == "Hello! How can I help you today?"
+    mock_rephraser.assert_not_awaited()
+    search.assert_awaited_once()
+    mock_stream.assert_awaited_once()
+
+
+@patch.object(chatbot_module, 'llm_message_rephraser', new_callable=AsyncMock)
+def test_the_closer_retrieval_is_kept(mock_rephraser):
+    mock_rephraser.return_value = "unrelated words only"
+    search = AsyncMock(side_effect=[CLOSE + FAR, FAR])
+
+    with patch.object(chatbot_module.search_index, 'asimilarity_search_with_score', search):
+        messages, _, _, _ = asyncio.run(chatbot_module.prepare_chat("open on sundays"))
+
+    # the rephrase retrieved worse, the original question and its context are used
+    assert "open on sundays" in messages[-1]["content"]
+    assert "Open daily" in messages[-1]["content"]
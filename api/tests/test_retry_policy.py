@@ -0,0 +1,73 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from api.utils.retry_policy import (
+    EmptyResponseError,
+    LatencyBudgetExceeded,
+    RetryPolicy,
+    is_retryable
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_error_classification():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(EmptyResponseError())
+    assert is_retryable(httpx.ConnectError("refused"))
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(StatusError(401))
+    assert not is_retryable(ValueError("bad prompt"))
+    assert not is_retryable(LatencyBudgetExceeded())
+
+    # wrapped errors are classified by their cause
+    try:
+        try:
+            raise StatusError(502)
+        except StatusError as e:
+            raise RuntimeError("Error embedding content") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+
+
+def test_backoff_is_bounded_and_grows():
+    policy = RetryPolicy(base_delay=0.5, max_delay=1.5)
+    for _ in range(100):
+        assert 0 <= policy.backoff(1) <= 0.5
+        assert 0 <= policy.backoff(2) <= 1.0
+        assert 0 <= policy.backoff(5) <= 1.5
+
+
+def test_transient_errors_are_retried_permanent_ones_are_not():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+    flaky = AsyncMock(side_effect=[StatusError(429), TimeoutError(), "ok"])
+    assert asyncio.run(policy.run("generation", flaky)) == "ok"
+    assert flaky.await_count == 3
+    assert policy.stats()["generation_retries"] == 2
+
+    broken = AsyncMock(side_effect=StatusError(401))
+    with pytest.raises(StatusError):
+        asyncio.run(policy.run("generation", broken))
+    assert broken.await_count == 1
+
+
+def test_latency_budget_stops_retries():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.001)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    started = time.monotonic()
+    with pytest.raises(LatencyBudgetExceeded):
+        asyncio.run(policy.run("retrieval", slow, deadline=time.monotonic() + 0.05))
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,148 @@
+from langchain_core.embeddings import Embeddings
+import pytest
+
+from api.services.semantic_cache import SemanticCache
+
+
+class HashRedis:
+    """Just the hash commands SemanticCache uses"""
+    def __init__(self):
+        self.hashes = {}
+        self.full_reads = 0
+
+    async def hgetall(self, name):
+        self.full_reads += 1
+        return dict(self.hashes.get(name, {}))
+
+    async def hmget(self, name, keys):
+        return [self.hashes.get(name, {}).get(key.encode()) for key in keys]
+
+    async def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key.encode()] = value
+
+    async def hdel(self, name, *keys):
+        for key in keys:
+            self.hashes.get(name, {}).pop(key.encode(), None)
+
+    async def zadd(self, name, mapping):
+        self.hashes.setdefault(name, {}).update({key.encode(): score for key, score in mapping.items()})
+
+    async def zrange(self, name, start, end):
+        by_score = sorted(self.hashes.get(name, {}).items(), key=lambda item: item[1])
+        return [key for key, _ in by_score][start:None if end == -1 else end + 1]
+
+    async def zrangebyscore(self, name, low, high):
+        return [key for key in await self.zrange(name, 0, -1) if float(low) <= self.hashes[name][key] <= float(high)]
+
+    async def zrem(self, name, *keys):
+        await self.hdel(name, *keys)
+
+
+class TableEmbeddings(Embeddings):
+    VECTORS = {
+        "how much wedding": [1.0, 0.0, 0.0],
+        "wedding price how much": [0.98, 0.2, 0.0],
+        "where is your office": [0.0, 0.0, 1.0],
+        "what are your hours": [0.0, 1.0, 0.0],
+    }
+
+    def embed_query(self, text):
+        return self.VECTORS[text]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+@pytest.mark.asyncio
+async def test_paraphrase_hits_and_unrelated_misses():
+    cache = SemanticCache(HashRedis(), TableEmbeddings(), "model-a", threshold=0.95)
+    await cache.add("faq:how much wedding", "how much wedding")
+
+    assert (await cache.lookup("wedding price how much"))[0] == "faq:how much wedding"
+    assert await cache.lookup("where is your office") is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_index_is_shared_and_removable():
+    redis_client = HashRedis()
+    await SemanticCache(redis_client, TableEmbeddings(), "model-a").add("faq:how much wedding", "how much wedding")
+
+    other_worker = SemanticCache(redis_client, TableEmbeddings(), "model-a", threshold=0.95)
+    assert await other_worker.lookup("wedding price how much") is not None
+
+    await other_worker.remove("faq:how much wedding")
+    assert await other_worker.lookup("wedding price how much") is None
+    assert await redis_client.hgetall("faq:semantic:model-a") == {}
+
+
+@pytest.mark.asyncio
+async def test_full_index_evicts_the_oldest_entries():
+    redis_client = HashRedis()
+    cache = SemanticCache(redis_client, TableEmbeddings(), "model-a", threshold=0.95, max_entries=2)
+    await cache.add("faq:how much wedding", "how much wedding")
+    await cache.add("faq:where is your office", "where is your office")
+    await cache.add("faq:what are your hours", "what are your hours")
+
+    # evicted down to 90% of the cap, oldest first, then the new entry is indexed
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["evictions"] == 2
+    assert await cache.lookup("wedding price how much") is None
+    assert (await cache.lookup("what are your hours"))[0] == "faq:what are your hours"
+    assert set(await redis_client.hgetall("faq:semantic:model-a")) == {b"faq:what are your hours"}
+    assert await redis_client.zrange("faq:semantic:model-a:added", 0, -1) == [b"faq:what are your hours"]
+
+
+@pytest.mark.asyncio
+async def test_refreshes_only_fetch_entries_indexed_since_the_last_one():
+    redis_client = HashRedis()
+    worker = SemanticCache(redis_client, TableEmbeddings(), "model-a", threshold=0.95, refresh_interval=0)
+    other_worker = SemanticCache(redis_client, TableEmbeddings(), "model-a")
+
+    await other_worker.add("faq:how much wedding", "how much wedding")
+    assert await worker.lookup("wedding price how much") is not None
+    assert redis_client.full_reads == 1
+
+    await other_worker.add("faq:what are your hours", "what are your hours")
+    assert (await worker.lookup("what are your hours"))[0] == "faq:what are your hours"
+    assert await worker.lookup("wedding price how much") is not None
+    assert worker.stats()["entries"] == 2
+    assert redis_client.full_reads == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidations_drop_entries_and_force_a_full_reload():
+    redis_client = HashRedis()
+    worker = SemanticCache(redis_client, TableEmbeddings(), "model-a", threshold=0.95, refresh_interval=0)
+    other_worker = SemanticCache(redis_client, TableEmbeddings(), "model-a")
+    await other_worker.add("faq:how much wedding", "how much wedding")
+    await other_worker.add("faq:where is your office", "where is your office")
+    assert await worker.lookup("wedding price how much") is not None
+
+    # removed elsewhere: an incremental refresh can't see it, the invalidation message can
+    await other_worker.remove("faq:how much wedding")
+    worker.forget("faq:how much wedding")
+    assert await worker.lookup("wedding price how much") is None
+    assert worker.stats()["evictions"] == 0
+    assert redis_client.full_reads == 1
+
+    await other_worker.remove("faq:where is your office")
+    worker.mark_stale()
+    assert await worker.lookup("where is your office") is None
+    assert worker.stats()["entries"] == 0
+    assert redis_client.full_reads == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_messages_reach_the_semantic_mirror(make_service):
+    redis_client = HashRedis()
+    service = make_service()
+    service.semantic_cache = SemanticCache(redis_client, TableEmbeddings(), "model-a", refresh_interval=0)
+    await service.semantic_cache.add("faq:how much wedding", "how much wedding")
+
+    service._invalidate_local("faq:how much wedding")
+    assert service.semantic_cache.stats()["entries"] == 0
+
+    service._invalidate_local(None)
+    await service.semantic_cache.lookup("how much wedding")
+    assert redis_client.full_reads == 1
@@ -0,0 +1,91 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from api.services.chatbot_service import ChatbotService
+from api.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert calls == 1
+    assert results == [1] * 5
+    assert flight.stats() == {"leaders": 1, "followers": 4, "in_flight": 0}
+
+
+def test_errors_reach_followers_and_key_is_released():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        # the failed flight is forgotten, the next caller computes again
+        return results, await flight.do("key", AsyncMock(return_value="ok"))
+
+    results, retried = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "ok"
+
+
+def test_cancelled_leader_hands_over_to_follower():
+    async def run():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("key", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", AsyncMock(return_value="follower")))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "follower"
+
+
+@patch('api.services.chatbot_service.chatbot', new_callable=AsyncMock)
+def test_service_coalesces_identical_misses(mock_chatbot, make_service):
+    async def slow_chatbot(message, to_rephrase=False, deadline=None):
+        await asyncio.sleep(0.01)
+        return "Open daily", [], None
+    mock_chatbot.side_effect = slow_chatbot
+
+    service = make_service()
+
+    async def run():
+        return await asyncio.gather(*(
+            service.get_chat_response("what are your office hours today") for _ in range(4)
+        ))
+
+    results = asyncio.run(run())
+    assert mock_chatbot.await_count == 1
+    assert [message for message, _, _ in results] == ["Open daily"] * 4
+    service.redis_client.setex.assert_awaited_once()
+
+
+def test_lock_held_by_another_worker_reuses_its_answer():
+    service = ChatbotService()
+    service.redis_client = AsyncMock()
+    service.redis_client.set.return_value = None  # SET NX failed, another worker leads
+    pipe = AsyncMock()
+    pipe.get = lambda key: None
+    pipe.exists = lambda key: None
+    pipe.execute.return_value = [b'{"message": "From worker 2", "actions": []}', 1]
+    service.redis_client.pipeline = lambda: pipe
+
+    with patch('api.services.chatbot_service.chatbot', new_callable=AsyncMock) as mock_chatbot:
+        result = asyncio.run(service._generate_coalesced("office hours", "office hours"))
+
+    mock_chatbot.assert_not_called()
+    assert result == ("From worker 2", [], [])
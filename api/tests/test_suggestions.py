@@ -1,6 +1,6 @@
 import sys
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 import asyncio
 from pathlib import Path
 import json
@@ -17,8 +17,9 @@ class TestFollowUpSuggestions(unittest.TestCase):
         self.follow_up = FollowUpMessage()
         self.service = ChatbotService()
         # Mock redis
-        self.service.redis_client = MagicMock()
+        self.service.redis_client = AsyncMock()
         self.service.redis_client.get.return_value = None
+        self.service.semantic_cache = None
 
     def test_suggestion_loading(self):
         # Verify suggestions are loaded
@@ -35,11 +36,10 @@ class TestFollowUpSuggestions(unittest.TestCase):
         self.assertEqual(actions[0]["id"], "booking-page")
         self.assertGreater(len(suggestions), 0)
 
-    @patch('api.services.chatbot_service.chatbot')
+    @patch('api.services.chatbot_service.chatbot', new_callable=AsyncMock)
     def test_service_deterministic_bypass(self, mock_chatbot):
         # Ensure chatbot (LLM) is NOT called when qa_id is provided
-        loop = asyncio.get_event_loop()
-        message, actions, suggestions = loop.run_until_complete(
+        message, actions, suggestions = asyncio.run(
             self.service.get_chat_response("ignore me", qa_id="qa-booking-process")
         )
         
@@ -47,18 +47,64 @@ class TestFollowUpSuggestions(unittest.TestCase):
         self.assertIn("filling out the form", message)
         self.assertEqual(actions[0]["id"], "booking-page")
 
-    @patch('api.services.chatbot_service.chatbot')
+    @patch('api.services.chatbot_service.chatbot', new_callable=AsyncMock)
     def test_service_normal_flow_with_suggestions(self, mock_chatbot):
         # Ensure suggestions are attached when LLM returns a qa_id
         mock_chatbot.return_value = ("Test answer", [{"id": "test-action"}], "qa-wedding-pricing-hm")
         
-        loop = asyncio.get_event_loop()
-        message, actions, suggestions = loop.run_until_complete(
+        message, actions, suggestions = asyncio.run(
             self.service.get_chat_response("wedding price")
         )
         
         self.assertEqual(message, "Test answer")
         self.assertEqual(len(suggestions), 3) # qa-wedding-pricing-hm has 3 suggestions
 
+    def test_keyword_suggestions_match_full_scan(self):
+        # The postings lookup must rank entries exactly like scanning every tag
+        def full_scan(message):
+            message_words = set(message.lower().split())
+            matches = []
+            for qa_id, group in self.follow_up.catalog.follow_ups.items():
+                overlap = max(
+                    (len(message_words & set(tag.lower().split())) for tag in group.tags),
+                    default=0
+                )
+                if overlap > 0:
+                    matches.append((qa_id, overlap))
+            matches.sort(key=lambda x: x[1], reverse=True)
+            return matches
+
+        messages = ["how much wedding package", "magkano prenup", "Book a Date", "hello there", ""]
+        for group in self.follow_up.catalog.follow_ups.values():
+            messages.extend(group.tags)
+
+        for message in messages:
+            expected_ids = [qa_id for qa_id, _ in full_scan(message)]
+            suggestions = self.follow_up.get_suggestions_by_keywords(message)
+            if not expected_ids:
+                self.assertEqual(suggestions, [])
+                continue
+
+            # round-robin over the full scan order
+            expected = []
+            seen = set()
+            for index in range(10):
+                added = False
+                for qa_id in expected_ids:
+                    if len(expected) >= 3:
+                        break
+                    entry_suggestions = self.follow_up.catalog.follow_ups[qa_id].suggestions
+                    if index < len(entry_suggestions):
+                        suggestion = entry_suggestions[index]
+                        unique_id = suggestion.action_id or suggestion.qa_id
+                        if unique_id and unique_id not in seen:
+                            expected.append(suggestion.to_dict())
+                            seen.add(unique_id)
+                            added = True
+                if not added or len(expected) >= 3:
+                    break
+
+            self.assertEqual(suggestions, expected, message)
+
 if __name__ == '__main__':
     unittest.main()
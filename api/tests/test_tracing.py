@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.utils import metrics, tracing
+from api.utils.tracing import RequestTraceMiddleware
+
+
+def make_app(otel: bool = False) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestTraceMiddleware, timing_allow_origin="https://example.com", otel=otel)
+
+    @app.get("/chat")
+    async def chat():
+        with metrics.timed("cache_lookup"):
+            await asyncio.sleep(0.01)
+        with metrics.timed("normalize"):
+            pass
+        tracing.annotate("source", "cache")
+        return {"message": "ok"}
+
+    return app
+
+
+def test_server_timing_lists_the_stages_and_answer_source():
+    response = TestClient(make_app()).get("/chat")
+
+    entries = dict(entry.split(";", 1) for entry in response.headers["server-timing"].split(", "))
+    assert list(entries) == ["cache", "source", "total"]
+    assert float(entries["cache"].removeprefix("dur=")) >= 10.0
+    assert entries["source"] == 'desc="cache"'
+    assert response.headers["timing-allow-origin"] == "https://example.com"
+    assert len(response.headers["x-request-id"]) == 32
+
+
+def test_request_id_is_propagated_when_header_safe():
+    client = TestClient(make_app())
+
+    assert client.get("/chat", headers={"X-Request-ID": "widget-42"}).headers["x-request-id"] == "widget-42"
+    assert client.get("/chat", headers={"X-Request-ID": "a b\"c"}).headers["x-request-id"] != "a b\"c"
+
+
+def test_stages_outside_a_request_are_not_traced():
+    with metrics.timed("retrieval"):
+        pass
+    assert tracing.current_trace.get() is None
+
+
+def test_stage_spans_are_children_of_the_request_span():
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    export = pytest.importorskip("opentelemetry.sdk.trace.export")
+    in_memory = pytest.importorskip("opentelemetry.sdk.trace.export.in_memory_span_exporter")
+    from opentelemetry import trace as otel_trace
+
+    exporter = in_memory.InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(export.SimpleSpanProcessor(exporter))
+    otel_trace.set_tracer_provider(provider)
+    if otel_trace.get_tracer_provider() is not provider:
+        pytest.skip("another tracer provider is already installed")
+
+    TestClient(make_app(otel=True)).get("/chat", headers={"X-Request-ID": "trace-me"})
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    request_span = spans["GET /chat"]
+    assert request_span.attributes["faqbot.request_id"] == "trace-me"
+    assert request_span.attributes["faqbot.source"] == "cache"
+    assert request_span.attributes["http.response.status_code"] == 200
+    assert spans["cache_lookup"].parent.span_id == request_span.context.span_id
+    assert spans["normalize"].parent.span_id == request_span.context.span_id
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+from api.utils.ttl_cache import TTLCache
+
+
+def test_lru_eviction_and_ttl_expiry(clock):
+    cache = TTLCache(max_items=2, ttl=10, clock=clock)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # "b" is least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_delete_and_clear_count_invalidations():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.delete("a")
+    cache.delete("missing")
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_service_serves_repeat_hits_from_memory(make_service):
+    service = make_service({"office hours": json.dumps({"message": "Open daily", "actions": []})})
+
+    async def run():
+        first = await service._lookup_cached("office hours", "office hours")
+        second = await service._lookup_cached("office hours", "office hours")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == ("Open daily", [], [])
+    assert service.redis_client.get.await_count == 1
+
+    asyncio.run(service.invalidate("office hours"))
+    service.redis_client.publish.assert_awaited_once_with("faq:invalidate", "office hours")
+    assert service.response_cache.get("office hours") is None
@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+
+from api.scripts import vector_store as vs
+
+
+class InMemoryStore:
+    """Minimal stand-in for the Chroma collection used by sync_vector_store"""
+    def __init__(self):
+        self.docs = {}
+        self.embedded = 0
+
+    def get(self, include=None):
+        return {"ids": list(self.docs)}
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.docs.pop(chunk_id, None)
+
+    def add_documents(self, documents, ids):
+        self.embedded += len(documents)
+        self.docs.update(zip(ids, documents))
+
+
+def make_docs(*contents):
+    docs = [Document(page_content=c, metadata={"source": "test.md", "type": "knowledge"}) for c in contents]
+    for doc in docs:
+        doc.metadata["chunk_id"] = vs.content_hash_id(doc)
+    return docs
+
+
+def test_content_hash_id_ignores_volatile_metadata():
+    a = Document(page_content="hello", metadata={"source": "a.md", "added_date": "2020-01-01"})
+    b = Document(page_content="hello", metadata={"source": "a.md", "added_date": "2026-01-01"})
+    c = Document(page_content="hello!", metadata={"source": "a.md"})
+    assert vs.content_hash_id(a) == vs.content_hash_id(b)
+    assert vs.content_hash_id(a) != vs.content_hash_id(c)
+
+
+def test_sync_embeds_only_changes(tmp_path, monkeypatch):
+    store = InMemoryStore()
+    monkeypatch.setattr(vs, "vector_store", store)
+    monkeypatch.setattr(vs, "PERSISTENT_CHROMADB", tmp_path)
+    monkeypatch.setattr(vs, "INGEST_MANIFEST", tmp_path / "manifest.json")
+
+    assert vs.sync_vector_store(make_docs("one", "two")) == {"added": 2, "deleted": 0, "unchanged": 0}
+    assert vs.sync_vector_store(make_docs("one", "two")) == {"added": 0, "deleted": 0, "unchanged": 2}
+    assert store.embedded == 2
+
+    assert vs.sync_vector_store(make_docs("one", "three")) == {"added": 1, "deleted": 1, "unchanged": 1}
+    assert store.embedded == 3
+    assert len(store.docs) == 2
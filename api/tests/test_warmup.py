@@ -0,0 +1,75 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+from api import warmup
+from api.scripts.knowledge_catalog import KnowledgeCatalog, QARecord, catalog
+
+
+def test_questions_are_deduplicated_by_cache_key():
+    records = KnowledgeCatalog(qa_entries=[
+        QARecord(id="a", primary_question="How much is the wedding coverage?", variants=("hm wedding", "  ")),
+        QARecord(id="b", primary_question="How much is the wedding coverage"),
+    ])
+    with patch.object(warmup, "catalog", records):
+        questions = warmup.warmup_questions()
+
+    assert len(questions) == 2
+    # left raw, warm_cache normalizes once like live traffic
+    assert questions[1] == ("faq:how much wedding", "hm wedding")
+
+
+@patch('api.services.chatbot_service.chatbot', new_callable=AsyncMock)
+def test_warmed_keys_are_the_ones_live_traffic_reads(mock_chatbot, make_service):
+    # "pano magbook" changes when normalized twice
+    cache_key, question = next(
+        (key, question) for key, question in warmup.warmup_questions() if question == "pano magbook"
+    )
+    service = make_service()
+    service.redis_client.exists.return_value = 0
+    service.semantic_cache = AsyncMock()
+
+    assert asyncio.run(service.warm_cache(question)) == "seeded"
+
+    mock_chatbot.assert_not_awaited()
+    service.redis_client.exists.assert_awaited_once_with(cache_key)
+    assert service.redis_client.setex.await_args.kwargs["name"] == cache_key
+
+
+def test_interrupted_run_resumes(tmp_path):
+    questions = [("q1", "q1"), ("q2", "q2"), ("q3", "q3")]
+    warm_cache = AsyncMock(side_effect=["generated", Exception("rate limited"), "cached"])
+
+    with patch.object(warmup, "WARMUP_PROGRESS_FILE", tmp_path / "progress.json"), \
+            patch.object(warmup, "warmup_questions", return_value=questions), \
+            patch.object(warmup.chatbot_service, "warm_cache", warm_cache):
+        first = asyncio.run(warmup.run_warmup(concurrency=1))
+        assert first == {"cached": 1, "seeded": 0, "generated": 1, "skipped": 0, "failed": 1}
+        assert warmup.load_progress() == {"q1", "q3"}
+
+        dry_run = asyncio.run(warmup.run_warmup(dry_run=True))
+        assert dry_run == {"pending": 1}
+
+        warm_cache.side_effect = ["generated"]
+        second = asyncio.run(warmup.run_warmup(concurrency=1))
+        assert second["generated"] == 1
+        assert warm_cache.await_args.args == ("q2",)
+        # a complete run clears its progress
+        assert not (tmp_path / "progress.json").exists()
+
+
+@patch('api.services.chatbot_service.chatbot', new_callable=AsyncMock)
+def test_fast_path_questions_are_seeded_without_the_llm(mock_chatbot, make_service):
+    qa = next(qa for qa in catalog.qa_entries.values() if qa.primary_question and qa.answer)
+    service = make_service()
+    service.redis_client.exists.return_value = 0
+    service.semantic_cache = AsyncMock()
+
+    assert asyncio.run(service.warm_cache(qa.primary_question)) == "seeded"
+
+    mock_chatbot.assert_not_awaited()
+    cached = json.loads(service.redis_client.setex.await_args.kwargs["value"])
+    assert cached["message"] == qa.answer
+    service.semantic_cache.add.assert_awaited_once()
+    register = service.redis_client.eval.await_args
+    assert f"faq:deps:qa:{qa.id}" in register.args
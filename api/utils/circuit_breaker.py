@@ -0,0 +1,130 @@
+import time
+from collections import deque
+from typing import Callable, Literal
+import logging
+
+logger = logging.getLogger(__name__)
+
+State = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(Exception):
+    """The dependency is considered down, the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+    - closed: calls go through; the last window_size outcomes are kept and the
+      circuit opens when failures + slow calls reach failure_rate_threshold
+      (after at least min_calls)
+    - open: calls are rejected for open_seconds
+    - half_open: up to half_open_max_calls trial calls; a fast success closes
+      the circuit, a failure or slow call opens it again
+    """
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self._state: State = "closed"
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        # True for a bad outcome (failure or slow call)
+        self._window: deque[bool] = deque(maxlen=window_size)
+
+        self.counters = {
+            "successes": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "opened": 0
+        }
+
+
+    @property
+    def state(self) -> State:
+        if self._state == "open" and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = "half_open"
+            self._half_open_calls = 0
+            logger.info(f"Circuit '{self.name}' half-open, allowing a trial call")
+        return self._state
+
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now. Every allowed call must be recorded or released."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+
+        self.counters["rejected"] += 1
+        return False
+
+
+    def record_success(self, duration: float) -> None:
+        slow = duration >= self.slow_call_seconds
+        self.counters["successes"] += 1
+        if slow:
+            self.counters["slow_calls"] += 1
+        self._record(bad=slow)
+
+
+    def record_failure(self) -> None:
+        self.counters["failures"] += 1
+        self._record(bad=True)
+
+
+    def release(self) -> None:
+        """An allowed call was abandoned (e.g. client disconnected) without an outcome"""
+        if self._state == "half_open" and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+
+    def _record(self, bad: bool) -> None:
+        if self._state == "half_open":
+            if bad:
+                self._open()
+            else:
+                logger.info(f"Circuit '{self.name}' closed")
+                self._state = "closed"
+                self._window.clear()
+            return
+
+        self._window.append(bad)
+        if self._state == "closed" and len(self._window) >= self.min_calls:
+            if sum(self._window) / len(self._window) >= self.failure_rate_threshold:
+                self._open()
+
+
+    def _open(self) -> None:
+        logger.warning(f"Circuit '{self.name}' opened for {self.open_seconds}s")
+        self._state = "open"
+        self._opened_at = self.clock()
+        self._half_open_calls = 0
+        self._window.clear()
+        self.counters["opened"] += 1
+
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "state": self.state,
+            "window_failure_rate": round(sum(self._window) / len(self._window), 4) if self._window else 0.0
+        }
@@ -0,0 +1,242 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+import logging
+
+from langchain_core.embeddings import Embeddings
+
+from api.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Two-level cache in front of an embedding model for query texts.
+    - L1: in-process LRU of the most recent query vectors
+    - L2: local SQLite file shared by every worker on the host, evicted
+      least recently used first. Hits refresh a row's access time at most
+      once per `touch_interval`, so hot keys don't turn reads into writes.
+    Entries are keyed by (model name, normalized text). Document embeddings
+    used during ingestion pass straight through to the wrapped model.
+    The async path runs the disk store in a worker thread, off the event loop.
+    """
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_path: Optional[Path] = None,
+        key_fn: Optional[Callable[[str], str]] = None,
+        l1_max_items: int = 1024,
+        l2_max_items: int = 50000,
+        touch_interval: float = 60.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.key_fn = key_fn or (lambda text: text)
+        self.l1_max_items = l1_max_items
+        self.l2_max_items = l2_max_items
+        self.touch_interval = touch_interval
+        self.clock = clock
+
+        self._l1: OrderedDict[str, list[float]] = OrderedDict()
+        # L1 and the disk store lock separately: the event loop only ever
+        # waits on the in-memory lock, never behind SQLite I/O
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "l1_evictions": 0,
+            "l2_evictions": 0
+        }
+
+        if cache_path is not None:
+            self._open_db(Path(cache_path))
+
+
+    def _open_db(self, cache_path: Path) -> None:
+        """Open (or create) the on-disk store. The cache degrades to L1 only on failure."""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(cache_path), timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (model, key))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_query_embeddings_access"
+                " ON query_embeddings (last_access)"
+            )
+            # running row count, kept by triggers so every worker sharing the
+            # file sees it, seeded once from files written before it existed
+            self._db.execute("CREATE TABLE IF NOT EXISTS query_embeddings_count (n INTEGER NOT NULL)")
+            self._db.execute(
+                "INSERT INTO query_embeddings_count (n)"
+                " SELECT COUNT(*) FROM query_embeddings"
+                " WHERE NOT EXISTS (SELECT 1 FROM query_embeddings_count)"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS query_embeddings_added AFTER INSERT ON query_embeddings"
+                " BEGIN UPDATE query_embeddings_count SET n = n + 1; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS query_embeddings_removed AFTER DELETE ON query_embeddings"
+                " BEGIN UPDATE query_embeddings_count SET n = n - 1; END"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache disk store unavailable ({cache_path}): {e}")
+            self._db = None
+
+
+    def _l1_put(self, key: str, vector: list[float]) -> None:
+        self._l1[key] = vector
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_items:
+            self._l1.popitem(last=False)
+            self.counters["l1_evictions"] += 1
+
+
+    def _l2_get(self, key: str) -> Optional[list[float]]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector, last_access FROM query_embeddings WHERE model = ? AND key = ?",
+                    (self.model_name, key)
+                ).fetchone()
+                if row is None:
+                    return None
+
+                now = self.clock()
+                if now - row[1] >= self.touch_interval:
+                    self._db.execute(
+                        "UPDATE query_embeddings SET last_access = ? WHERE model = ? AND key = ?",
+                        (now, self.model_name, key)
+                    )
+                    self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return None
+        return array('f', row[0]).tolist()
+
+
+    def _l2_put(self, key: str, vector: list[float]) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                # an upsert, not INSERT OR REPLACE: overwriting a key must not
+                # fire the insert trigger and inflate the count
+                self._db.execute(
+                    "INSERT INTO query_embeddings (model, key, vector, last_access)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (model, key) DO UPDATE"
+                    " SET vector = excluded.vector, last_access = excluded.last_access",
+                    (self.model_name, key, array('f', vector).tobytes(), self.clock())
+                )
+
+                # evict the least recently used rows, down to 90% to amortize the cleanup
+                (count,) = self._db.execute("SELECT n FROM query_embeddings_count").fetchone()
+                if count > self.l2_max_items:
+                    excess = count - int(self.l2_max_items * 0.9)
+                    deleted = self._db.execute(
+                        "DELETE FROM query_embeddings WHERE rowid IN ("
+                        " SELECT rowid FROM query_embeddings ORDER BY last_access LIMIT ?)",
+                        (excess,)
+                    ).rowcount
+                    self.counters["l2_evictions"] += deleted
+
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+
+    def _l1_get(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            vector = self._l1.get(key)
+            if vector is not None:
+                self._l1.move_to_end(key)
+                self.counters["l1_hits"] += 1
+            return vector
+
+
+    def _l2_lookup(self, key: str) -> Optional[list[float]]:
+        """Check L2, promoting hits into L1"""
+        vector = self._l2_get(key)
+        with self._lock:
+            if vector is not None:
+                self._l1_put(key, vector)
+                self.counters["l2_hits"] += 1
+            else:
+                self.counters["misses"] += 1
+        return vector
+
+
+    def _l1_store(self, key: str, vector: list[float]) -> None:
+        with self._lock:
+            self._l1_put(key, vector)
+
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self.key_fn(text)
+        vector = self._l1_get(key)
+        if vector is None:
+            vector = self._l2_lookup(key)
+        if vector is None:
+            with metrics.timed("query_embedding"):
+                vector = self.embeddings.embed_query(text)
+            self._l1_store(key, vector)
+            self._l2_put(key, vector)
+        return vector
+
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self.key_fn(text)
+        vector = self._l1_get(key)
+        if vector is None:
+            vector = await asyncio.to_thread(self._l2_lookup, key) if self._db else self._l2_lookup(key)
+        if vector is None:
+            with metrics.timed("query_embedding"):
+                vector = await self.embeddings.aembed_query(text)
+            self._l1_store(key, vector)
+            if self._db is not None:
+                await asyncio.to_thread(self._l2_put, key, vector)
+        return vector
+
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current L1 size"""
+        lookups = self.counters["l1_hits"] + self.counters["l2_hits"] + self.counters["misses"]
+        hits = self.counters["l1_hits"] + self.counters["l2_hits"]
+        return {
+            **self.counters,
+            "l1_size": len(self._l1),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "disk_enabled": self._db is not None
+        }
@@ -1,156 +1,72 @@
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+GLOSSARY_FILE = Path(__file__).parent.parent / "documents" / "keywords-glossary.json"
+
+# marks the end of a glossary phrase inside the token trie
+PHRASE_END = object()
+
+
 class KeywordsNormalizer:
     """
     Utility to normalize string keywords
     - Normalize to lowercase
     - Remove special characters: ?!.,;:_
-    - Transform short hands into complete words
+    - Transform short hands and multi-word phrases into complete words
+    - Drop politeness / filler words
     """
-    def __init__(self):
-        self.keywords_glossary = {
-            # ==================== COMPANY & BRANDING ====================
-            "cvms": "colour variant",
-            "colour variant": "colour variant",
-            "color variant": "colour variant",
-            "colourvariant": "colour variant",
-            "cv multimedia": "colour variant",
-            "cvms multimedia": "colour variant",
-
-            # ==================== PRICING ====================
-            "hm": "how much",
-            "magkano": "how much",
-            "magkno": "how much",
-            "magkano po": "how much",
-            "howmuch": "how much",
-            "how much": "how much",
-            "price": "price",
-            "pricelist": "price list",
-            "rate": "price",
-            "rates": "price",
-            "dp": "downpayment",
-            "down": "downpayment",
-            "downpayment": "downpayment",
-
-            # ==================== LOCATION ====================
-            "loc": "location",
-            "location": "location",
-            "wer": "where",
-            "where": "where",
-            "san": "saan",
-            "saan": "saan",
-            "asan": "saan",
-            "tga": "taga",
-            "taga": "from",
-            "caloocan": "caloocan",
-            "calocan": "caloocan",
-            "ncr": "ncr",
-
-            # ==================== AVAILABILITY & DATES ====================
-            "avail": "available",
-            "availability": "available",
-            "may slot": "available",
-            "slot": "available",
-            "open": "available",
-            "pwede": "available",
-            "pwd": "pwede",
-            "may available": "available",
-            "meron slot": "available",
-            "kelan": "when",
-            "kailan": "when",
-
-            # ==================== BOOKING & QUOTE ====================
-            "book": "book",
-            "booking": "book",
-            "reserve": "book",
-            "reservation": "book",
-            "pa reserve": "book",
-            "magbook": "book",
-            "magpa book": "book",
-            "magpa-book": "book",
-            "pa book": "book",
-            "how to book": "booking process",
-            "paano magbook": "booking process",
-            "pano magbook": "booking process",
-            "quote": "quote",
-            "quotation": "quote",
-            "request quote": "quote",
-
-            # ==================== PACKAGES & INCLUSIONS ====================
-            "pkg": "package",
-            "package": "package",
-            "packages": "package",
-            "retainer": "retainer",
-            "retainer package": "retainer",
-            "3 months": "retainer",
-            "6 months": "retainer",
-            "1 year": "retainer",
-            "inclusion": "inclusions",
-            "inclusions": "inclusions",
-            "ano kasama": "inclusions",
-            "kasama": "inclusions",
-
-            # ==================== SERVICES & PORTFOLIO ====================
-            "wedding": "wedding",
-            "prenup": "prenup",
-            "pre nup": "prenup",
-            "prenuptial": "prenup",
-            "debut": "debut",
-            "18th": "debut",
-            "js prom": "school event",
-            "graduation": "school event",
-            "corporate": "corporate",
-            "school event": "school event",
-            "birthday": "birthday",
-            "portrait": "portrait",
-            "travel": "travel photography",
-            "product shoot": "product photoshoot",
-            "product photography": "product photoshoot",
-            "event production": "event production",
-            "led wall": "led wall",
-            "acoustic room": "acoustic room",
-            "studio setup": "venue buildout",
-
-            # ==================== PORTFOLIO / GALLERY ====================
-            "portfolio": "portfolio",
-            "galerry": "portfolio",
-            "galery": "portfolio",
-            "gallery": "portfolio",
-            "portofolio": "portfolio",
-            "portpolio": "portfolio",
-            "see our work": "portfolio",
-            "previous works": "portfolio",
-            "samples": "portfolio",
-            "examples": "portfolio",
-
-            # ==================== SOCIAL MEDIA & CONTACT ====================
-            "ig": "instagram",
-            "insta": "instagram",
-            "instagram": "instagram",
-            "fb": "facebook",
-            "facebook": "facebook",
-            "messenger": "messenger",
-            "yt": "youtube",
-            "youtube": "youtube",
-            "pm": "private message",
-            "dm": "direct message",
-            "pa pm": "private message",
-            "pa dm": "direct message",
-
-            # ==================== POLITENESS / FILLERS (remove or ignore) ====================
-            "po": "",
-            "opo": "",
-            "sir": "",
-            "mam": "",
-            "maam": "",
-            "ate": "",
-            "kuya": "",
-            "sis": "",
-            "bro": "",
-            "brad": "",
-            "paps": "",
-            "lods": "",
-            "boss": "",
-            "madam": "",
-        }
+    def __init__(self, glossary_file: Path = GLOSSARY_FILE):
+        self.glossary_file = glossary_file
+        self.set_glossary(self.load_glossary(glossary_file))
+    
+    
+    @staticmethod
+    def load_glossary(glossary_file: Path) -> dict[str, str]:
+        """
+        Read keywords-glossary.json: sections of {short hand or phrase: replacement},
+        an empty replacement drops the word (fillers). Later sections win on duplicates.
+        """
+        try:
+            with open(glossary_file, 'r', encoding='utf-8') as f:
+                sections: dict[str, dict[str, str]] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error(f"Keywords glossary not loaded ({glossary_file.name}): {e}")
+            return {}
+        
+        glossary = {}
+        for entries in sections.values():
+            glossary.update(entries)
+        return glossary
+    
+    
+    def set_glossary(self, glossary: dict[str, str]) -> None:
+        """Swap in a new glossary, compiled before it replaces the current one"""
+        phrase_trie = self.compile_glossary(glossary)
+        self.keywords_glossary = glossary
+        self.phrase_trie = phrase_trie
+    
+    
+    def replace(self, other: "KeywordsNormalizer") -> None:
+        """Swap in the glossary another normalizer already compiled (staged during a reload)"""
+        self.keywords_glossary, self.phrase_trie = other.keywords_glossary, other.phrase_trie
+    
+    
+    @staticmethod
+    def compile_glossary(glossary: dict[str, str]) -> dict:
+        """
+        Token trie of the glossary phrases: one level per whitespace-separated
+        token, PHRASE_END holds the replacement of the phrase ending there
+        """
+        trie: dict = {}
+        for phrase, replacement in glossary.items():
+            node = trie
+            for token in phrase.lower().split():
+                node = node.setdefault(token, {})
+            node[PHRASE_END] = replacement
+        return trie
     
     
     def remove_special_chars(self, message: str) -> str:
@@ -172,14 +88,46 @@ class KeywordsNormalizer:
     def normalize_message(self, message: str) -> str:
         """
         Normalize keywords present in the string message
-        hm -> how much, magkano -> how much...
+        hm -> how much, magkano po -> how much, how to book -> booking process...
+        Single left-to-right pass, the longest glossary phrase starting at a
+        token wins; replacements are not normalized again. Fillers are dropped.
         """
-        clean_str = self.remove_special_chars(message)
-        normalized_mssg = ""
-        for word in clean_str.split():
-            normalized_mssg += self.keywords_glossary.get(word, word) + " "
+        tokens = self.remove_special_chars(message).split()
+        token_count = len(tokens)
+        trie = self.phrase_trie
+        normalized_tokens = []
+        position = 0
+        
+        while position < token_count:
+            node = trie.get(tokens[position])
+            if node is None:
+                # most words start no glossary phrase
+                normalized_tokens.append(tokens[position])
+                position += 1
+                continue
+            
+            # walk the trie as far as the tokens allow, remember the longest phrase
+            match_end = 0
+            replacement = None
+            cursor = position
+            while node is not None:
+                cursor += 1
+                if PHRASE_END in node:
+                    match_end = cursor
+                    replacement = node[PHRASE_END]
+                if cursor >= token_count:
+                    break
+                node = node.get(tokens[cursor])
+            
+            if match_end:
+                if replacement:
+                    normalized_tokens.append(replacement)
+                position = match_end
+            else:
+                normalized_tokens.append(tokens[position])
+                position += 1
             
-        return normalized_mssg.strip()
+        return " ".join(normalized_tokens)
     
     
 kw_norm = KeywordsNormalizer()
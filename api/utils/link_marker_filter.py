@@ -0,0 +1,74 @@
+LINK_MARKER_PREFIX = "[LINK:"
+
+
+class LinkMarkerFilter:
+    """
+    Incremental version of the `[LINK:id]` cleanup done on complete answers.
+    Streamed text is fed chunk by chunk; a possible marker is held back until
+    it is closed (and dropped) or proven not to be a marker. Leading
+    whitespace is dropped and trailing whitespace is held until more text
+    arrives, so the concatenated output equals
+    `re.sub(r'\\[LINK:[^\\]]+\\]', '', text).strip()` on the whole answer.
+    """
+    def __init__(self):
+        self._pending = ""
+        self._whitespace = ""
+        self._started = False
+
+
+    def _emit(self, text: str) -> str:
+        """Apply the strip rules to marker-free text"""
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+
+        stripped = text.rstrip()
+        if not stripped:
+            self._whitespace += text
+            return ""
+
+        out = self._whitespace + stripped
+        self._whitespace = text[len(stripped):]
+        return out
+
+
+    def feed(self, chunk: str) -> str:
+        """
+        Returns:
+            Text of the chunk (plus any earlier held-back text) that is safe to send
+        """
+        buffer = self._pending + chunk
+        out = []
+        while buffer:
+            start = buffer.find("[")
+            if start == -1:
+                out.append(buffer)
+                buffer = ""
+                break
+
+            out.append(buffer[:start])
+            buffer = buffer[start:]
+            if buffer.startswith(LINK_MARKER_PREFIX):
+                end = buffer.find("]", len(LINK_MARKER_PREFIX))
+                if end == -1:
+                    break  # marker not closed yet
+                if end == len(LINK_MARKER_PREFIX):
+                    # "[LINK:]" has no id and is kept, like the regex does
+                    out.append(buffer[:end + 1])
+                buffer = buffer[end + 1:]
+            elif LINK_MARKER_PREFIX.startswith(buffer):
+                break  # could still become a marker
+            else:
+                out.append("[")
+                buffer = buffer[1:]
+
+        self._pending = buffer
+        return self._emit("".join(out))
+
+
+    def flush(self) -> str:
+        """Release whatever is still held back once the stream has ended"""
+        pending, self._pending = self._pending, ""
+        return self._emit(pending)
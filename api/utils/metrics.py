@@ -0,0 +1,112 @@
+"""
+Prometheus metrics of the chat pipeline, served on GET /metrics.
+
+With several uvicorn/gunicorn workers, point PROMETHEUS_MULTIPROC_DIR to an
+empty directory shared by them (cleared before start) so a scrape reports
+every worker, not only the one that answered it.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+from api.utils import tracing
+
+# from sub-millisecond in-process lookups up to slow LLM generations
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0
+)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024)
+
+# normalize, cache_lookup, suggestions, prompt_build, retrieval (query embedding
+# + search), query_embedding (cache misses only), vector_search, rephrase, generation
+stage_seconds = Histogram(
+    "faqbot_stage_seconds",
+    "Time spent in each stage of the chat pipeline",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+# purpose: answer or rephrase
+llm_time_to_first_token_seconds = Histogram(
+    "faqbot_llm_time_to_first_token_seconds",
+    "Time from the Groq request to the first streamed token",
+    ["purpose"],
+    buckets=STAGE_BUCKETS
+)
+llm_generation_seconds = Histogram(
+    "faqbot_llm_generation_seconds",
+    "Time from the Groq request to the end of the stream",
+    ["purpose"],
+    buckets=STAGE_BUCKETS
+)
+llm_stream_tokens = Histogram(
+    "faqbot_llm_stream_tokens",
+    "Completion tokens per streamed LLM response",
+    ["purpose"],
+    buckets=TOKEN_BUCKETS
+)
+# result: hit (exact key, L1 or Redis), semantic_hit or miss
+cache_lookups = Counter(
+    "faqbot_cache_lookups_total",
+    "Response cache lookups of RAG questions",
+    ["result"]
+)
+# reason: llm (the model answered with the fallback),
+# circuit_open (stored QA answer or fallback served without the LLM)
+fallbacks = Counter(
+    "faqbot_fallbacks_total",
+    "Answers that fell back instead of a generated answer",
+    ["reason"]
+)
+rephrases = Counter(
+    "faqbot_rephrases_total",
+    "Weak retrievals rephrased by the LLM and retrieved again"
+)
+weak_retrievals = Counter(
+    "faqbot_weak_retrievals_total",
+    "Answers generated from a retrieval that failed the quality gate"
+)
+retries = Counter(
+    "faqbot_retries_total",
+    "Retried attempts of a pipeline stage",
+    ["stage"]
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Observe the duration of the block in faqbot_stage_seconds, also when it
+    raises, and add it to the current request's trace (Server-Timing, spans)
+    """
+    started = time.perf_counter()
+    try:
+        with tracing.stage_span(stage):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.labels(stage).observe(elapsed)
+        tracing.record(stage, elapsed)
+
+
+def render() -> tuple[bytes, str]:
+    """
+    Returns:
+        (exposition text, content type) of every worker's metrics in
+        multiprocess mode, else of this process
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
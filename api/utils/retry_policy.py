@@ -0,0 +1,210 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+import logging
+
+import httpx
+
+from api.utils import metrics
+from api.utils.circuit_breaker import CircuitBreaker
+
+try:
+    import aiohttp
+    TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+        ConnectionError, httpx.TransportError, aiohttp.ClientConnectionError
+    )
+except ImportError:
+    TRANSIENT_ERRORS = (ConnectionError, httpx.TransportError)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# request timeout, too early, rate limited
+RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+
+class EmptyResponseError(Exception):
+    """A stage returned nothing usable, worth another attempt"""
+
+
+class LatencyBudgetExceeded(TimeoutError):
+    """The request ran out of its overall latency budget"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Transient failures are retried: timeouts, connection errors, HTTP 408/425/429
+    and 5xx, empty responses. Anything else (bad request, auth, bugs) is permanent.
+    Wrapped errors are classified by their cause.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, LatencyBudgetExceeded):
+            return False
+        if isinstance(error, (EmptyResponseError, TimeoutError, *TRANSIENT_ERRORS)):
+            return True
+
+        # groq/httpx errors carry status_code, google api errors carry code
+        status = getattr(error, "status_code", None)
+        if not isinstance(status, int):
+            status = getattr(error, "code", None)
+        if isinstance(status, int) and 400 <= status < 600:
+            return status in RETRYABLE_STATUS_CODES or status >= 500
+
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After header), if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Retries one pipeline stage (retrieval, rephrase, generation) at a time,
+    so stages that already succeeded are not repeated.
+    Delays grow exponentially with full jitter, honour Retry-After, and no
+    attempt starts or sleeps past the request's deadline.
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.counters: dict[str, int] = {
+            "retries": 0,
+            "permanent_failures": 0,
+            "budget_exhausted": 0
+        }
+
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2^(attempt-1))]"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+    def next_delay(
+        self,
+        stage: str,
+        error: BaseException,
+        attempt: int,
+        deadline: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Returns:
+            Seconds to wait before the next attempt of stage, or None when the
+            error must be raised (permanent, attempts used up or no budget left)
+        """
+        if not is_retryable(error):
+            self.counters["permanent_failures"] += 1
+            return None
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = self.backoff(attempt)
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.max_delay))
+
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self.counters["budget_exhausted"] += 1
+            return None
+
+        self.counters["retries"] += 1
+        self.counters[f"{stage}_retries"] = self.counters.get(f"{stage}_retries", 0) + 1
+        metrics.retries.labels(stage).inc()
+        logger.warning(
+            f"{stage} attempt {attempt}/{self.max_attempts} failed ({type(error).__name__}: {error}), "
+            f"retrying in {delay:.2f}s"
+        )
+        return delay
+
+
+    async def run(
+        self,
+        stage: str,
+        fn: Callable[[], Awaitable[T]],
+        deadline: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ) -> T:
+        """
+        Await fn() with retries, bounded by deadline (a time.monotonic() value).
+        An attempt cut off by the deadline counts as a failure of breaker, the
+        call itself only sees a cancellation.
+        """
+        attempt = 1
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self.counters["budget_exhausted"] += 1
+                raise LatencyBudgetExceeded(f"No latency budget left for {stage}")
+
+            try:
+                if remaining is None:
+                    return await fn()
+                return await asyncio.wait_for(fn(), remaining)
+            except TimeoutError as e:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.counters["budget_exhausted"] += 1
+                    if breaker is not None:
+                        breaker.record_failure()
+                    raise LatencyBudgetExceeded(f"{stage} exceeded the latency budget") from e
+                error = e
+            except Exception as e:
+                error = e
+
+            delay = self.next_delay(stage, error, attempt, deadline)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+    async def bounded(
+        self,
+        stage: str,
+        items: AsyncIterator[T],
+        deadline: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ) -> AsyncIterator[T]:
+        """
+        Re-yield items (e.g. streamed tokens), raising LatencyBudgetExceeded when
+        the next one has not arrived by deadline, a failure of breaker.
+        items is closed either way.
+        """
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.counters["budget_exhausted"] += 1
+                    raise LatencyBudgetExceeded(f"No latency budget left for {stage}")
+
+                try:
+                    async with asyncio.timeout(remaining):
+                        item = await anext(items)
+                except StopAsyncIteration:
+                    return
+                except TimeoutError as e:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self.counters["budget_exhausted"] += 1
+                        if breaker is not None:
+                            breaker.record_failure()
+                        raise LatencyBudgetExceeded(f"{stage} exceeded the latency budget") from e
+                    raise
+                yield item
+        finally:
+            await items.aclose()
+
+
+    def stats(self) -> dict:
+        return dict(self.counters)
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+class SingleFlight:
+    """
+    In-process request coalescing.
+    The first caller for a key (the leader) computes the result; callers
+    arriving while it runs (followers) await the same future instead of
+    repeating the work. The key is forgotten as soon as the leader finishes,
+    so this is not a cache.
+    """
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+        self.counters = {
+            "leaders": 0,
+            "followers": 0
+        }
+
+
+    def start(self, key: str) -> asyncio.Future:
+        """Register the caller as leader for key. Must be paired with finish()."""
+        future = asyncio.get_running_loop().create_future()
+        # followers are optional, don't warn about an exception nobody awaited
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        self.counters["leaders"] += 1
+        return future
+
+
+    def finish(self, key: str, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Publish the leader's outcome to its followers"""
+        future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+    async def wait(self, key: str) -> tuple[bool, Any]:
+        """
+        Follow the leader of key, if there is one.
+
+        Returns:
+            (True, result) when a leader delivered a result, (False, None) when
+            there was no leader or it was cancelled and the caller should compute
+        """
+        future = self._calls.get(key)
+        if future is None:
+            return False, None
+
+        self.counters["followers"] += 1
+        try:
+            # shield: a cancelled follower must not cancel the leader's work
+            return True, await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return False, None
+            raise
+
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn once per key across concurrent callers and share its result"""
+        while True:
+            followed, result = await self.wait(key)
+            if followed:
+                return result
+            if key not in self._calls:
+                break
+
+        self.start(key)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
+
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self._calls)}
@@ -0,0 +1,215 @@
+"""
+Per-request trace of the chat pipeline.
+
+Stage durations recorded by metrics.timed() are also summed on the current
+request's trace and sent back in the Server-Timing header, next to an
+X-Request-ID the frontend can quote. Optionally each request and stage is
+also an OpenTelemetry span; spans are exported by whatever SDK the process
+runs with (e.g. `opentelemetry-instrument uvicorn ...`), only the API
+package is needed here.
+"""
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# pipeline stage -> Server-Timing metric name, in header order
+SERVER_TIMING_NAMES = {
+    "cache_lookup": "cache",
+    "query_embedding": "embed",
+    "retrieval": "retrieve",
+    "rephrase": "rephrase",
+    "llm_ttft": "llm_ttft",
+    "llm_total": "llm_total",
+    "suggestions": "suggestions"
+}
+REQUEST_ID_HEADER = "X-Request-ID"
+# client supplied ids are kept when they are short and header safe
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+# no-op until the process installs an SDK tracer provider
+tracer = otel_trace.get_tracer("faqbot") if otel_trace else None
+
+
+@dataclass
+class RequestTrace:
+    request_id: str
+    started: float = field(default_factory=time.perf_counter)
+    # seconds per stage, summed when a stage runs more than once (retries, rephrased retrieval)
+    timings: dict[str, float] = field(default_factory=dict)
+    # e.g. source: deterministic, fast_path, cache, semantic_cache, coalesced, rag
+    attributes: dict[str, str] = field(default_factory=dict)
+    span: Any = None
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [
+            f"{name};dur={self.timings[stage] * 1000:.1f}"
+            for stage, name in SERVER_TIMING_NAMES.items()
+            if stage in self.timings
+        ]
+        if "source" in self.attributes:
+            entries.append(f'source;desc="{self.attributes["source"]}"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+    def summary(self) -> str:
+        timings = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.timings.items())
+        attributes = " ".join(f"{key}={value}" for key, value in self.attributes.items())
+        return f"{attributes} {timings}".strip()
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+def record(stage: str, seconds: float) -> None:
+    """Add a stage duration to the current request's trace, if any (no-op in CLIs and background tasks)"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+def annotate(key: str, value: str) -> None:
+    """Attach an attribute (e.g. the answer source) to the current request's trace and span"""
+    trace = current_trace.get()
+    if trace is None:
+        return
+    trace.attributes[key] = value
+    if trace.span is not None:
+        trace.span.set_attribute(f"faqbot.{key}", value)
+
+
+@contextmanager
+def stage_span(stage: str) -> Iterator[None]:
+    """
+    OpenTelemetry span of one stage, child of the request span (only when
+    the request is traced). The span is never made current, so it is safe
+    around awaits and yields of the streaming generators.
+    """
+    trace = current_trace.get()
+    if trace is None or trace.span is None:
+        yield
+        return
+
+    span = tracer.start_span(stage, context=otel_trace.set_span_in_context(trace.span))
+    try:
+        yield
+    except Exception as e:
+        span.record_exception(e)
+        span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, type(e).__name__))
+        raise
+    finally:
+        span.end()
+
+
+def request_id_from(scope: Scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-id":
+            request_id = value.decode("latin-1")
+            if REQUEST_ID_PATTERN.fullmatch(request_id):
+                return request_id
+    return uuid.uuid4().hex
+
+
+class RequestTraceMiddleware:
+    """
+    Pure ASGI middleware (no extra task, the trace context var reaches the
+    endpoint and the streaming body). Response headers are added when they
+    are sent: after the handler for JSON responses, so Server-Timing covers
+    every stage; before the body for streamed responses, whose stages are
+    only in the log line and the spans.
+
+    Args:
+        server_timing: send the Server-Timing header
+        timing_allow_origin: origins allowed to read it through the Resource Timing API
+        otel: start OpenTelemetry spans (needs the opentelemetry-api package)
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        server_timing: bool = True,
+        timing_allow_origin: Optional[str] = None,
+        otel: bool = False
+    ):
+        self.app = app
+        self.server_timing = server_timing
+        self.timing_allow_origin = timing_allow_origin
+        self.otel = otel and tracer is not None
+        if otel and tracer is None:
+            logger.warning("OpenTelemetry tracing enabled but opentelemetry-api is not installed")
+
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(request_id_from(scope))
+        trace_token = current_trace.set(trace)
+        otel_token = None
+        if self.otel:
+            trace.span = tracer.start_span(
+                f"{scope['method']} {scope['path']}",
+                kind=otel_trace.SpanKind.SERVER,
+                attributes={
+                    "http.request.method": scope["method"],
+                    "url.path": scope["path"],
+                    "faqbot.request_id": trace.request_id
+                }
+            )
+            # current for the whole request, outgoing client instrumentation nests under it
+            otel_token = otel_context.attach(otel_trace.set_span_in_context(trace.span))
+
+        status_code = 500
+
+        async def send_with_trace(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(REQUEST_ID_HEADER, trace.request_id)
+                if self.server_timing:
+                    headers.append("Server-Timing", trace.server_timing())
+                    if self.timing_allow_origin:
+                        headers.append("Timing-Allow-Origin", self.timing_allow_origin)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            if trace.timings:
+                logger.info(
+                    f"Request {trace.request_id} {scope['method']} {scope['path']} {status_code} "
+                    f"in {trace.elapsed() * 1000:.1f}ms: {trace.summary()}"
+                )
+            if trace.span is not None:
+                trace.span.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    trace.span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+                trace.span.end()
+                otel_context.detach(otel_token)
+            current_trace.reset(trace_token)
@@ -0,0 +1,181 @@
+"""
+Response cache warm-up.
+
+Caches an answer for every QA primary question and variant in
+cvms-qa-structured-data.jsonl, so the first users after a deploy or a Redis
+flush don't pay the full retrieval + LLM latency. Questions the QA fast path
+answers get their QA answer cached for the semantic cache (paraphrases),
+only the others are generated.
+
+Usage:
+    python -m api.warmup                   # warm everything not cached yet
+    python -m api.warmup --dry-run         # list what would be warmed
+    python -m api.warmup --concurrency 4   # parallel generations (mind the LLM rate limit)
+    python -m api.warmup --restart         # ignore the progress of an interrupted run
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import redis
+
+from api.config.settings import settings
+from api.scripts.knowledge_catalog import catalog
+from api.services.chatbot_service import RELEASE_LOCK_SCRIPT, chatbot_service
+from api.utils.keywords_normalizer import kw_norm
+
+logger = logging.getLogger(__name__)
+
+THIS_FILE_DIR = Path(__file__).parent
+# cache keys finished by an interrupted run, removed once a run completes
+WARMUP_PROGRESS_FILE = THIS_FILE_DIR / "cache" / "warmup_progress.json"
+# held by the worker running the startup warm-up so workers don't all warm at once
+WARMUP_LOCK_KEY = "faq:warmup:lock"
+WARMUP_LOCK_TTL = 3600  # seconds
+
+
+def warmup_questions() -> list[tuple[str, str]]:
+    """
+    Returns:
+        (cache_key, question) pairs for every QA primary question and variant,
+        deduplicated by cache key, in file order. The question is left raw for
+        warm_cache to normalize once, the way live traffic is, and the key is
+        the one that normalization gives.
+    """
+    questions: dict[str, str] = {}
+    for qa in catalog.qa_entries.values():
+        for question in qa.questions:
+            if not question or question.isspace():
+                continue
+            cache_key = kw_norm.normalize_cache_key(kw_norm.normalize_message(question))
+            questions.setdefault(cache_key, question)
+    return list(questions.items())
+
+
+def load_progress() -> set[str]:
+    try:
+        with open(WARMUP_PROGRESS_FILE, 'r', encoding='utf-8') as f:
+            return set(json.load(f)["done"])
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return set()
+
+
+def write_progress(done: set[str]) -> None:
+    WARMUP_PROGRESS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = WARMUP_PROGRESS_FILE.with_suffix(".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({"done": sorted(done)}, f, ensure_ascii=False)
+    os.replace(tmp_file, WARMUP_PROGRESS_FILE)
+
+
+async def run_warmup(concurrency: int = 2, dry_run: bool = False, restart: bool = False) -> dict:
+    """
+    Warm the response cache with bounded concurrency.
+    Progress is saved after every question so an interrupted run resumes
+    where it stopped.
+
+    Returns:
+        Count per outcome: cached, seeded, generated, skipped, failed (or pending for a dry run)
+    """
+    questions = warmup_questions()
+    done = set() if restart else load_progress()
+    pending = [(key, message) for key, message in questions if key not in done]
+    logger.info(f"Warm-up: {len(questions)} questions, {len(questions) - len(pending)} done in a previous run")
+
+    if dry_run:
+        for _, message in pending:
+            print(message)
+        return {"pending": len(pending)}
+
+    summary = {"cached": 0, "seeded": 0, "generated": 0, "skipped": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started_at = time.monotonic()
+
+    async def warm(cache_key: str, message: str) -> None:
+        async with semaphore:
+            try:
+                outcome = await chatbot_service.warm_cache(message)
+            except Exception as e:
+                logger.warning(f"Warm-up failed for '{message}': {e}")
+                outcome = "failed"
+
+        summary[outcome] += 1
+        if outcome != "failed":
+            done.add(cache_key)
+            write_progress(done)
+
+        completed = sum(summary.values())
+        logger.info(
+            f"[{completed}/{len(pending)}] {outcome}: {message[:60]} "
+            f"({time.monotonic() - started_at:.1f}s elapsed)"
+        )
+
+    await asyncio.gather(*(warm(cache_key, message) for cache_key, message in pending))
+
+    # a complete run starts over next time, cached answers are then skipped cheaply
+    if not summary["failed"]:
+        WARMUP_PROGRESS_FILE.unlink(missing_ok=True)
+
+    logger.info(f"Warm-up finished: {summary}")
+    return summary
+
+
+async def startup_warmup() -> None:
+    """
+    Background warm-up started by the API lifespan (WARMUP_ON_STARTUP).
+    Only the worker that takes the Redis warm-up lock runs it.
+    """
+    lock_token = uuid.uuid4().hex
+    try:
+        acquired = await chatbot_service.redis_client.set(
+            WARMUP_LOCK_KEY, lock_token, nx=True, ex=WARMUP_LOCK_TTL
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Skipping startup warm-up, Redis unavailable: {e}")
+        return
+    if not acquired:
+        logger.info("Startup warm-up already running in another worker")
+        return
+
+    try:
+        await run_warmup(concurrency=settings.WARMUP_CONCURRENCY)
+    except Exception as e:
+        logger.error(f"Startup warm-up failed: {e}")
+    finally:
+        try:
+            # only our own lock: it may have expired and been taken by another worker
+            await chatbot_service.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, WARMUP_LOCK_KEY, lock_token)
+        except redis.RedisError:
+            pass
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.warmup",
+        description="Pre-generate cached answers for the CVMS QA questions"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="list the questions to warm, don't call the LLM")
+    parser.add_argument("--concurrency", type=int, default=settings.WARMUP_CONCURRENCY)
+    parser.add_argument("--restart", action="store_true", help="ignore the progress of an interrupted run")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    async def run() -> dict:
+        try:
+            return await run_warmup(args.concurrency, args.dry_run, args.restart)
+        finally:
+            await chatbot_service.close()
+
+    summary = asyncio.run(run())
+    return 1 if summary.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())